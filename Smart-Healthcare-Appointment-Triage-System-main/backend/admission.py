@@ -0,0 +1,240 @@
+"""
+Admission control: per-lane concurrency limits and load shedding.
+
+Every request is put in a lane by method and path:
+
+- "emergency"  POST /book whose symptoms triage as Emergency. Never limited or shed.
+- "booking"    other bookings and /triage.
+- "queue"      the clinicians' queue: reading it, claiming and discharging patients.
+- "write"      other writes: adding providers, booking and releasing scheduled slots,
+               sending notifications.
+- "low"        reading patient history, search, notifications, analytics and the
+               schedule.
+- "export"     /export downloads, which stream for as long as the file takes, so they
+               have their own slots instead of holding the "low" ones.
+- exempt       docs, /metrics, live streams and anything unmatched.
+
+Each limited lane runs at most ADMISSION_LIMIT_<LANE> requests at a time. The lane
+limits add up to less than the worker threadpool (40 threads), so a flood in one lane
+can't take the threads an Emergency booking needs. With the default limits the queue,
+write, low and export lanes plus the booking writer (backend/group_commit.py) also fit
+in the default database pool of 15 connections. Requests over the limit wait up to
+ADMISSION_QUEUE_TIMEOUT_SECONDS for a slot and are then refused with 503 and Retry-After.
+
+While the recent latency of the booking and queue lanes is above
+ADMISSION_LATENCY_SLO_SECONDS, "low" and "export" requests are shed straight away instead
+of waiting. Writes are never shed.
+Recent latency is a moving average that fades with time (half-life
+ADMISSION_LATENCY_HALF_LIFE_SECONDS), so once booking and queue traffic stops after a slow
+spike, low-priority requests are admitted again.
+
+Bookings are triaged in the threadpool, like the endpoint itself, so fuzzy matching and
+model inference don't hold up the event loop.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import config, crud, metrics
+
+EXEMPT = None
+
+READ_METHODS = {"GET", "HEAD"}
+WRITE = "write"
+
+# (method or None for any, path pattern, lane); first match wins. A READ_METHODS rule
+# matches GET and HEAD; other requests to its paths go to the write lane.
+LANE_RULES = [
+    ("POST", re.compile(r"^/book$"), "booking"),
+    ("POST", re.compile(r"^/triage$"), "booking"),
+    (None, re.compile(r"^/appointments?(/|$)"), "queue"),
+    (None, re.compile(r"^/queues?(/|$)"), "queue"),
+    (None, re.compile(r"^/stats/"), "queue"),
+    ("GET", re.compile(r"^/export(/|$)"), "export"),
+    (READ_METHODS, re.compile(r"^/patients(/|$)"), "low"),
+    (READ_METHODS, re.compile(r"^/notifications(/|$)"), "low"),
+    (READ_METHODS, re.compile(r"^/analytics(/|$)"), "low"),
+    (READ_METHODS, re.compile(r"^/(providers|slots)(/|$)"), "low"),
+]
+
+# Lanes whose latency the SLO is measured on, and lanes shed while it is over the SLO
+TIMED_LANES = {"booking", "queue"}
+SHED_LANES = {"low", "export"}
+
+# Live streams stay open indefinitely, so they don't hold a lane slot
+STREAMING_PATHS = {"/queue/events"}
+
+def classify(method: str, path: str):
+    if path in STREAMING_PATHS:
+        return EXEMPT
+    for rule_method, pattern, lane in LANE_RULES:
+        if not pattern.match(path):
+            continue
+        if rule_method is READ_METHODS:
+            return lane if method in READ_METHODS else WRITE
+        if rule_method is None or rule_method == method:
+            return lane
+    return EXEMPT
+
+def lane_limits() -> dict:
+    return {
+        "booking": config.ADMISSION_LIMIT_BOOKING,
+        "queue": config.ADMISSION_LIMIT_QUEUE,
+        "write": config.ADMISSION_LIMIT_WRITE,
+        "low": config.ADMISSION_LIMIT_LOW,
+        "export": config.ADMISSION_LIMIT_EXPORT,
+    }
+
+def booking_triage_level(body: bytes):
+    """Triage level of a /book body, or None if it isn't valid (left for the endpoint to reject)."""
+    try:
+        symptoms = json.loads(body).get("symptoms")
+    except (ValueError, AttributeError):
+        return None
+    return crud.evaluate_triage_level(symptoms) if isinstance(symptoms, str) else None
+
+class LatencyTracker:
+    """
+    Moving average of request latency, in seconds, that fades with wall-clock time.
+
+    A sample's weight grows with the time since the previous sample (at least `alpha`), and
+    between samples the average decays towards zero, halving every `half_life` seconds.
+    """
+
+    def __init__(self, half_life: float, alpha: float = 0.1, clock=time.monotonic):
+        self.half_life = half_life
+        self.alpha = alpha
+        self.clock = clock
+        self._average = 0.0
+        self._observed_at = None
+        self._lock = threading.Lock()
+
+    def _decay(self, now: float) -> float:
+        """Share of the average still standing `now`."""
+        if self._observed_at is None or self.half_life <= 0:
+            return 1.0
+        return 0.5 ** (max(now - self._observed_at, 0.0) / self.half_life)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            now = self.clock()
+            weight = max(self.alpha, 1.0 - self._decay(now)) if self._observed_at is not None else 1.0
+            self._average += weight * (seconds - self._average)
+            self._observed_at = now
+
+    @property
+    def value(self) -> float:
+        with self._lock:
+            return self._average * self._decay(self.clock())
+
+    def reset(self):
+        with self._lock:
+            self._average = 0.0
+            self._observed_at = None
+
+class AdmissionControlMiddleware:
+    def __init__(self, app: ASGIApp, limits: dict = None, queue_timeout: float = None,
+                 latency_slo: float = None, retry_after: int = None, latency_half_life: float = None):
+        self.app = app
+        self.limits = limits or lane_limits()
+        self.queue_timeout = queue_timeout if queue_timeout is not None else config.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        self.latency_slo = latency_slo if latency_slo is not None else config.ADMISSION_LATENCY_SLO_SECONDS
+        self.retry_after = retry_after or config.ADMISSION_RETRY_AFTER_SECONDS
+        self.latency = LatencyTracker(
+            latency_half_life if latency_half_life is not None else config.ADMISSION_LATENCY_HALF_LIFE_SECONDS)
+        self._loop = None
+        self._semaphores = {}
+
+    def _semaphore(self, lane: str) -> asyncio.Semaphore:
+        # Semaphores belong to one event loop; build them on (and for) the running one
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        return self._semaphores[lane]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        lane = classify(scope["method"], scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "POST" and scope["path"] == "/book":
+            body = await _read_body(receive)
+            receive = _replay(body, receive)
+            triage_level = await run_in_threadpool(booking_triage_level, body)
+            # Handed to the endpoint (request.state.triage_level) so symptoms are only triaged once
+            scope.setdefault("state", {})["triage_level"] = triage_level
+            if triage_level == "Emergency":
+                await self._timed(scope, receive, send)
+                return
+
+        if lane in SHED_LANES and self.latency.value > self.latency_slo:
+            metrics.admission_rejected.inc(lane, "slo")
+            await self._reject(scope, receive, send)
+            return
+
+        semaphore = self._semaphore(lane)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.admission_rejected.inc(lane, "queue_timeout")
+            await self._reject(scope, receive, send)
+            return
+        metrics.admission_wait.observe(time.perf_counter() - started, lane)
+        try:
+            if lane in TIMED_LANES:
+                await self._timed(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            semaphore.release()
+
+    async def _timed(self, scope: Scope, receive: Receive, send: Send):
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.latency.observe(time.perf_counter() - started)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send):
+        response = JSONResponse(
+            {"detail": "Server is busy, please retry later"},
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+        await response(scope, receive, send)
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+def _replay(body: bytes, receive: Receive) -> Receive:
+    """A receive() that hands the already-read body to the app, then defers to the real one."""
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
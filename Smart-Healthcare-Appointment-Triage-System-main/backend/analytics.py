@@ -0,0 +1,292 @@
+"""
+Operational analytics from hourly rollups.
+
+Every booking, claim and discharge adds itself to the hourly_rollups row of its hour and
+triage level (and a wait-time histogram bucket in hourly_wait_buckets) in the same
+transaction, with one upsert per table. /analytics/* reads only these rollups: a day is
+24 rows per triage level, however many appointments it had.
+
+Definitions (all hours are UTC):
+
+- arrivals    appointments booked in the hour (created_at)
+- discharges  appointments completed in the hour (completed_at)
+- waits       patients seen in the hour: claimed (started_at), or discharged straight
+              from the queue (completed_at); the wait runs from booking until then
+
+Medians and percentiles are read from the WAIT_BUCKETS histogram, interpolated within
+a bucket. Writes that bypass crud (bulk import, synthetic data) add their rows with
+RollupDelta; rebuild_rollups recomputes any range from the appointment tables.
+"""
+import bisect
+import datetime
+import functools
+from collections import Counter, defaultdict
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Upper bounds (seconds) of the wait-time histogram buckets; one more bucket holds longer waits
+WAIT_BUCKETS = [60, 300, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200, 10800, 14400, 21600, 28800, 43200, 86400]
+
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+
+def hour_of(value: datetime.datetime) -> datetime.datetime:
+    """Start of the UTC hour containing value, as a naive datetime (how rollup hours are stored)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _seconds(start: datetime.datetime, end: datetime.datetime) -> float:
+    if start.tzinfo is not None:
+        start = start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if end.tzinfo is not None:
+        end = end.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (end - start).total_seconds()
+
+def wait_bucket(seconds: float) -> int:
+    return bisect.bisect_left(WAIT_BUCKETS, seconds)
+
+# ============ ROLLUP CHANGES ============
+
+class RollupDelta:
+    """Rollup counts accumulated in memory; write() adds them to the tables with one upsert per table."""
+
+    def __init__(self):
+        # (hour, triage_level) -> [arrivals, discharges, waits, wait_seconds]
+        self.rows = defaultdict(lambda: [0, 0, 0, 0.0])
+        # (hour, triage_level, bucket) -> count
+        self.buckets = Counter()
+
+    def arrival(self, triage_level: str, created_at: datetime.datetime, count: int = 1):
+        self.rows[(hour_of(created_at), triage_level)][0] += count
+
+    def discharge(self, triage_level: str, completed_at: datetime.datetime, count: int = 1):
+        self.rows[(hour_of(completed_at), triage_level)][1] += count
+
+    def wait(self, triage_level: str, created_at: datetime.datetime, seen_at: datetime.datetime):
+        seconds = _seconds(created_at, seen_at)
+        hour = hour_of(seen_at)
+        row = self.rows[(hour, triage_level)]
+        row[2] += 1
+        row[3] += seconds
+        self.buckets[(hour, triage_level, wait_bucket(seconds))] += 1
+
+    def appointment(self, triage_level: str, created_at: datetime.datetime,
+                    started_at: datetime.datetime = None, completed_at: datetime.datetime = None):
+        """Everything one (possibly historical) appointment contributes."""
+        self.arrival(triage_level, created_at)
+        if completed_at is not None:
+            self.discharge(triage_level, completed_at)
+        if started_at is not None or completed_at is not None:
+            self.wait(triage_level, created_at, started_at or completed_at)
+
+    def write(self, db: Session):
+        """Add the counts to the rollup tables in the current transaction (not committed)."""
+        rollup_upsert, bucket_upsert = _upserts(db.get_bind().dialect.name)
+        if self.rows:
+            db.execute(rollup_upsert, [
+                {"hour": hour, "triage_level": level, "arrivals": arrivals, "discharges": discharges,
+                 "waits": waits, "wait_seconds": wait_seconds}
+                for (hour, level), (arrivals, discharges, waits, wait_seconds) in self.rows.items()
+            ])
+        if self.buckets:
+            db.execute(bucket_upsert, [
+                {"hour": hour, "triage_level": level, "bucket": bucket, "count": count}
+                for (hour, level, bucket), count in self.buckets.items()
+            ])
+
+@functools.lru_cache(maxsize=None)
+def _upserts(dialect_name: str):
+    """INSERT ... ON CONFLICT DO UPDATE SET column = column + excluded.column, built once per dialect."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    def upsert(table, keys, counters):
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: table.c[column] + stmt.excluded[column] for column in counters},
+        )
+
+    return (
+        upsert(models.HourlyRollup.__table__, ["hour", "triage_level"], ["arrivals", "discharges", "waits", "wait_seconds"]),
+        upsert(models.HourlyWaitBucket.__table__, ["hour", "triage_level", "bucket"], ["count"]),
+    )
+
+# Hooks called by crud in the transaction of each write
+
+def record_arrival(db: Session, appointment: models.Appointment):
+    delta = RollupDelta()
+    delta.arrival(appointment.triage_level, appointment.created_at)
+    delta.write(db)
+
+def record_started(db: Session, triage_level: str, created_at: datetime.datetime, started_at: datetime.datetime):
+    delta = RollupDelta()
+    delta.wait(triage_level, created_at, started_at)
+    delta.write(db)
+
+def record_completed(db: Session, appointment: models.Appointment, old_status: str):
+    delta = RollupDelta()
+    delta.discharge(appointment.triage_level, appointment.completed_at)
+    if old_status == "Queued":
+        # Seen and discharged without being claimed first
+        delta.wait(appointment.triage_level, appointment.created_at, appointment.completed_at)
+    delta.write(db)
+
+# ============ AGGREGATING THE APPOINTMENT TABLES ============
+
+def _hour_sql(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+def _seconds_sql(start, end, dialect_name: str):
+    if dialect_name == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400.0
+
+def _parse_hour(value) -> datetime.datetime:
+    # SQLite returns the strftime text, PostgreSQL a timestamp
+    return hour_of(datetime.datetime.fromisoformat(value) if isinstance(value, str) else value)
+
+def _in_range(column, since: datetime.datetime = None, until: datetime.datetime = None) -> list:
+    conditions = [column.is_not(None)]
+    if since is not None:
+        conditions.append(column >= since)
+    if until is not None:
+        conditions.append(column < until)
+    return conditions
+
+def aggregate_raw(db: Session, since: datetime.datetime = None, until: datetime.datetime = None) -> RollupDelta:
+    """
+    The rollups of the hours in [since, until), computed from the live and archived
+    appointment tables with GROUP BY queries. This is what the rollups save at read time.
+    """
+    dialect_name = db.get_bind().dialect.name
+    delta = RollupDelta()
+    for table in (models.Appointment, models.ArchivedAppointment):
+        for column, position in ((table.created_at, 0), (table.completed_at, 1)):
+            hour = _hour_sql(column, dialect_name)
+            rows = db.execute(
+                select(hour, table.triage_level, func.count())
+                .where(*_in_range(column, since, until))
+                .group_by(hour, table.triage_level)
+            )
+            for value, level, count in rows:
+                delta.rows[(_parse_hour(value), level)][position] += count
+
+        seen_at = func.coalesce(table.started_at, table.completed_at)
+        wait = _seconds_sql(table.created_at, seen_at, dialect_name)
+        bucket = case(*[(wait <= bound, i) for i, bound in enumerate(WAIT_BUCKETS)], else_=len(WAIT_BUCKETS))
+        hour = _hour_sql(seen_at, dialect_name)
+        rows = db.execute(
+            select(hour, table.triage_level, bucket, func.count(), func.sum(wait))
+            .where(*_in_range(seen_at, since, until))
+            .group_by(hour, table.triage_level, bucket)
+        )
+        for value, level, bucket_index, count, wait_sum in rows:
+            hour_value = _parse_hour(value)
+            row = delta.rows[(hour_value, level)]
+            row[2] += count
+            row[3] += wait_sum or 0.0
+            delta.buckets[(hour_value, level, bucket_index)] += count
+    return delta
+
+def rebuild_rollups(db: Session, since: datetime.datetime = None, until: datetime.datetime = None):
+    """Recompute the rollups of the hours in [since, until) (all hours by default); not committed."""
+    since = hour_of(since) if since is not None else None
+    until = hour_of(until) if until is not None else None
+    for table in (models.HourlyRollup, models.HourlyWaitBucket):
+        db.execute(delete(table).where(*_in_range(table.hour, since, until)))
+    aggregate_raw(db, since, until).write(db)
+
+# ============ READING ============
+
+def read_rollups(db: Session, since: datetime.datetime, until: datetime.datetime, triage_level: str = None) -> RollupDelta:
+    """The stored rollups of the hours in [since, until)."""
+    delta = RollupDelta()
+    rollup, bucket = models.HourlyRollup, models.HourlyWaitBucket
+    queries = [
+        select(rollup.hour, rollup.triage_level, rollup.arrivals, rollup.discharges, rollup.waits, rollup.wait_seconds)
+        .where(rollup.hour >= since, rollup.hour < until),
+        select(bucket.hour, bucket.triage_level, bucket.bucket, bucket.count)
+        .where(bucket.hour >= since, bucket.hour < until),
+    ]
+    if triage_level is not None:
+        queries = [queries[0].where(rollup.triage_level == triage_level), queries[1].where(bucket.triage_level == triage_level)]
+    for hour, level, *counts in db.execute(queries[0]):
+        delta.rows[(hour, level)] = counts
+    for hour, level, bucket_index, count in db.execute(queries[1]):
+        delta.buckets[(hour, level, bucket_index)] = count
+    return delta
+
+def _period(hour: datetime.datetime, granularity: str) -> datetime.datetime:
+    return hour.replace(hour=0) if granularity == "day" else hour
+
+def report_range(granularity: str, since: datetime.datetime = None, until: datetime.datetime = None):
+    """
+    [since, until) rounded out to whole periods (until includes its own period). Defaults to
+    the last 24 hours for hourly reports and the last 30 days for daily ones, up to now.
+    """
+    step = DAY if granularity == "day" else HOUR
+    until = _period(hour_of(until or datetime.datetime.now(datetime.timezone.utc)), granularity) + step
+    if since is None:
+        since = until - (30 * DAY if granularity == "day" else 24 * HOUR)
+    return _period(hour_of(since), granularity), until
+
+def histogram_quantile(counts: list, q: float):
+    """Quantile of a WAIT_BUCKETS histogram, interpolated linearly within its bucket (None if empty)."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if i == len(WAIT_BUCKETS):
+                # Longer than the last bound: all we know is the lower limit
+                return float(WAIT_BUCKETS[-1])
+            lower = WAIT_BUCKETS[i - 1] if i else 0
+            return lower + (WAIT_BUCKETS[i] - lower) * (rank - seen) / count
+        seen += count
+    return float(WAIT_BUCKETS[-1])
+
+def throughput(delta: RollupDelta, granularity: str = "hour") -> list:
+    """Arrivals and discharges per period and triage level, oldest period first."""
+    totals = defaultdict(lambda: [0, 0])
+    for (hour, level), (arrivals, discharges, _, _) in delta.rows.items():
+        total = totals[(_period(hour, granularity), level)]
+        total[0] += arrivals
+        total[1] += discharges
+    return [
+        {"period_start": period, "triage_level": level, "arrivals": arrivals, "discharges": discharges}
+        for (period, level), (arrivals, discharges) in sorted(totals.items())
+    ]
+
+def wait_times(delta: RollupDelta, granularity: str = "hour") -> list:
+    """Patients seen and their median, 90th percentile and average wait per period and triage level."""
+    seen = defaultdict(lambda: [0, 0.0])
+    histograms = defaultdict(lambda: [0] * (len(WAIT_BUCKETS) + 1))
+    for (hour, level), (_, _, waits, wait_seconds) in delta.rows.items():
+        if waits:
+            total = seen[(_period(hour, granularity), level)]
+            total[0] += waits
+            total[1] += wait_seconds
+    for (hour, level, bucket), count in delta.buckets.items():
+        histograms[(_period(hour, granularity), level)][bucket] += count
+    return [
+        {
+            "period_start": period,
+            "triage_level": level,
+            "waits": waits,
+            "median_wait_seconds": histogram_quantile(histograms[(period, level)], 0.5),
+            "p90_wait_seconds": histogram_quantile(histograms[(period, level)], 0.9),
+            "average_wait_seconds": wait_seconds / waits,
+        }
+        for (period, level), (waits, wait_seconds) in sorted(seen.items())
+    ]
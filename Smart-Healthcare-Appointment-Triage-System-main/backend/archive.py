@@ -0,0 +1,153 @@
+"""
+Archival of finished appointments.
+
+Completed appointments older than ARCHIVE_AFTER_DAYS are moved, together with their
+sent notifications, from the live tables into appointments_archive and
+notifications_archive. Sent notifications older than NOTIFICATION_RETENTION_DAYS are
+moved as well, even while their appointment is still live, so the notifications table
+only holds recent and unsent messages; notification reads merge both tables
+(crud.get_notifications_*), so nothing disappears from a patient's history. Work is done in batches of ARCHIVE_BATCH_SIZE rows,
+each batch in its own short transaction, so the job never holds the writer lock for long.
+
+Run it once from the command line with:  python -m backend.archive
+"""
+import datetime
+
+from sqlalchemy import DateTime, delete, exists, insert, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import config, events, models
+
+# Appointment statuses that have left the queue for good
+FINISHED_STATUSES = ("Completed", "Cancelled")
+
+_APPOINTMENT_COLUMNS = [
+    "id", "patient_id", "symptoms", "triage_level", "priority", "status", "department",
+    "created_at", "started_at", "completed_at",
+]
+_NOTIFICATION_COLUMNS = [
+    "id", "patient_id", "appointment_id", "message", "contact_number",
+    "notification_type", "status", "created_at", "sent_at",
+]
+
+def _select_archivable_ids(db: Session, cutoff: datetime.datetime, batch_size: int) -> list:
+    # Appointments with notifications still pending/failed stay live so they can be retried.
+    unsent_notification = exists().where(
+        models.Notification.appointment_id == models.Appointment.id,
+        models.Notification.status != "Sent",
+    )
+    return list(db.scalars(
+        select(models.Appointment.id)
+        .where(
+            models.Appointment.status.in_(FINISHED_STATUSES),
+            models.Appointment.created_at < cutoff,
+            ~unsent_notification,
+        )
+        .order_by(models.Appointment.id)
+        .limit(batch_size)
+    ))
+
+def _move_notifications(db: Session, condition, now):
+    """Copy the notifications matching condition to notifications_archive and delete them (not committed)."""
+    notification_cols = [getattr(models.Notification, c) for c in _NOTIFICATION_COLUMNS]
+    db.execute(
+        insert(models.ArchivedNotification).from_select(
+            _NOTIFICATION_COLUMNS + ["archived_at"],
+            select(*notification_cols, now).where(condition),
+        )
+    )
+    db.execute(delete(models.Notification).where(condition))
+
+def archive_batch(db: Session, appointment_ids: list):
+    """Move the given appointments and their notifications to the archive tables in one transaction."""
+    now = literal(datetime.datetime.now(datetime.timezone.utc), DateTime)
+    appointment_cols = [getattr(models.Appointment, c) for c in _APPOINTMENT_COLUMNS]
+
+    db.execute(
+        insert(models.ArchivedAppointment).from_select(
+            _APPOINTMENT_COLUMNS + ["archived_at"],
+            select(*appointment_cols, now).where(models.Appointment.id.in_(appointment_ids)),
+        )
+    )
+    _move_notifications(db, models.Notification.appointment_id.in_(appointment_ids), now)
+    db.execute(delete(models.Appointment).where(models.Appointment.id.in_(appointment_ids)))
+    db.commit()
+
+def archive_finished_appointments(db: Session, older_than_days: float = None, batch_size: int = None) -> int:
+    """Archive finished appointments older than the given age. Returns the number archived."""
+    if older_than_days is None:
+        older_than_days = config.ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=older_than_days)
+
+    total = 0
+    while True:
+        appointment_ids = _select_archivable_ids(db, cutoff, batch_size)
+        if not appointment_ids:
+            if total:
+                # Completed counts changed behind the stats' back
+                events.queue_invalidated("archive")
+            return total
+        archive_batch(db, appointment_ids)
+        total += len(appointment_ids)
+
+def archive_sent_notifications(db: Session, older_than_days: float = None, batch_size: int = None) -> int:
+    """Move Sent notifications older than the given age to notifications_archive. Returns the number moved."""
+    if older_than_days is None:
+        older_than_days = config.NOTIFICATION_RETENTION_DAYS
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=older_than_days)
+
+    total = 0
+    while True:
+        # Served by ix_notifications_status (status, created_at)
+        notification_ids = list(db.scalars(
+            select(models.Notification.id)
+            .where(models.Notification.status == "Sent", models.Notification.created_at < cutoff)
+            .order_by(models.Notification.created_at)
+            .limit(batch_size)
+        ))
+        if not notification_ids:
+            return total
+        now = literal(datetime.datetime.now(datetime.timezone.utc), DateTime)
+        _move_notifications(db, models.Notification.id.in_(notification_ids), now)
+        db.commit()
+        total += len(notification_ids)
+
+def run_archive_jobs(db: Session) -> dict:
+    """Both archive jobs, as run periodically by the API and from the command line."""
+    return {
+        "appointments": archive_finished_appointments(db),
+        "notifications": archive_sent_notifications(db),
+    }
+
+def get_archived_appointments(db: Session, patient_id: int, limit: int = None, before: tuple = None):
+    """A patient's archived appointments, most recent first; optionally only those before a (created_at, id) key."""
+    query = db.query(models.ArchivedAppointment).filter(models.ArchivedAppointment.patient_id == patient_id)
+    if before is not None:
+        query = query.filter(tuple_(models.ArchivedAppointment.created_at, models.ArchivedAppointment.id) < before)
+    query = query.order_by(models.ArchivedAppointment.created_at.desc(), models.ArchivedAppointment.id.desc())
+    return query.limit(limit).all() if limit is not None else query.all()
+
+def get_archived_notifications(db: Session, limit: int = None, patient_id: int = None, appointment_id: int = None):
+    """
+    The `limit` (or all) most recent archived notifications, optionally of one patient or appointment.
+    Served by ix_notifications_archive_patient, _appointment and _created respectively.
+    """
+    query = db.query(models.ArchivedNotification)
+    if patient_id is not None:
+        query = query.filter(models.ArchivedNotification.patient_id == patient_id)
+    if appointment_id is not None:
+        query = query.filter(models.ArchivedNotification.appointment_id == appointment_id)
+    query = query.order_by(models.ArchivedNotification.created_at.desc())
+    return query.limit(limit).all() if limit is not None else query.all()
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        counts = run_archive_jobs(session)
+        print(f"Archived {counts['appointments']} appointments and {counts['notifications']} notifications.")
+    finally:
+        session.close()
@@ -0,0 +1,174 @@
+"""
+Bulk import of historical patients and appointments.
+
+Reads a JSONL or CSV file of records (see schemas.ImportRecord), triages each distinct
+symptom text once, dedupes patients by (name, age) in memory, and inserts patients and
+appointments with executemany in batches of IMPORT_BATCH_SIZE records per transaction.
+The number of committed records is stored in import_checkpoints in the same transaction,
+so a failed import can be re-run and resumes after the last committed batch.
+
+    python -m backend.bulk_import records.jsonl [--format csv] [--batch-size 5000] [--restart]
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+from typing import Iterator
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import analytics, crud, events, models, schemas
+
+IMPORT_BATCH_SIZE = 5000
+
+def read_records(path: str, file_format: str = None) -> Iterator[schemas.ImportRecord]:
+    """Stream validated records from a .jsonl or .csv file."""
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            for row in csv.DictReader(f):
+                yield schemas.ImportRecord(**{k: v for k, v in row.items() if v != ""})
+        else:
+            for line in f:
+                if line.strip():
+                    yield schemas.ImportRecord(**json.loads(line))
+
+class BulkImporter:
+    def __init__(self, db: Session, source: str):
+        self.db = db
+        self.source = source
+        # (name, age) -> patient id, for every patient seen so far in this import
+        self.patient_ids = {}
+        # symptoms text -> triage level
+        self.triage_levels = {}
+        self.patients_created = 0
+        self.appointments_created = 0
+
+    def triage(self, symptoms: str) -> str:
+        level = self.triage_levels.get(symptoms)
+        if level is None:
+            level = crud.evaluate_triage_level(symptoms)
+            self.triage_levels[symptoms] = level
+        return level
+
+    def _load_patient_ids(self, keys: list):
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.db.execute(
+                select(models.Patient.name, models.Patient.age, models.Patient.id)
+                .where(tuple_(models.Patient.name, models.Patient.age).in_(chunk))
+            )
+            for name, age, patient_id in rows:
+                self.patient_ids.setdefault((name, age), patient_id)
+
+    def _resolve_patients(self, records: list):
+        """Make sure every patient in the batch has an id, inserting the new ones in one executemany."""
+        unknown = list({(r.name, r.age) for r in records} - self.patient_ids.keys())
+        if not unknown:
+            return
+        self._load_patient_ids(unknown)
+        new_patients = {}
+        for r in records:
+            key = (r.name, r.age)
+            if key not in self.patient_ids and key not in new_patients:
+                new_patients[key] = {"name": r.name, "age": r.age, "gender": r.gender, "contact": r.contact}
+        if new_patients:
+            self.db.execute(insert(models.Patient), list(new_patients.values()))
+            self._load_patient_ids(list(new_patients))
+            self.patients_created += len(new_patients)
+
+    def import_batch(self, records: list, records_done: int):
+        """Insert one batch and advance the checkpoint, all in a single transaction."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            self._resolve_patients(records)
+            appointments = []
+            for r in records:
+                level = self.triage(r.symptoms)
+                appointments.append({
+                    "patient_id": self.patient_ids[(r.name, r.age)],
+                    "symptoms": r.symptoms,
+                    "triage_level": level,
+                    "priority": crud.triage_priority(level),
+                    "status": r.status,
+                    "department": crud.route_department(r.symptoms, level),
+                    "created_at": r.created_at or now,
+                    "started_at": r.started_at,
+                    "completed_at": r.completed_at,
+                })
+            self.db.execute(insert(models.Appointment), appointments)
+            rollups = analytics.RollupDelta()
+            for a in appointments:
+                rollups.appointment(a["triage_level"], a["created_at"], a["started_at"], a["completed_at"])
+            rollups.write(self.db)
+            crud.refresh_patient_summaries(self.db, {a["patient_id"] for a in appointments})
+            self.db.merge(models.ImportCheckpoint(source=self.source, records_done=records_done, updated_at=now))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            # Patients inserted in the rolled-back transaction no longer exist
+            self.patient_ids.clear()
+            raise
+        self.appointments_created += len(appointments)
+
+def get_checkpoint(db: Session, source: str) -> int:
+    checkpoint = db.get(models.ImportCheckpoint, source)
+    return checkpoint.records_done if checkpoint else 0
+
+def import_file(db: Session, path: str, file_format: str = None, batch_size: int = None, restart: bool = False) -> dict:
+    """
+    Import a records file, resuming from its checkpoint unless restart is set.
+    Returns counts of processed records and created patients/appointments.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    source = os.path.abspath(path)
+    if restart:
+        db.query(models.ImportCheckpoint).filter(models.ImportCheckpoint.source == source).delete()
+        db.commit()
+    skip = get_checkpoint(db, source)
+
+    importer = BulkImporter(db, source)
+    records_done = skip
+    batch = []
+    try:
+        for position, record in enumerate(read_records(path, file_format)):
+            if position < skip:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                records_done += len(batch)
+                importer.import_batch(batch, records_done)
+                batch = []
+        if batch:
+            records_done += len(batch)
+            importer.import_batch(batch, records_done)
+    finally:
+        if importer.appointments_created:
+            # Rows were inserted without going through crud
+            events.queue_invalidated("bulk import")
+
+    return {
+        "records_skipped": skip,
+        "records_imported": records_done - skip,
+        "patients_created": importer.patients_created,
+        "appointments_created": importer.appointments_created,
+    }
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import patients and appointments from JSONL or CSV.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint and start from the first record.")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        result = import_file(session, args.path, file_format=args.format, batch_size=args.batch_size, restart=args.restart)
+        print(json.dumps(result))
+    finally:
+        session.close()
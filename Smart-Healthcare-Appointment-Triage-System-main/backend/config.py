@@ -0,0 +1,117 @@
+import os
+
+# Runtime settings, read once from environment variables with sensible defaults.
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+# Put SQLite databases in WAL mode, so readers and the writer don't block each other
+SQLITE_WAL = _env_bool("SQLITE_WAL", True)
+
+# Optional sklearn triage model (see backend/triage_ml.py).
+# joblib/sklearn are only imported when this is switched on.
+TRIAGE_ML_ENABLED = _env_bool("TRIAGE_ML_ENABLED", False)
+TRIAGE_MODEL_PATH = os.getenv("TRIAGE_MODEL_PATH", "triage_model.pkl")
+TRIAGE_VECTORIZER_PATH = os.getenv("TRIAGE_VECTORIZER_PATH", "triage_vectorizer.pkl")
+
+# When no triage keyword matches exactly, correct misspelled keywords (within two edits,
+# see backend/fuzzy.py) and match again
+TRIAGE_FUZZY_MATCHING = _env_bool("TRIAGE_FUZZY_MATCHING", True)
+
+# Load models and fill in-memory caches in a background thread once the app has started.
+WARM_CACHES_ON_STARTUP = _env_bool("WARM_CACHES_ON_STARTUP", True)
+
+# Archival of finished appointments (see backend/archive.py)
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# How often the archive job runs in the API process; 0 disables it.
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Sent notifications older than this move to notifications_archive even while their appointment is live
+NOTIFICATION_RETENTION_DAYS = float(os.getenv("NOTIFICATION_RETENTION_DAYS", "7"))
+
+# Queue statistics are kept in memory and rebuilt from SQL at least this often (see backend/stats.py)
+STATS_RECONCILE_SECONDS = float(os.getenv("STATS_RECONCILE_SECONDS", "60"))
+# How often the in-memory per-department queue order is rebuilt from SQL
+QUEUE_INDEX_RECONCILE_SECONDS = float(os.getenv("QUEUE_INDEX_RECONCILE_SECONDS", "60"))
+
+# Scheduled appointments (see backend/slot_index.py): how many days ahead slots can be
+# found and booked, and how often the in-memory free-slot index is rebuilt from SQL
+SCHEDULING_HORIZON_DAYS = int(os.getenv("SCHEDULING_HORIZON_DAYS", "56"))
+SLOT_INDEX_RECONCILE_SECONDS = float(os.getenv("SLOT_INDEX_RECONCILE_SECONDS", "300"))
+
+# Patient profiles read through an in-process cache (see backend/patient_cache.py): how long
+# an entry may be served and how many are kept; a TTL of 0 disables the shared cache
+PATIENT_CACHE_TTL_SECONDS = float(os.getenv("PATIENT_CACHE_TTL_SECONDS", "30"))
+PATIENT_CACHE_MAX_ENTRIES = int(os.getenv("PATIENT_CACHE_MAX_ENTRIES", "10000"))
+
+# Queue aging: score points gained per minute of waiting (base scores are Emergency 300,
+# Urgent 200, Routine 100; aged scores are capped below Emergency)
+AGING_RATE_URGENT = float(os.getenv("AGING_RATE_URGENT", "1.0"))
+AGING_RATE_ROUTINE = float(os.getenv("AGING_RATE_ROUTINE", "0.5"))
+
+# Responses of at least this many bytes are gzip/brotli compressed when the client accepts it
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+# Serialized /appointments responses are reused until the queue changes, for at most this
+# long and never into the next minute (queue aging reorders waiting patients); 0 disables
+QUEUE_CACHE_TTL_SECONDS = float(os.getenv("QUEUE_CACHE_TTL_SECONDS", "10"))
+
+# SQL statements taking at least this long are logged to "triage.slow_queries"; 0 disables
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.1"))
+
+# Group commit for /book (see backend/group_commit.py): one writer thread commits concurrent
+# bookings together, waiting at most GROUP_COMMIT_WINDOW_MS for more, up to GROUP_COMMIT_MAX_BATCH
+GROUP_COMMIT_ENABLED = _env_bool("GROUP_COMMIT_ENABLED", True)
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+# Idempotency-Key retries of POST /book (see backend/idempotency.py): "memory" (per process)
+# or "table" (idempotency_keys table, shared by every worker)
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# A patient can't be booked again while a booking from the last this-many seconds is still queued; 0 disables
+DUPLICATE_BOOKING_WINDOW_SECONDS = float(os.getenv("DUPLICATE_BOOKING_WINDOW_SECONDS", "1800"))
+
+# Longest range one /analytics/* request may cover
+ANALYTICS_MAX_RANGE_DAYS = int(os.getenv("ANALYTICS_MAX_RANGE_DAYS", "366"))
+
+# Arrival forecasts (see backend/forecast.py): weeks of rollups the first fit reads, the
+# weight of the newest week in the seasonal baselines, how often the cached forecast is
+# recomputed, and the longest horizon /analytics/forecast serves
+FORECAST_HISTORY_WEEKS = int(os.getenv("FORECAST_HISTORY_WEEKS", "8"))
+FORECAST_SMOOTHING = float(os.getenv("FORECAST_SMOOTHING", "0.3"))
+FORECAST_REFRESH_SECONDS = float(os.getenv("FORECAST_REFRESH_SECONDS", "300"))
+FORECAST_MAX_HOURS = int(os.getenv("FORECAST_MAX_HOURS", "24"))
+
+# Admission control (see backend/admission.py): concurrent requests per lane, how long an
+# over-limit request waits for a slot, and the queue/booking latency above which
+# low-priority reads and exports are shed. Emergency bookings are never limited.
+ADMISSION_CONTROL_ENABLED = _env_bool("ADMISSION_CONTROL_ENABLED", True)
+ADMISSION_LIMIT_BOOKING = int(os.getenv("ADMISSION_LIMIT_BOOKING", "16"))
+ADMISSION_LIMIT_QUEUE = int(os.getenv("ADMISSION_LIMIT_QUEUE", "10"))
+# SQLite runs one write at a time, so more concurrent staff writes would only wait on each other
+ADMISSION_LIMIT_WRITE = int(os.getenv("ADMISSION_LIMIT_WRITE", "1"))
+ADMISSION_LIMIT_LOW = int(os.getenv("ADMISSION_LIMIT_LOW", "2"))
+ADMISSION_LIMIT_EXPORT = int(os.getenv("ADMISSION_LIMIT_EXPORT", "1"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_LATENCY_SLO_SECONDS = float(os.getenv("ADMISSION_LATENCY_SLO_SECONDS", "0.5"))
+# How fast that latency average fades once booking and queue requests stop coming in
+ADMISSION_LATENCY_HALF_LIFE_SECONDS = float(os.getenv("ADMISSION_LATENCY_HALF_LIFE_SECONDS", "5"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+
+# Cross-worker queue events (see backend/events.py): "local" (single process), "table"
+# (change-log table in the shared database, polled) or "redis" (pub/sub, needs the redis package)
+EVENT_BUS = os.getenv("EVENT_BUS", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# How often each worker reads the change-log table, i.e. the worst-case lag between workers
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "0.5"))
+# Change-log rows older than this are deleted
+EVENT_RETENTION_SECONDS = float(os.getenv("EVENT_RETENTION_SECONDS", "3600"))
+# How long a poll keeps looking for a change-log id that a newer id overtook (PostgreSQL
+# commits ids out of order; a rolled-back insert leaves an id that never appears)
+EVENT_GAP_SECONDS = float(os.getenv("EVENT_GAP_SECONDS", "30"))
@@ -1,18 +1,67 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import DateTime, Integer, bindparam, case, func, or_, select, text, tuple_, update
+import base64
+import binascii
 import datetime
+import re
 
-from . import models, schemas
+from . import config, models, schemas, triage_ml, archive, metrics, events, analytics, fuzzy, patient_cache
+from .queue_index import queue_index
+from .slot_index import slot_index, is_on_grid
 
 def get_patient(db: Session, patient_id: int):
-    return db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    """The patient's profile (schemas.PatientProfile) or None, read through backend/patient_cache.py."""
+    return patient_cache.get_patient(db, patient_id)
+
+# Appointments per /patients/{id} history page unless the client asks for another size
+HISTORY_PAGE_SIZE = 20
+
+def encode_history_cursor(appointment) -> str:
+    """Opaque cursor pointing just after this appointment in a most-recent-first history."""
+    key = f"{appointment.created_at.isoformat()}|{appointment.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_history_cursor(cursor: str) -> tuple:
+    """(created_at, id) key of a history cursor. Raises ValueError for anything malformed."""
+    try:
+        created_at, appointment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(appointment_id)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+def get_patient_history(db: Session, patient_id: int, limit: int = HISTORY_PAGE_SIZE, before: tuple = None):
+    """
+    One page of a patient's appointments, live and archived, most recent first.
+    `before` is the decoded cursor of the previous page. Each table only reads limit + 1 rows
+    from its (patient_id, created_at) index, however long the history is.
+    Returns (appointments, cursor of the next page or None).
+    """
+    live = db.query(models.Appointment).filter(models.Appointment.patient_id == patient_id)
+    if before is not None:
+        live = live.filter(tuple_(models.Appointment.created_at, models.Appointment.id) < before)
+    live = live.order_by(models.Appointment.created_at.desc(), models.Appointment.id.desc()).limit(limit + 1).all()
+    archived = archive.get_archived_appointments(db, patient_id, limit=limit + 1, before=before)
+
+    page = sorted(live + archived, key=lambda a: (a.created_at, a.id), reverse=True)
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    return page, encode_history_cursor(page[-1])
 
 def get_patient_by_details(db: Session, name: str, age: int):
     return db.query(models.Patient).filter(models.Patient.name == name, models.Patient.age == age).first()
 
-def create_patient(db: Session, patient: schemas.PatientCreate):
+def add_patient(db: Session, patient: schemas.PatientCreate):
+    """Insert a patient in the current transaction (flushed, not committed)."""
     db_patient = models.Patient(**patient.model_dump())
     db.add(db_patient)
+    db.flush()
+    patient_cache.invalidate(db, db_patient.id)
+    return db_patient
+
+def create_patient(db: Session, patient: schemas.PatientCreate):
+    db_patient = add_patient(db, patient)
     db.commit()
     db.refresh(db_patient)
     return db_patient
@@ -20,59 +69,487 @@ def create_patient(db: Session, patient: schemas.PatientCreate):
 def get_all_patients(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Patient).offset(skip).limit(limit).all()
 
-def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
-    db_appointment = models.Appointment(**appointment.model_dump())
+def search_patients(db: Session, query: str, skip: int = 0, limit: int = 20):
+    """
+    Search patients by name, contact or symptoms. Every word in the query must match
+    the start of a word in one of those fields, e.g. "joh 0100" finds John Doe, 555-0100.
+    Newest patients come first, which lets the index stop after one page of matches.
+    """
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return []
+    if db.get_bind().dialect.name != "sqlite":
+        # No FTS5 outside SQLite: fall back to a LIKE scan over name and contact
+        filters = [or_(models.Patient.name.ilike(f"%{t}%"), models.Patient.contact.ilike(f"%{t}%")) for t in terms]
+        return db.query(models.Patient).filter(*filters).order_by(models.Patient.id).offset(skip).limit(limit).all()
+
+    match = " ".join(f'"{t}"*' for t in terms)
+    ids = [row[0] for row in db.execute(
+        text("SELECT rowid FROM patient_search WHERE patient_search MATCH :match ORDER BY rowid DESC LIMIT :limit OFFSET :skip"),
+        {"match": match, "limit": limit, "skip": skip},
+    )]
+    patients = {p.id: p for p in db.query(models.Patient).filter(models.Patient.id.in_(ids))}
+    return [patients[i] for i in ids if i in patients]
+
+# Custom sorting weights for the queue: Emergency patients must be placed at the top.
+TRIAGE_PRIORITY = {"Emergency": 1, "Urgent": 2, "Routine": 3}
+TRIAGE_LEVELS = {priority: level for level, priority in TRIAGE_PRIORITY.items()}
+
+def triage_priority(triage_level: str) -> int:
+    return TRIAGE_PRIORITY.get(triage_level, 4)
+
+# Department queues. Emergencies always go to the Emergency department; other cases are
+# routed by the first specialty whose keywords appear in the symptoms, else General.
+EMERGENCY_DEPARTMENT = "Emergency"
+DEFAULT_DEPARTMENT = "General"
+DEPARTMENT_KEYWORDS = {
+    "Orthopedics": ["fracture", "broken", "sprain", "dislocat", "joint"],
+    "Respiratory": ["cough", "asthma", "wheez", "congestion"],
+    "Dermatology": ["rash", "skin", "itch", "burn"],
+}
+DEPARTMENTS = [EMERGENCY_DEPARTMENT, *DEPARTMENT_KEYWORDS, DEFAULT_DEPARTMENT]
+
+def route_department(symptoms: str, triage_level: str) -> str:
+    if triage_level == "Emergency":
+        return EMERGENCY_DEPARTMENT
+    symptoms_lower = symptoms.lower()
+    for department, keywords in DEPARTMENT_KEYWORDS.items():
+        if any(keyword in symptoms_lower for keyword in keywords):
+            return department
+    return DEFAULT_DEPARTMENT
+
+def add_appointment(db: Session, appointment: schemas.AppointmentCreate):
+    """Insert an appointment in the current transaction (flushed, not committed, no event yet)."""
+    data = appointment.model_dump()
+    data["department"] = data["department"] or route_department(appointment.symptoms, appointment.triage_level)
+    db_appointment = models.Appointment(**data, priority=triage_priority(appointment.triage_level))
     db.add(db_appointment)
+    db.flush()
+    _count_visit(db, db_appointment)
+    analytics.record_arrival(db, db_appointment)
+    return db_appointment
+
+# ============ PATIENT SUMMARY ============
+# Patients carry a precomputed visit summary (see models.Patient) so patient detail never
+# has to scan their history. Single writes adjust it in the same transaction; bulk writes
+# recompute it for the patients they touched with refresh_patient_summaries.
+
+OPEN_STATUSES = ("Queued", "In Progress")
+
+def _count_visit_statement():
+    patient = models.Patient
+    created_at = bindparam("created_at", type_=DateTime)
+    priority = bindparam("priority", type_=Integer)
+    return (
+        update(patient)
+        .where(patient.id == bindparam("patient_id"))
+        .values(
+            visit_count=patient.visit_count + 1,
+            last_visit_at=case(
+                (or_(patient.last_visit_at.is_(None), patient.last_visit_at < created_at), created_at),
+                else_=patient.last_visit_at,
+            ),
+            highest_priority=case(
+                (or_(patient.highest_priority.is_(None), patient.highest_priority > priority), priority),
+                else_=patient.highest_priority,
+            ),
+            open_appointments=patient.open_appointments + bindparam("opened", type_=Integer),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+# Built once: this runs on every booking, and building the CASE expressions costs more than executing them
+_COUNT_VISIT = _count_visit_statement()
+
+_CLOSE_VISIT = (
+    update(models.Patient)
+    .where(models.Patient.id == bindparam("patient_id"))
+    .values(open_appointments=models.Patient.open_appointments - 1)
+    .execution_options(synchronize_session=False)
+)
+
+def _count_visit(db: Session, appointment: models.Appointment):
+    """Add a freshly inserted appointment to its patient's summary."""
+    patient_cache.invalidate(db, appointment.patient_id)
+    db.execute(_COUNT_VISIT, {
+        "patient_id": appointment.patient_id,
+        "created_at": appointment.created_at,
+        "priority": appointment.priority,
+        "opened": 1 if appointment.status in OPEN_STATUSES else 0,
+    })
+
+def _close_visit(db: Session, patient_id: int):
+    """An appointment of this patient left the Queued/In Progress statuses."""
+    patient_cache.invalidate(db, patient_id)
+    db.execute(_CLOSE_VISIT, {"patient_id": patient_id})
+
+def refresh_patient_summaries(db: Session, patient_ids: list, chunk_size: int = 500):
+    """Recompute the summary of the given patients from all their appointments (not committed)."""
+    patient_ids = list(patient_ids)
+    for offset in range(0, len(patient_ids), chunk_size):
+        chunk = patient_ids[offset:offset + chunk_size]
+        summaries = {
+            patient_id: {"id": patient_id, "visit_count": 0, "last_visit_at": None, "highest_priority": None, "open_appointments": 0}
+            for patient_id in chunk
+        }
+        for table in (models.Appointment, models.ArchivedAppointment):
+            rows = db.execute(
+                select(
+                    table.patient_id, func.count(), func.max(table.created_at), func.min(table.priority),
+                    func.sum(case((table.status.in_(OPEN_STATUSES), 1), else_=0)),
+                )
+                .where(table.patient_id.in_(chunk))
+                .group_by(table.patient_id)
+            )
+            for patient_id, visits, last_visit_at, highest_priority, open_count in rows:
+                summary = summaries[patient_id]
+                summary["visit_count"] += visits
+                summary["open_appointments"] += open_count or 0
+                if last_visit_at is not None and (summary["last_visit_at"] is None or last_visit_at > summary["last_visit_at"]):
+                    summary["last_visit_at"] = last_visit_at
+                if highest_priority is not None and (summary["highest_priority"] is None or highest_priority < summary["highest_priority"]):
+                    summary["highest_priority"] = highest_priority
+        # Bulk UPDATE by primary key
+        db.execute(update(models.Patient), list(summaries.values()))
+        for patient_id in chunk:
+            patient_cache.invalidate(db, patient_id)
+
+def patient_summary(patient: models.Patient) -> schemas.PatientSummary:
+    return schemas.PatientSummary(
+        visit_count=patient.visit_count or 0,
+        last_visit_at=patient.last_visit_at,
+        highest_triage_level=TRIAGE_LEVELS.get(patient.highest_priority),
+        open_appointments=patient.open_appointments or 0,
+    )
+
+class DuplicateBookingError(Exception):
+    """The patient already has a recent appointment that is still queued."""
+
+    def __init__(self, appointment_id: int):
+        super().__init__(f"Patient already has a queued appointment (id {appointment_id})")
+        self.appointment_id = appointment_id
+
+def find_recent_queued_appointment(db: Session, patient_id: int):
+    """The patient's queued appointment booked within DUPLICATE_BOOKING_WINDOW_SECONDS, if any."""
+    if config.DUPLICATE_BOOKING_WINDOW_SECONDS <= 0:
+        return None
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=config.DUPLICATE_BOOKING_WINDOW_SECONDS)
+    # Served by ix_appointments_patient_queue
+    return db.query(models.Appointment).filter(
+        models.Appointment.patient_id == patient_id,
+        models.Appointment.status == "Queued",
+        models.Appointment.created_at >= cutoff,
+    ).first()
+
+def book_appointment(db: Session, request: schemas.BookRequest, triage_level: str):
+    """
+    Find or add the patient and add their appointment, in the current transaction (not committed).
+    Raises DuplicateBookingError if the patient was booked recently and is still queued.
+    """
+    db_patient = get_patient_by_details(db, name=request.patient.name, age=request.patient.age)
+    if not db_patient:
+        db_patient = add_patient(db, request.patient)
+    else:
+        duplicate = find_recent_queued_appointment(db, db_patient.id)
+        if duplicate is not None:
+            raise DuplicateBookingError(duplicate.id)
+    return add_appointment(db, schemas.AppointmentCreate(
+        patient_id=db_patient.id,
+        symptoms=request.symptoms,
+        triage_level=triage_level,
+    ))
+
+def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
+    db_appointment = add_appointment(db, appointment)
+    events.appointment_created(db, db_appointment)
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
 
-def get_appointments(db: Session, skip: int = 0, limit: int = 100):
-    # Order by triage level using conditional logic. 
-    # Emergency patients must be placed at the top of the queue.
-    # We assign custom sorting weights: Emergency = 1, Urgent = 2, Routine = 3
-    triage_order = case(
-        (models.Appointment.triage_level == 'Emergency', 1),
-        (models.Appointment.triage_level == 'Urgent', 2),
-        (models.Appointment.triage_level == 'Routine', 3),
-        else_=4
-    )
-    
-    return (
-        db.query(models.Appointment)
-        .filter(models.Appointment.status == "Queued")
-        .order_by(triage_order, models.Appointment.created_at)
-        .offset(skip).limit(limit).all()
+def _in_index_order(ids: list, rows: list, id_of, status_of) -> list:
+    """
+    Put rows fetched with WHERE id IN (...) back in queue order; drop the index if it was stale.
+    The status is checked here rather than in SQL: with a status condition SQLite prefers
+    ix_appointments_queue and scans the whole queue instead of doing primary key lookups.
+    """
+    by_id = {id_of(row): row for row in rows if status_of(row) == "Queued"}
+    if len(by_id) < len(ids):
+        # Some ids are no longer queued: another process changed the queue
+        queue_index.reset()
+    return [by_id[i] for i in ids if i in by_id]
+
+def get_appointments(db: Session, skip: int = 0, limit: int = 100, department: str = None):
+    """
+    Queued appointments ordered by effective score (triage level plus aging, see
+    backend/queue_index.py); for one department or across all of them. The order comes from
+    the in-memory queue index, so the database only fetches the requested rows by primary key.
+    """
+    ids = queue_index.ordered_ids(db, department=department, skip=skip, limit=limit)
+    if not ids:
+        return []
+    rows = db.query(models.Appointment).filter(models.Appointment.id.in_(ids)).all()
+    return _in_index_order(ids, rows, lambda a: a.id, lambda a: a.status)
+
+# Columns the compact queue view can return, by output field name
+QUEUE_FIELDS = {
+    "id": models.Appointment.id,
+    "patient_id": models.Appointment.patient_id,
+    "symptoms": models.Appointment.symptoms,
+    "triage_level": models.Appointment.triage_level,
+    "status": models.Appointment.status,
+    "department": models.Appointment.department,
+    "created_at": models.Appointment.created_at,
+    "patient_name": models.Patient.name,
+    "patient_age": models.Patient.age,
+    "patient_contact": models.Patient.contact,
+}
+COMPACT_QUEUE_FIELDS = ["id", "triage_level", "created_at", "patient_name", "patient_age"]
+
+def get_appointments_compact(db: Session, fields: list = None, skip: int = 0, limit: int = 100, department: str = None):
+    """
+    Same queue order as get_appointments, but as plain dicts built from a single
+    column-only joined SELECT: no ORM objects and no lazy patient loads.
+    """
+    fields = fields or COMPACT_QUEUE_FIELDS
+    ids = queue_index.ordered_ids(db, department=department, skip=skip, limit=limit)
+    if not ids:
+        return []
+    stmt = (
+        select(models.Appointment.id, models.Appointment.status, *(QUEUE_FIELDS[f] for f in fields))
+        .select_from(models.Appointment)
+        .join(models.Patient, models.Patient.id == models.Appointment.patient_id)
+        .where(models.Appointment.id.in_(ids))
     )
+    rows = _in_index_order(ids, db.execute(stmt).all(), lambda row: row[0], lambda row: row[1])
+    return [dict(zip(fields, row[2:])) for row in rows]
 
 def delete_appointment(db: Session, appointment_id: int):
     db_appointment = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
     if db_appointment:
+        old_status = db_appointment.status
         db_appointment.status = "Completed"
+        if old_status != "Completed":
+            db_appointment.completed_at = datetime.datetime.now(datetime.timezone.utc)
+            analytics.record_completed(db, db_appointment, old_status)
+        if old_status in OPEN_STATUSES:
+            _close_visit(db, db_appointment.patient_id)
+        events.appointment_status_changed(db, db_appointment, old_status)
         db.commit()
         db.refresh(db_appointment)
     return db_appointment
 
+# Top-of-queue appointments tried, in order, before falling back to the SQL queue order
+CLAIM_CANDIDATES = 20
+
+def _claim(db: Session, appointment_filter):
+    """
+    UPDATE ... SET status = 'In Progress' ... RETURNING id for one queued appointment matching
+    the filter, recording its wait in the analytics rollups and its event in the same transaction.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "sqlite" and not connection.connection.dbapi_connection.in_transaction:
+        # Take the write lock before reading, so claimers queue up on the busy timeout
+        # instead of failing to upgrade a read lock
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    claimed = db.execute(
+        update(models.Appointment)
+        .where(appointment_filter, models.Appointment.status == "Queued")
+        .values(status="In Progress", started_at=started_at)
+        .returning(models.Appointment.id, models.Appointment.patient_id, models.Appointment.status,
+                   models.Appointment.triage_level, models.Appointment.priority,
+                   models.Appointment.department, models.Appointment.created_at)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if claimed is not None:
+        analytics.record_started(db, claimed.triage_level, claimed.created_at, started_at)
+        events.appointment_status_changed(db, claimed, "Queued")
+    db.commit()
+    return claimed.id if claimed is not None else None
+
+def claim_next_appointment(db: Session, department: str = None):
+    """
+    Atomically move the first queued appointment (of one department, or overall) to
+    "In Progress" and return it (None if the queue is empty). The candidate comes from the
+    queue index, so aging is taken into account; the UPDATE only succeeds while the row is
+    still queued, so two clinicians calling this at the same time never get the same patient.
+    """
+    claimed_id = None
+    for candidate in queue_index.ordered_ids(db, department=department, limit=CLAIM_CANDIDATES):
+        claimed_id = _claim(db, models.Appointment.id == candidate)
+        if claimed_id is not None:
+            break
+        # Claimed or discharged elsewhere (e.g. by another process) since the index saw it
+        queue_index.on_removed(candidate)
+
+    if claimed_id is None:
+        # Nothing usable in the index: take the top of the queue in SQL order instead
+        next_id = (
+            select(models.Appointment.id)
+            .where(models.Appointment.status == "Queued")
+            .order_by(models.Appointment.priority, models.Appointment.created_at, models.Appointment.id)
+            .limit(1)
+        )
+        if department is not None:
+            next_id = next_id.where(models.Appointment.department == department)
+        if db.get_bind().dialect.name == "postgresql":
+            # Concurrent claimers skip the row another transaction is claiming instead of waiting on it
+            next_id = next_id.with_for_update(skip_locked=True)
+        claimed_id = _claim(db, models.Appointment.id == next_id.scalar_subquery())
+        if claimed_id is None:
+            return None
+
+    return db.get(models.Appointment, claimed_id, populate_existing=True)
+
+# Simple keyword-based evaluation for beginner-friendly triage logic
+EMERGENCY_KEYWORDS = ['chest pain', 'heart attack', 'bleeding', 'unconscious', 'breathing', 'stroke']
+URGENT_KEYWORDS = ['fever', 'fracture', 'broken', 'pain', 'vomiting', 'dizziness']
+
+# Every keyword word, emergency ones first so they win ties; built once at import
+triage_vocabulary = fuzzy.FuzzyIndex(
+    word for keyword in EMERGENCY_KEYWORDS + URGENT_KEYWORDS for word in keyword.split()
+)
+
+def _keyword_level(text: str):
+    for keyword in EMERGENCY_KEYWORDS:
+        if keyword in text:
+            return "Emergency"
+    for keyword in URGENT_KEYWORDS:
+        if keyword in text:
+            return "Urgent"
+    return None
+
+@metrics.timed_function(metrics.triage_duration, "total")
 def evaluate_triage_level(symptoms: str) -> str:
     """
     Evaluate symptoms to determine triage priority.
     """
     symptoms_lower = symptoms.lower()
-    
-    # Simple keyword-based evaluation for beginner-friendly triage logic
-    emergency_keywords = ['chest pain', 'heart attack', 'bleeding', 'unconscious', 'breathing', 'stroke']
-    urgent_keywords = ['fever', 'fracture', 'broken', 'pain', 'vomiting', 'dizziness']
-    
-    for keyword in emergency_keywords:
-        if keyword in symptoms_lower:
-            return "Emergency"
-            
-    for keyword in urgent_keywords:
-        if keyword in symptoms_lower:
-            return "Urgent"
+    level = _keyword_level(symptoms_lower)
+    if level == "Emergency":
+        return level
+
+    # Short of an Emergency, match again with misspelled keywords corrected:
+    # "chset pain" is chest pain, not just pain
+    if config.TRIAGE_FUZZY_MATCHING:
+        corrected, corrections = triage_vocabulary.correct(symptoms_lower)
+        if corrections:
+            for _, keyword in corrections:
+                metrics.triage_fuzzy_corrections.inc(keyword)
+            level = _keyword_level(corrected) or level
+    if level is not None:
+        return level
+
+    # Optional second pass: let the sklearn model flag emergencies the keywords missed.
+    # Only runs when a model is configured, so joblib/sklearn stay out of the default path.
+    if triage_ml.is_model_configured() and triage_ml.ml_based_triage(symptoms) == "Emergency":
+        return "Emergency"
             
     return "Routine"
 
+# ============ SCHEDULING FUNCTIONS ============
+
+class SlotUnavailableError(Exception):
+    """The requested slot doesn't exist for the provider or is already booked."""
+
+class SlotOutOfRangeError(Exception):
+    """The requested slot is in the past or beyond the scheduling horizon."""
+
+class NotRoutineError(Exception):
+    """Only Routine cases are scheduled; anything more serious goes through the walk-in queue."""
+
+    def __init__(self, triage_level: str):
+        super().__init__(f"Symptoms triage as {triage_level}: book a walk-in appointment with /book instead")
+        self.triage_level = triage_level
+
+def create_provider(db: Session, provider: schemas.ProviderCreate):
+    db_provider = models.Provider(**provider.model_dump())
+    db.add(db_provider)
+    db.flush()
+    events.provider_added(db, db_provider)
+    db.commit()
+    db.refresh(db_provider)
+    return db_provider
+
+def get_providers(db: Session, department: str = None):
+    query = db.query(models.Provider)
+    if department is not None:
+        query = query.filter(models.Provider.department == department)
+    return query.order_by(models.Provider.id).all()
+
+def find_free_slots(db: Session, count: int, after: datetime.datetime = None,
+                    department: str = None, provider_id: int = None) -> list:
+    """The `count` earliest free slots, as dicts for schemas.FreeSlot."""
+    now = datetime.datetime.now()
+    after = max(after, now) if after is not None else now
+    providers = {}
+    slots = []
+    for start_at, pid in slot_index.next_free(db, count, after, department=department, provider_id=provider_id):
+        if pid not in providers:
+            providers[pid] = db.get(models.Provider, pid)
+        provider = providers[pid]
+        slots.append({
+            "provider_id": pid,
+            "provider_name": provider.name,
+            "department": provider.department,
+            "start_at": start_at,
+            "end_at": start_at + datetime.timedelta(minutes=provider.slot_minutes),
+        })
+    return slots
+
+def book_slot(db: Session, provider: models.Provider, request: schemas.SlotBookRequest, triage_level: str = None):
+    """
+    Book a provider's slot for a Routine case and commit. Raises SlotOutOfRangeError if the
+    slot is in the past or beyond SCHEDULING_HORIZON_DAYS, SlotUnavailableError if it is off
+    the provider's grid or already booked (the database's unique index decides between
+    concurrent bookings), and NotRoutineError for anything more serious.
+    """
+    start_at = request.start_at
+    now = datetime.datetime.now()
+    if start_at <= now:
+        raise SlotOutOfRangeError("This slot is in the past")
+    if start_at >= now + datetime.timedelta(days=config.SCHEDULING_HORIZON_DAYS):
+        raise SlotOutOfRangeError(f"Slots can be booked up to {config.SCHEDULING_HORIZON_DAYS} days ahead")
+    if not is_on_grid(provider, start_at):
+        raise SlotUnavailableError("No such free slot for this provider")
+    triage_level = triage_level or evaluate_triage_level(request.symptoms)
+    if triage_level != "Routine":
+        raise NotRoutineError(triage_level)
+
+    db_patient = get_patient_by_details(db, name=request.patient.name, age=request.patient.age)
+    if not db_patient:
+        db_patient = add_patient(db, request.patient)
+    db_slot = models.ScheduledSlot(
+        provider_id=provider.id,
+        patient_id=db_patient.id,
+        symptoms=request.symptoms,
+        start_at=start_at,
+        end_at=start_at + datetime.timedelta(minutes=provider.slot_minutes),
+    )
+    db.add(db_slot)
+    try:
+        db.flush()
+        # Other workers take the slot off their index too
+        events.slot_booked(db, provider.id, start_at)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # Booked by someone else, possibly in another worker: the index missed it
+        slot_index.on_booked(provider.id, start_at)
+        raise SlotUnavailableError("This slot has just been booked")
+    db.refresh(db_slot)
+    return db_slot
+
+def cancel_slot(db: Session, slot_id: int):
+    """Cancel a booking and free its slot. Returns the slot, or None if there is no such booking."""
+    db_slot = db.get(models.ScheduledSlot, slot_id)
+    if db_slot is None or db_slot.status != "Booked":
+        return None
+    db_slot.status = "Cancelled"
+    events.slot_released(db, db_slot.provider_id, db_slot.start_at)
+    db.commit()
+    return db_slot
+
 # ============ NOTIFICATION FUNCTIONS ============
 
 def send_sms_notification(phone_number: str, message: str) -> bool:
@@ -125,31 +602,42 @@ def send_notification(db: Session, notification_data: schemas.NotificationSend):
     db.refresh(db_notification)
     return db_notification
 
+def _merge_notifications(live, archived, skip: int, limit: int):
+    """One page of live and archived notifications together, most recent first."""
+    merged = sorted(live + archived, key=lambda n: (n.created_at, n.id), reverse=True)
+    return merged[skip:skip + limit]
+
 def get_notifications_by_patient(db: Session, patient_id: int, skip: int = 0, limit: int = 50):
-    """Get all notifications for a patient"""
-    return (
+    """Get all notifications for a patient, archived ones included"""
+    live = (
         db.query(models.Notification)
         .filter(models.Notification.patient_id == patient_id)
         .order_by(models.Notification.created_at.desc())
-        .offset(skip).limit(limit).all()
+        .limit(skip + limit).all()
     )
+    archived = archive.get_archived_notifications(db, limit=skip + limit, patient_id=patient_id)
+    return _merge_notifications(live, archived, skip, limit)
 
 def get_notifications_by_appointment(db: Session, appointment_id: int):
-    """Get all notifications for an appointment"""
-    return (
+    """Get all notifications for an appointment, archived ones included"""
+    live = (
         db.query(models.Notification)
         .filter(models.Notification.appointment_id == appointment_id)
         .order_by(models.Notification.created_at.desc())
         .all()
     )
+    archived = archive.get_archived_notifications(db, appointment_id=appointment_id)
+    return _merge_notifications(live, archived, 0, len(live) + len(archived))
 
 def get_all_notifications(db: Session, skip: int = 0, limit: int = 100):
-    """Get all notifications"""
-    return (
+    """Get all notifications, archived ones included"""
+    live = (
         db.query(models.Notification)
         .order_by(models.Notification.created_at.desc())
-        .offset(skip).limit(limit).all()
+        .limit(skip + limit).all()
     )
+    archived = archive.get_archived_notifications(db, limit=skip + limit)
+    return _merge_notifications(live, archived, skip, limit)
 
 def get_pending_notifications(db: Session):
     """Get all pending notifications (for retry logic)"""
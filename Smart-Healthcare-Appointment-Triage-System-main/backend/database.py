@@ -1,20 +1,31 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+from . import config, metrics
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
 
 # connect_args={"check_same_thread": False} is needed only for SQLite.
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
 )
 
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite") and config.SQLITE_WAL:
+    @event.listens_for(engine, "connect")
+    def use_wal_journal(dbapi_connection, connection_record):
+        # In WAL mode readers never block the writer (and vice versa), so a burst of
+        # history reads can't hold up a booking's commit
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    with metrics.timed(metrics.db_session_duration):
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
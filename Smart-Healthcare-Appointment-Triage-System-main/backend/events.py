@@ -0,0 +1,389 @@
+"""
+Queue change events, shared between API workers.
+
+Every change to the queue (booking, claim, discharge, or a bulk write such as an import)
+is turned into an event, and so is every change to scheduled appointments (new providers,
+slot bookings and cancellations). The process that made the change applies it to its own in-memory
+state; the event bus then carries it to every other worker, which applies it too.
+In-memory state here means the queue stats, the queue index and the cached /appointments
+bodies, plus any live-stream (/queue/events) subscribers; for scheduling events, the
+free-slot index.
+
+Single changes record their event in the transaction that makes the change
+(record(db, event)); it is applied and forwarded once that transaction commits, and
+dropped if it rolls back. On the table bus the change-log row is written in the same
+transaction (an outbox), so it costs no commit of its own and can't be lost between
+the change and the event. Bulk changes publish straight away, after their own commits.
+
+Backends, selected with EVENT_BUS:
+
+- "local"  single process; events only reach this process (the default).
+- "table"  a queue_events change-log table in the shared database, polled every
+           EVENT_POLL_SECONDS. Works for several uvicorn workers on one SQLite file or
+           for several nodes on one PostgreSQL database; lag is at most one poll interval.
+           On PostgreSQL ids can commit out of order, so ids skipped by a poll are
+           looked for again for up to EVENT_GAP_SECONDS.
+- "redis"  Redis pub/sub on REDIS_URL (needs the optional `redis` package), published
+           after commit.
+
+Workers that miss events (e.g. after a restart) still converge: the queue stats and index
+reconcile from SQL every STATS_RECONCILE_SECONDS / QUEUE_INDEX_RECONCILE_SECONDS.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.event import listens_for
+from sqlalchemy.orm import Session
+
+from . import config, models
+from .patient_cache import patient_cache
+from .queue_index import queue_index
+from .responses import queue_response_cache
+from .slot_index import slot_index
+from .stats import queue_stats
+
+# Identifies this process, so a worker can skip its own events coming back from the bus
+ORIGIN = uuid.uuid4().hex
+
+log = logging.getLogger("triage.events")
+
+# Key in Session.info: events recorded in the session's current transaction
+_PENDING = "pending_events"
+
+SCHEDULING_EVENTS = ("provider_added", "slot_booked", "slot_released")
+# Provider columns the free-slot index needs (see slot_index.slot_grid)
+PROVIDER_FIELDS = ("id", "department", "slot_minutes", "day_start_hour", "day_end_hour", "working_days")
+
+# ============ APPLYING EVENTS ============
+
+def _appointment_from_event(event: dict) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=event["id"],
+        status=event["status"],
+        triage_level=event["triage_level"],
+        priority=event["priority"],
+        department=event["department"],
+        created_at=datetime.datetime.fromisoformat(event["created_at"]),
+    )
+
+def _provider_from_event(event: dict) -> SimpleNamespace:
+    return SimpleNamespace(**{field: event[field] for field in PROVIDER_FIELDS})
+
+def _apply_scheduling(event: dict):
+    kind = event["type"]
+    if kind == "provider_added":
+        slot_index.on_provider_added(_provider_from_event(event))
+        return
+    start_at = datetime.datetime.fromisoformat(event["start_at"])
+    if kind == "slot_booked":
+        slot_index.on_booked(event["provider_id"], start_at)
+    else:
+        slot_index.on_released(event["provider_id"], start_at)
+
+def apply(event: dict):
+    """Bring this process's in-memory queue (or free-slot) state up to date with one event."""
+    kind = event["type"]
+    if kind in SCHEDULING_EVENTS:
+        # Scheduled appointments don't touch the walk-in queue
+        _apply_scheduling(event)
+        return
+    if "patient_id" in event:
+        # The booking or discharge changed the patient's visit summary
+        patient_cache.invalidate(event["patient_id"])
+    if kind == "appointment_created":
+        appointment = _appointment_from_event(event)
+        queue_stats.on_created(appointment)
+        queue_index.on_created(appointment)
+    elif kind == "appointment_status_changed":
+        appointment = _appointment_from_event(event)
+        queue_stats.on_status_changed(appointment, event["old_status"])
+        if event["old_status"] == "Queued":
+            queue_index.on_removed(appointment.id)
+    else:
+        # Bulk change: rebuild everything from SQL on next use
+        queue_stats.reset()
+        queue_index.reset()
+        patient_cache.clear()
+    queue_response_cache.invalidate()
+    subscribers.broadcast(event)
+
+def _appointment_event(kind: str, appointment, **extra) -> dict:
+    """Event for an appointment (an ORM object, or a row with the same column names)."""
+    created_at = appointment.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    return {
+        "type": kind,
+        "origin": ORIGIN,
+        "id": appointment.id,
+        "patient_id": appointment.patient_id,
+        "status": appointment.status,
+        "triage_level": appointment.triage_level,
+        "priority": appointment.priority,
+        "department": appointment.department,
+        "created_at": created_at.isoformat(),
+        **extra,
+    }
+
+def appointment_created(db: Session, appointment: models.Appointment):
+    record(db, _appointment_event("appointment_created", appointment))
+
+def appointment_status_changed(db: Session, appointment, old_status: str):
+    record(db, _appointment_event("appointment_status_changed", appointment, old_status=old_status))
+
+def provider_added(db: Session, provider: models.Provider):
+    record(db, {"type": "provider_added", "origin": ORIGIN,
+                **{field: getattr(provider, field) for field in PROVIDER_FIELDS}})
+
+def _slot_event(kind: str, provider_id: int, start_at: datetime.datetime) -> dict:
+    # Slot times are naive clinic wall-clock times and stay that way
+    return {"type": kind, "origin": ORIGIN, "provider_id": provider_id, "start_at": start_at.isoformat()}
+
+def slot_booked(db: Session, provider_id: int, start_at: datetime.datetime):
+    record(db, _slot_event("slot_booked", provider_id, start_at))
+
+def slot_released(db: Session, provider_id: int, start_at: datetime.datetime):
+    record(db, _slot_event("slot_released", provider_id, start_at))
+
+def queue_invalidated(reason: str):
+    """Many rows changed outside crud (bulk import, archival): every worker rebuilds from SQL."""
+    publish({"type": "queue_invalidated", "origin": ORIGIN, "reason": reason})
+
+def record(db: Session, event: dict):
+    """Publish event once db's current transaction commits (the table bus writes it in that transaction)."""
+    written = bus.stage(db, event)
+    db.info.setdefault(_PENDING, []).append((event, written))
+
+def publish(event: dict):
+    apply(event)
+    bus.publish(event)
+
+@listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    # The change is committed whatever happens here: failures are logged, not raised to the writer
+    for pending, written in session.info.pop(_PENDING, ()):
+        try:
+            apply(pending)
+            if not written:
+                bus.publish(pending)
+        except Exception:
+            log.exception("Publishing %s event failed", pending["type"])
+
+@listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop(_PENDING, None)
+
+def _apply_remote(event: dict):
+    if event.get("origin") != ORIGIN:
+        apply(event)
+
+# ============ LIVE-STREAM SUBSCRIBERS ============
+
+class Subscribers:
+    """asyncio queues of connected /queue/events clients; events are handed over thread-safely."""
+
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._queues[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._queues.pop(queue, None)
+
+    def broadcast(self, event: dict):
+        with self._lock:
+            targets = list(self._queues.items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The subscriber's event loop has closed
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        # A client that stops reading loses events rather than growing memory without bound
+        if not queue.full():
+            queue.put_nowait(event)
+
+subscribers = Subscribers()
+
+# ============ BUS BACKENDS ============
+
+class LocalEventBus:
+    """Single process: events are already applied locally, nothing to forward."""
+
+    def stage(self, db: Session, event: dict) -> bool:
+        return False
+
+    def publish(self, event: dict):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class TableEventBus:
+    """
+    Change-log table in the shared database. Each worker appends its events and a
+    background thread reads rows newer than the last one it has seen.
+
+    Ids are handed out when a row is inserted but become visible when its transaction
+    commits, which on PostgreSQL need not be in id order: a poll can see id 12 before 11
+    has committed. Ids below the newest one read that weren't there ("gaps") are read
+    again on later polls, until they turn up or are older than gap_seconds (a rolled
+    back insert leaves a gap that is never filled).
+    """
+
+    def __init__(self, engine: Engine, handler: Callable[[dict], None], poll_seconds: float = None,
+                 retention_seconds: float = None, gap_seconds: float = None):
+        self.engine = engine
+        self.handler = handler
+        self.poll_seconds = poll_seconds if poll_seconds is not None else config.EVENT_POLL_SECONDS
+        self.retention_seconds = retention_seconds if retention_seconds is not None else config.EVENT_RETENTION_SECONDS
+        self.gap_seconds = gap_seconds if gap_seconds is not None else config.EVENT_GAP_SECONDS
+        self.last_id = None
+        # Missing id -> when it was first found missing (time.monotonic())
+        self.gaps = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._pruned_at = 0.0
+
+    @staticmethod
+    def _row(event: dict) -> dict:
+        return {
+            "origin": event.get("origin"),
+            "payload": json.dumps(event),
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+        }
+
+    def stage(self, db: Session, event: dict) -> bool:
+        """Write the event in db's transaction; it becomes visible to other workers on commit."""
+        db.execute(insert(models.QueueEvent).values(**self._row(event)))
+        return True
+
+    def publish(self, event: dict):
+        with self.engine.begin() as conn:
+            conn.execute(insert(models.QueueEvent).values(**self._row(event)))
+
+    def poll(self) -> int:
+        """Deliver events written since the last poll. Returns how many were read."""
+        now = time.monotonic()
+        self.gaps = {gap: since for gap, since in self.gaps.items() if now - since < self.gap_seconds}
+        with self.engine.connect() as conn:
+            if self.last_id is None:
+                # Start from now: older events are already reflected in the database
+                self.last_id = conn.scalar(select(func.max(models.QueueEvent.id))) or 0
+                return 0
+            newer = models.QueueEvent.id > self.last_id
+            rows = conn.execute(
+                select(models.QueueEvent.id, models.QueueEvent.payload)
+                .where(or_(newer, models.QueueEvent.id.in_(self.gaps)) if self.gaps else newer)
+                .order_by(models.QueueEvent.id)
+            ).all()
+        for event_id, payload in rows:
+            if event_id > self.last_id:
+                for missing in range(self.last_id + 1, event_id):
+                    self.gaps[missing] = now
+                self.last_id = event_id
+            else:
+                del self.gaps[event_id]
+            self.handler(json.loads(payload))
+        return len(rows)
+
+    def prune(self):
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.retention_seconds)
+        with self.engine.begin() as conn:
+            conn.execute(delete(models.QueueEvent).where(models.QueueEvent.created_at < cutoff))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+                if time.monotonic() - self._pruned_at > self.retention_seconds:
+                    self.prune()
+                    self._pruned_at = time.monotonic()
+            except Exception:
+                log.exception("Event bus poll failed")
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        self.poll()
+        self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+class RedisEventBus:
+    """Redis pub/sub; every worker subscribes to one channel."""
+
+    def __init__(self, url: str, handler: Callable[[dict], None], channel: str = "triage:queue_events"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("EVENT_BUS=redis needs the redis package (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.handler = handler
+        self.channel = channel
+        self._pubsub = None
+        self._thread = None
+
+    def stage(self, db: Session, event: dict) -> bool:
+        # Pub/sub can't take part in the transaction; the event is published after commit
+        return False
+
+    def publish(self, event: dict):
+        self.client.publish(self.channel, json.dumps(event))
+
+    def _on_message(self, message):
+        self.handler(json.loads(message["data"]))
+
+    def start(self):
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=0.1, daemon=True)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+def create_bus(kind: str, engine: Optional[Engine] = None):
+    if kind == "table":
+        return TableEventBus(engine, _apply_remote)
+    if kind == "redis":
+        return RedisEventBus(config.REDIS_URL, _apply_remote)
+    return LocalEventBus()
+
+bus = LocalEventBus()
+
+def start(engine: Engine):
+    """Switch to the configured backend and start receiving other workers' events."""
+    global bus
+    bus = create_bus(config.EVENT_BUS, engine)
+    bus.start()
+
+def stop():
+    bus.stop()
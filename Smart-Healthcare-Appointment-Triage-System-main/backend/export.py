@@ -0,0 +1,105 @@
+"""
+Streaming exports of patients and appointment history as NDJSON or CSV.
+
+Rows are read as plain column tuples (no ORM objects or Pydantic models) with
+yield_per, so the database driver hands them over in fixed-size chunks and
+memory use stays constant however large the tables are.
+"""
+import csv
+import datetime
+import io
+from typing import Iterator, Optional
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .responses import dumps
+
+# Rows fetched from the cursor per round trip, and rows per chunk written to the response
+EXPORT_CHUNK_SIZE = 1000
+
+PATIENT_FIELDS = ["id", "name", "age", "gender", "contact"]
+APPOINTMENT_FIELDS = ["id", "patient_id", "patient_name", "symptoms", "triage_level", "status", "created_at"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _appointment_filters(table, since, until, status):
+    filters = []
+    if since is not None:
+        filters.append(table.created_at >= since)
+    if until is not None:
+        filters.append(table.created_at < until)
+    if status is not None:
+        filters.append(table.status == status)
+    return filters
+
+def patient_rows(db: Session, since: Optional[datetime.datetime] = None,
+                 until: Optional[datetime.datetime] = None, status: Optional[str] = None) -> Iterator[tuple]:
+    """
+    Yield patient rows. With filters, only patients that have an appointment
+    (live or archived) in the date range / with the status are included.
+    """
+    stmt = select(*(getattr(models.Patient, f) for f in PATIENT_FIELDS)).order_by(models.Patient.id)
+    if since is not None or until is not None or status is not None:
+        live = exists().where(
+            models.Appointment.patient_id == models.Patient.id,
+            *_appointment_filters(models.Appointment, since, until, status),
+        )
+        archived = exists().where(
+            models.ArchivedAppointment.patient_id == models.Patient.id,
+            *_appointment_filters(models.ArchivedAppointment, since, until, status),
+        )
+        stmt = stmt.where(live | archived)
+    yield from db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+def appointment_rows(db: Session, since: Optional[datetime.datetime] = None,
+                     until: Optional[datetime.datetime] = None, status: Optional[str] = None,
+                     include_archived: bool = True) -> Iterator[tuple]:
+    """Yield appointment rows joined with the patient name, live appointments first, then archived ones."""
+    tables = [models.Appointment, models.ArchivedAppointment] if include_archived else [models.Appointment]
+    for table in tables:
+        stmt = (
+            select(table.id, table.patient_id, models.Patient.name, table.symptoms,
+                   table.triage_level, table.status, table.created_at)
+            .join(models.Patient, models.Patient.id == table.patient_id)
+            .where(*_appointment_filters(table, since, until, status))
+            .order_by(table.id)
+        )
+        yield from db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+def to_ndjson(rows: Iterator[tuple], fields: list) -> Iterator[bytes]:
+    """Serialize rows to NDJSON, one chunk of EXPORT_CHUNK_SIZE lines at a time."""
+    lines = []
+    for row in rows:
+        lines.append(dumps(dict(zip(fields, row))))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def to_csv(rows: Iterator[tuple], fields: list) -> Iterator[str]:
+    """Serialize rows to CSV with a header line, one chunk of EXPORT_CHUNK_SIZE rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    count = 0
+    for row in rows:
+        writer.writerow(_csv_value(v) for v in row)
+        count += 1
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def serialize(rows: Iterator[tuple], fields: list, export_format: str) -> Iterator[str]:
+    if export_format == "csv":
+        return to_csv(rows, fields)
+    return to_ndjson(rows, fields)
@@ -0,0 +1,144 @@
+"""
+Short-horizon arrival forecasts per triage level, for staffing.
+
+The model is a seasonal baseline: for every hour of the week (168 slots) and triage level,
+an exponentially weighted mean and variance of the arrivals seen in that slot in past
+weeks (FORECAST_SMOOTHING is the weight of the newest week). A recent-surge factor scales
+it: actual arrivals over the last few complete hours divided by what the baseline
+predicted for them, fading out over the forecast horizon.
+
+Arrivals come from the hourly rollups (backend/analytics.py), never from the appointments
+table. The first fit reads up to FORECAST_HISTORY_WEEKS of rollups; after that each
+refresh only folds in the hours completed since the previous one. The forecast is
+computed once per refresh and served from memory until the next one, which happens when
+a new hour starts or FORECAST_REFRESH_SECONDS have passed. Completed hours are never
+re-read, so after importing history call forecaster.reset() (or restart) to refit.
+"""
+import datetime
+import math
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import analytics, config, models
+from .crud import TRIAGE_PRIORITY
+
+LEVELS = list(TRIAGE_PRIORITY)
+HOURS_PER_WEEK = 168
+# Complete hours compared with the baseline for the surge factor
+RECENT_HOURS = 3
+# The surge factor's effect is multiplied by this for every hour further ahead
+SURGE_DAMPING = 0.7
+# A surge (or lull) never scales the baseline by more than this
+MAX_SURGE = 3.0
+# low/high bounds: mean -/+ this many standard deviations (about an 80% interval)
+INTERVAL_Z = 1.28
+
+def week_slot(hour: datetime.datetime) -> int:
+    return hour.weekday() * 24 + hour.hour
+
+class ArrivalForecaster:
+    def __init__(self, smoothing: float = None, history_weeks: int = None):
+        self.smoothing = smoothing if smoothing is not None else config.FORECAST_SMOOTHING
+        self.history_weeks = history_weeks or config.FORECAST_HISTORY_WEEKS
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the fit; the next forecast refits from the rollups."""
+        with self._lock:
+            # Per triage level, per hour-of-week slot; None until the slot has been seen
+            self._mean = {level: [None] * HOURS_PER_WEEK for level in LEVELS}
+            self._variance = {level: [0.0] * HOURS_PER_WEEK for level in LEVELS}
+            # (predicted, actual) arrivals of the last RECENT_HOURS complete hours
+            self._recent = {level: deque(maxlen=RECENT_HOURS) for level in LEVELS}
+            # First hour not yet folded into the baselines
+            self.fitted_until = None
+            self._result = None
+            self._result_hour = None
+            self._refreshed_at = 0.0
+
+    def _observe(self, level: str, hour: datetime.datetime, arrivals: int):
+        slot = week_slot(hour)
+        mean = self._mean[level][slot]
+        if mean is None:
+            # First week seen for this slot: Poisson-like spread until there is more history
+            self._mean[level][slot] = float(arrivals)
+            self._variance[level][slot] = float(arrivals)
+            return
+        self._recent[level].append((mean, arrivals))
+        diff = arrivals - mean
+        self._mean[level][slot] = mean + self.smoothing * diff
+        self._variance[level][slot] = (1 - self.smoothing) * (self._variance[level][slot] + self.smoothing * diff * diff)
+
+    def _fit(self, db: Session, current_hour: datetime.datetime) -> int:
+        """Fold complete hours up to current_hour into the baselines. Returns how many were read."""
+        start = self.fitted_until
+        if start is None:
+            earliest = db.scalar(select(func.min(models.HourlyRollup.hour)))
+            if earliest is None:
+                return 0
+            start = max(analytics.hour_of(earliest), current_hour - datetime.timedelta(weeks=self.history_weeks))
+        if start >= current_hour:
+            return 0
+        arrivals = {key: row[0] for key, row in analytics.read_rollups(db, start, current_hour).rows.items()}
+        hour = start
+        hours = 0
+        while hour < current_hour:
+            for level in LEVELS:
+                self._observe(level, hour, arrivals.get((hour, level), 0))
+            hour += analytics.HOUR
+            hours += 1
+        self.fitted_until = current_hour
+        return hours
+
+    def _surge(self, level: str) -> float:
+        predicted = sum(p for p, _ in self._recent[level])
+        actual = sum(a for _, a in self._recent[level])
+        # +1 on both sides keeps quiet hours from producing extreme ratios
+        return min(max((actual + 1) / (predicted + 1), 1 / MAX_SURGE), MAX_SURGE)
+
+    def refresh(self, db: Session, now: datetime.datetime = None):
+        """Fold in newly completed hours and recompute the cached forecast."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        current_hour = analytics.hour_of(now)
+        with self._lock:
+            self._fit(db, current_hour)
+            points = []
+            surges = {level: self._surge(level) for level in LEVELS}
+            for ahead in range(config.FORECAST_MAX_HOURS):
+                hour = current_hour + ahead * analytics.HOUR
+                slot = week_slot(hour)
+                for level in LEVELS:
+                    mean = self._mean[level][slot]
+                    factor = 1 + (surges[level] - 1) * SURGE_DAMPING ** (ahead + 1)
+                    expected = (mean or 0.0) * factor
+                    spread = INTERVAL_Z * math.sqrt(self._variance[level][slot]) * factor
+                    points.append({
+                        "hour_start": hour,
+                        "triage_level": level,
+                        "expected_arrivals": round(expected, 2),
+                        "low": round(max(expected - spread, 0.0), 2),
+                        "high": round(expected + spread, 2),
+                    })
+            self._result = {
+                "generated_at": datetime.datetime.now(datetime.timezone.utc),
+                "fitted_through": self.fitted_until,
+                "points": points,
+            }
+            self._result_hour = current_hour
+            self._refreshed_at = time.monotonic()
+
+    def forecast(self, db: Session, hours: int, now: datetime.datetime = None) -> dict:
+        """The cached forecast for the next `hours` hours (the current one first), refreshed when due."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        stale = time.monotonic() - self._refreshed_at > config.FORECAST_REFRESH_SECONDS
+        if self._result is None or stale or analytics.hour_of(now) != self._result_hour:
+            self.refresh(db, now)
+        result = self._result
+        return {**result, "points": result["points"][:hours * len(LEVELS)]}
+
+forecaster = ArrivalForecaster()
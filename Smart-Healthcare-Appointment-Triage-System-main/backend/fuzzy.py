@@ -0,0 +1,159 @@
+"""
+Typo-tolerant matching of symptom words against the triage vocabulary.
+
+FuzzyIndex is a symmetric-delete (SymSpell) index: every vocabulary word is stored under
+each string obtained by deleting up to max_distance of its letters. A typed word is
+looked up the same way, by its own deletes, so a lookup costs a few dozen dict probes
+(on the order of len(word)^2) whatever the size of the vocabulary. Candidates found
+that way are confirmed with the real edit distance (Damerau-Levenshtein, optimal string
+alignment, so "chset" is one edit from "chest").
+
+Guards against turning ordinary words into keywords:
+
+- words shorter than MIN_WORD_LENGTH are never corrected, words shorter than
+  TWO_EDIT_LENGTH only within one edit ("bleding" and "feaver" yes, "pan" no)
+- changing a letter turns one real word into another far more often than dropping,
+  adding or swapping one does: words shorter than SUBSTITUTION_LENGTH are not corrected
+  across a substitution ("fevr" and "pian" yes, "fain" and "pawn" no), longer ones
+  across one at most ("dizzyness" yes, "fuzziness" no)
+- COMMON_WORDS, everyday words a couple of edits from a keyword ("never" is one edit
+  from "fever"), are left alone
+"""
+import functools
+import re
+
+MIN_WORD_LENGTH = 4
+SUBSTITUTION_LENGTH = 5
+TWO_EDIT_LENGTH = 7
+# Symptom text repeats the same words constantly; remember this many lookups per index
+LOOKUP_CACHE_SIZE = 10_000
+
+COMMON_WORDS = frozenset({
+    # near "fever"
+    "never", "ever", "lever", "sever", "fewer", "fiver", "river", "liver", "fervor", "forever",
+    # near "pain"
+    "main", "rain", "gain", "vain", "paint", "plain", "spain", "chain", "pair", "paid",
+    # near "chest"
+    "chess", "chase", "cheat", "crest", "quest", "west", "best", "rest", "test", "nest", "cheese",
+    # near "heart"
+    "heard", "heat", "hear", "hears", "hearty", "earth", "hurt", "start", "smart",
+    # near "attack"
+    "attach", "attic", "stack", "track",
+    # near "bleeding"
+    "breeding", "blending", "bleeping", "bidding", "feeding", "needing", "reading", "leading", "sleeping",
+    "speeding", "seeding", "weeding", "heeding", "pleading",
+    # near "breathing"
+    "breathe", "bathing", "breaking", "bringing", "treating", "creating", "reaching", "beating",
+    "bleaching", "breaching", "preaching",
+    # near "stroke"
+    "strike", "stoke", "strobe", "stroll", "store", "stone", "smoke", "spoke",
+    # near "broken", "fracture", "vomiting", "dizziness"
+    "broke", "brake", "broker", "brokers", "token", "spoken", "woken", "bracken", "feature", "furniture",
+    "fracas", "visiting", "voting", "business", "busyness", "dimness", "fizziness",
+    # near "unconscious": a conscious patient is not an emergency
+    "conscious", "subconscious",
+})
+
+_WORD = re.compile(r"[a-z]+")
+
+def _deletes(word: str, distance: int) -> set:
+    """Every string obtained by deleting up to `distance` letters from word (word included)."""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+def edit_distance(a: str, b: str, limit: int, substitution_cost: int = 1) -> int:
+    """
+    Optimal string alignment distance between a and b (insertions, deletions,
+    substitutions and adjacent transpositions), or limit + 1 once it exceeds limit.
+    With substitution_cost=2 a substitution costs as much as a deletion plus an insertion.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            # Plain comparisons instead of min(): this is the hot loop of every lookup
+            value = previous[j - 1] if ca == cb else previous[j - 1] + substitution_cost
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+def allowed_distance(word: str) -> int:
+    if len(word) < MIN_WORD_LENGTH:
+        return 0
+    return 1 if len(word) < TWO_EDIT_LENGTH else 2
+
+def allowed_substitutions(word: str) -> int:
+    return 0 if len(word) < SUBSTITUTION_LENGTH else 1
+
+class FuzzyIndex:
+    def __init__(self, vocabulary, max_distance: int = 2, common_words=COMMON_WORDS):
+        """
+        vocabulary: words to correct to, most important first; on a tie in distance the
+        earlier word wins (so emergency keywords can be listed before urgent ones).
+        """
+        self.max_distance = max_distance
+        self.common_words = common_words
+        self.words = list(dict.fromkeys(vocabulary))
+        self._rank = {word: rank for rank, word in enumerate(self.words)}
+        self._max_length = max(len(word) for word in self.words) + max_distance
+        # delete string -> vocabulary words that produce it
+        self._deletes = {}
+        for word in self.words:
+            for deleted in _deletes(word, max_distance):
+                self._deletes.setdefault(deleted, []).append(word)
+        self.lookup = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self.find)
+
+    def find(self, word: str):
+        """The vocabulary word `word` is a typo of, or None. lookup() is the cached version."""
+        if word in self._rank:
+            return word
+        distance = min(allowed_distance(word), self.max_distance)
+        if distance == 0 or word in self.common_words or len(word) > self._max_length:
+            return None
+        candidates = set()
+        for deleted in _deletes(word, distance):
+            candidates.update(self._deletes.get(deleted, ()))
+        # Counting each substitution twice, the budget is only exceeded past the allowed ones
+        budget = distance + allowed_substitutions(word)
+        best = None
+        best_key = None
+        for candidate in candidates:
+            found = edit_distance(word, candidate, distance)
+            key = (found, self._rank[candidate])
+            if found > distance or (best_key is not None and key >= best_key):
+                continue
+            if edit_distance(word, candidate, budget, substitution_cost=2) <= budget:
+                best, best_key = candidate, key
+        return best
+
+    def correct(self, text: str):
+        """
+        Lowercased words of text, with typos of vocabulary words replaced, joined by spaces;
+        and the list of (typed, corrected) pairs.
+        """
+        words = _WORD.findall(text.lower())
+        corrections = []
+        for i, word in enumerate(words):
+            match = self.lookup(word)
+            if match is not None and match != word:
+                corrections.append((word, match))
+                words[i] = match
+        return " ".join(words), corrections
@@ -0,0 +1,150 @@
+"""
+Group commit for bookings.
+
+On SQLite every commit takes the single writer lock and waits for an fsync, so one
+commit per /book caps booking throughput during a surge. Instead, request threads hand
+their booking to one writer thread per database and wait for its result. The writer
+takes whatever has queued up (and, when more than one booking is waiting, up to
+GROUP_COMMIT_WINDOW_MS more for the rest of the surge, up to GROUP_COMMIT_MAX_BATCH
+bookings), writes each one inside its own SAVEPOINT and commits the batch once. Each
+booking's queue event is recorded in the same transaction (see backend/events.py).
+
+Durability is unchanged: a request only gets its appointment back after the commit that
+contains it has returned, and a booking that fails (e.g. a constraint error) only rolls
+back its own savepoint, not the rest of the batch. Every future is resolved as soon as
+the commit returns; the bookings' events are applied and forwarded by the commit itself,
+and a failure there is logged rather than reported to clients whose bookings exist.
+"""
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from . import config, crud, events, metrics, models, schemas
+
+class BookingWriter:
+    def __init__(self, engine: Engine, window_seconds: float = None, max_batch: int = None):
+        # Committed appointments are handed to the request threads as loaded, not expired
+        self.session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        self.window_seconds = window_seconds if window_seconds is not None else config.GROUP_COMMIT_WINDOW_MS / 1000
+        self.max_batch = max_batch or config.GROUP_COMMIT_MAX_BATCH
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, request: schemas.BookRequest, triage_level: str) -> models.Appointment:
+        """Book and wait until the booking is committed. Raises whatever the booking raised."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((request, triage_level, future))
+        return future.result()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="booking-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # A lone booking is written straight away; the window is only spent
+                # waiting once several bookings are arriving together
+                if len(batch) > 1 and remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def write_batch(self, batch: list):
+        """Write (request, triage_level, future) bookings in one transaction and resolve the futures."""
+        db = self.session_factory()
+        try:
+            connection = db.connection()
+            if connection.dialect.name == "sqlite":
+                # Take the write lock up front, like crud._claim: the batch reads before it writes
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            written = []
+            for request, triage_level, future in batch:
+                try:
+                    # A lone booking needs no savepoint: if it fails, the whole transaction is rolled back
+                    with db.begin_nested() if len(batch) > 1 else contextlib.nullcontext():
+                        db_appointment = crud.book_appointment(db, request, triage_level)
+                        # Last, so a booking whose savepoint is rolled back has recorded no event
+                        events.appointment_created(db, db_appointment)
+                    written.append((db_appointment.id, future))
+                except Exception as e:
+                    if len(batch) == 1:
+                        db.rollback()
+                    future.set_exception(e)
+            if written:
+                # Reload the rows in one query, as db.refresh() would for a single booking. This
+                # happens before the commit: once the batch is committed nothing may fail it
+                ids = [appointment_id for appointment_id, _ in written]
+                loaded = {
+                    a.id: a for a in db.query(models.Appointment)
+                    .options(joinedload(models.Appointment.patient))
+                    .populate_existing()
+                    .filter(models.Appointment.id.in_(ids))
+                }
+            db.commit()
+            for appointment_id, future in written:
+                future.set_result(loaded[appointment_id])
+            metrics.group_commit_batch_size.observe(len(written))
+        finally:
+            db.close()
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def writer_for(engine: Engine) -> BookingWriter:
+    """The booking writer of a database, created on first use."""
+    with _writers_lock:
+        writer = _writers.get(engine)
+        if writer is None:
+            writer = _writers[engine] = BookingWriter(engine)
+        return writer
+
+def stop_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
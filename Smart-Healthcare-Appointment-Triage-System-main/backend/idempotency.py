@@ -0,0 +1,143 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+Clients that retry a request after a timeout send the same Idempotency-Key header each
+time. The first request with a key reserves it; once it succeeds, its status code and
+body are stored and every retry gets that exact response back instead of running again.
+A retry that arrives while the first attempt is still running gets 409, and reusing a key
+for a different request body gets 422.
+
+Two stores, selected with IDEMPOTENCY_STORE:
+
+- "memory"  per process, bounded to IDEMPOTENCY_MAX_KEYS with TTL eviction (the default).
+- "table"   the idempotency_keys table, shared by every worker using the database.
+
+Keys expire after IDEMPOTENCY_TTL_SECONDS. A failed request releases its key, so it can be
+retried with the same key.
+"""
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from . import config, models
+from .stats import _timestamp
+
+# A reservation whose request never finished (e.g. the worker died) is given up after this long
+IN_PROGRESS_TIMEOUT_SECONDS = 60
+
+# (fingerprint, status_code, body); status_code and body are None while the first request is running
+StoredResponse = Tuple[str, Optional[int], Optional[bytes]]
+
+def fingerprint(path: str, body: str) -> str:
+    """Identifies the request a key was first used for."""
+    return hashlib.sha256(f"{path}\n{body}".encode()).hexdigest()
+
+class MemoryKeyStore:
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.IDEMPOTENCY_TTL_SECONDS
+        self.max_entries = max_entries or config.IDEMPOTENCY_MAX_KEYS
+        self._lock = threading.Lock()
+        # key -> (expires_at, fingerprint, status_code, body), oldest first
+        self._entries = OrderedDict()
+
+    def begin(self, key: str, request_fingerprint: str) -> Optional[StoredResponse]:
+        """Reserve key for this request. Returns None if reserved, else what is stored under it."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1:]
+            self._entries.pop(key, None)
+            # Expired keys are oldest first; beyond that, evict the oldest to stay bounded
+            while self._entries and (next(iter(self._entries.values()))[0] <= now or len(self._entries) >= self.max_entries):
+                self._entries.popitem(last=False)
+            self._entries[key] = (now + self.ttl_seconds, request_fingerprint, None, None)
+            return None
+
+    def complete(self, key: str, status_code: int, body: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], status_code, body)
+
+    def release(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class TableKeyStore:
+    def __init__(self, engine: Engine, ttl_seconds: float = None):
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.IDEMPOTENCY_TTL_SECONDS
+        self._pruned_at = 0.0
+
+    def _expired(self, created_at: datetime.datetime, status_code: Optional[int]) -> bool:
+        age = time.time() - _timestamp(created_at)
+        return age > self.ttl_seconds or (status_code is None and age > IN_PROGRESS_TIMEOUT_SECONDS)
+
+    def begin(self, key: str, request_fingerprint: str) -> Optional[StoredResponse]:
+        self._prune_now_and_then()
+        table = models.IdempotencyKey
+        for _ in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(table).values(
+                        key=key, fingerprint=request_fingerprint,
+                        created_at=datetime.datetime.now(datetime.timezone.utc),
+                    ))
+                return None
+            except IntegrityError:
+                pass
+            with self.engine.begin() as conn:
+                row = conn.execute(
+                    select(table.fingerprint, table.status_code, table.body, table.created_at).where(table.key == key)
+                ).first()
+                if row is not None and not self._expired(row.created_at, row.status_code):
+                    return row.fingerprint, row.status_code, row.body
+                # Expired (or released meanwhile): take the key over
+                conn.execute(delete(table).where(table.key == key))
+        # Lost the race for a freshly released key twice: report it as in progress
+        return request_fingerprint, None, None
+
+    def complete(self, key: str, status_code: int, body: bytes):
+        table = models.IdempotencyKey
+        with self.engine.begin() as conn:
+            conn.execute(table.__table__.update().where(table.key == key).values(status_code=status_code, body=body))
+
+    def release(self, key: str):
+        with self.engine.begin() as conn:
+            conn.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.key == key))
+
+    def prune(self):
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.ttl_seconds)
+        with self.engine.begin() as conn:
+            conn.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.created_at < cutoff))
+
+    def _prune_now_and_then(self):
+        if time.monotonic() - self._pruned_at > min(self.ttl_seconds, 600):
+            self._pruned_at = time.monotonic()
+            self.prune()
+
+memory_store = MemoryKeyStore()
+_table_stores = {}
+_table_stores_lock = threading.Lock()
+
+def store_for(engine: Engine):
+    """The configured key store (per database for IDEMPOTENCY_STORE=table)."""
+    if config.IDEMPOTENCY_STORE != "table":
+        return memory_store
+    with _table_stores_lock:
+        store = _table_stores.get(engine)
+        if store is None:
+            store = _table_stores[engine] = TableKeyStore(engine)
+        return store
@@ -0,0 +1,38 @@
+import threading
+
+from .database import SessionLocal
+
+# Background jobs that run on a fixed interval inside the API process.
+
+_stop_event = threading.Event()
+_threads = []
+
+def _run_forever(job, interval_seconds: float):
+    while not _stop_event.wait(interval_seconds):
+        db = SessionLocal()
+        try:
+            job(db)
+        except Exception as e:
+            print(f"Background job {job.__name__} failed: {e}")
+        finally:
+            db.close()
+
+def start_periodic_job(job, interval_seconds: float):
+    """
+    Call job(db) every interval_seconds with a fresh session, in a daemon thread.
+    An interval of 0 (or less) leaves the job disabled.
+    """
+    if interval_seconds <= 0:
+        return None
+    _stop_event.clear()
+    thread = threading.Thread(target=_run_forever, args=(job, interval_seconds), name=f"job-{job.__name__}", daemon=True)
+    thread.start()
+    _threads.append(thread)
+    return thread
+
+def stop_all(timeout: float = 5.0):
+    """Signal every periodic job to stop and wait for the current runs to finish."""
+    _stop_event.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
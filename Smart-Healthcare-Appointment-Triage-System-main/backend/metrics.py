@@ -0,0 +1,287 @@
+"""
+Request latency and database query instrumentation, exposed in Prometheus text format.
+
+- MetricsMiddleware times every request per route template and counts the SQL
+  statements (and their time) each request issued.
+- SQLAlchemy cursor hooks time every statement on every engine and log statements
+  slower than SLOW_QUERY_SECONDS to the "triage.slow_queries" logger.
+- `timed(histogram)` wraps code paths such as triage, ML inference and serialization.
+
+Kept dependency-free: metrics are plain in-process counters rendered by render().
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import config
+
+slow_query_log = logging.getLogger("triage.slow_queries")
+
+# Seconds; upper bounds of the latency buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+# ============ METRIC TYPES ============
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (bucket_counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    le_label = f'le="{le}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le_label)} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Gauge:
+    """
+    A value that goes up and down. Either set() it, or pass `function`, which is called
+    at render time (for values that are cheaper to compute on scrape than to track).
+    """
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), function=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values) -> float:
+        if self.function is not None:
+            return self.function()
+        return self._values.get(label_values, 0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.function is not None:
+            lines.append(f"{self.name} {self.function()}")
+            return lines
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+# ============ REGISTRY ============
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
+
+http_request_duration = register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route", "status")))
+http_request_db_queries = register(Histogram(
+    "http_request_db_queries", "SQL statements issued per request.", ("route",), buckets=COUNT_BUCKETS))
+http_request_db_seconds = register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.", ("route",)))
+db_query_duration = register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by statement type.", ("operation",)))
+db_slow_queries = register(Counter(
+    "db_slow_queries_total", "SQL statements slower than SLOW_QUERY_SECONDS.", ("operation",)))
+db_session_duration = register(Histogram(
+    "db_session_duration_seconds", "How long request database sessions stay open."))
+triage_duration = register(Histogram(
+    "triage_duration_seconds", "Time to evaluate a triage level.", ("stage",)))
+triage_fuzzy_corrections = register(Counter(
+    "triage_fuzzy_corrections_total", "Misspelled symptom words corrected to a triage keyword.", ("keyword",)))
+serialization_duration = register(Histogram(
+    "serialization_duration_seconds", "Time spent serializing response bodies.", ("route",)))
+admission_rejected = register(Counter(
+    "admission_rejected_total", "Requests refused with 503 by admission control.", ("lane", "reason")))
+admission_wait = register(Histogram(
+    "admission_wait_seconds", "Time requests waited for an admission slot.", ("lane",)))
+group_commit_batch_size = register(Histogram(
+    "group_commit_batch_size", "Bookings written per group commit.", buckets=COUNT_BUCKETS))
+patient_cache_lookups = register(Counter(
+    "patient_cache_lookups_total", "Patient profile lookups by where they were answered: memo (earlier in the same request), hit (shared cache) or miss (database).", ("result",)))
+
+def _patient_cache_hit_ratio() -> float:
+    memo, hit, miss = (patient_cache_lookups.value(result) for result in ("memo", "hit", "miss"))
+    total = memo + hit + miss
+    return (memo + hit) / total if total else 0.0
+
+patient_cache_hit_ratio = register(Gauge(
+    "patient_cache_hit_ratio", "Share of patient profile lookups answered without the database.",
+    function=_patient_cache_hit_ratio))
+
+@contextmanager
+def timed(histogram: Histogram, *label_values):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *label_values)
+
+def timed_function(histogram: Histogram, *label_values):
+    """Decorator version of timed()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, *label_values):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ============ SQL HOOKS ============
+
+class _RequestQueries:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# Set by MetricsMiddleware; threadpool handlers run in a copy of the context and share the object
+_current_request: contextvars.ContextVar[Optional[_RequestQueries]] = contextvars.ContextVar("metrics_request", default=None)
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = _operation(statement)
+    db_query_duration.observe(elapsed, operation)
+    request = _current_request.get()
+    if request is not None:
+        request.count += 1
+        request.seconds += elapsed
+    if config.SLOW_QUERY_SECONDS > 0 and elapsed >= config.SLOW_QUERY_SECONDS:
+        db_slow_queries.inc(operation)
+        slow_query_log.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+# ============ MIDDLEWARE ============
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = _RequestQueries()
+        token = _current_request.set(request)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            # The router stores the matched route in the scope; use its template to keep label values bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(elapsed, scope["method"], route, status_code)
+            http_request_db_queries.observe(request.count, route)
+            http_request_db_seconds.observe(request.seconds, route)
@@ -0,0 +1,331 @@
+"""
+Versioned schema migrations.
+
+Every step in MIGRATIONS has a version number and runs once; applied versions are
+recorded in the schema_version table. Steps are written to be idempotent (they check
+for columns/indexes before adding them) so a fresh database, whose tables are created
+at their current shape by the first step, can run the later steps as no-ops.
+
+Steps receive the engine rather than a single transaction so that long-running work
+doesn't hold the SQLite writer lock for the whole migration: each index is built in its
+own short transaction (CONCURRENTLY on PostgreSQL) and backfills commit in batches.
+"""
+import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from . import analytics, crud, models
+
+# Rows updated per transaction by backfill_in_batches
+BACKFILL_BATCH_SIZE = 5000
+
+schema_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+# ============ HELPERS ============
+
+def has_column(engine: Engine, table: str, column: str) -> bool:
+    return column in {col["name"] for col in inspect(engine).get_columns(table)}
+
+def add_column(engine: Engine, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN, skipped if the column already exists."""
+    if has_column(engine, table, column):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def create_index(engine: Engine, name: str, table: str, columns: list, unique: bool = False):
+    """
+    Build an index without blocking writers for longer than necessary.
+    PostgreSQL builds it CONCURRENTLY (outside a transaction); SQLite has no online
+    index build, so the index gets its own transaction, separate from any other step.
+    """
+    unique_sql = "UNIQUE " if unique else ""
+    column_sql = ", ".join(columns)
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_sql})"
+            ))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({column_sql})"))
+
+def backfill_in_batches(engine: Engine, table: str, set_sql: str, where_sql: str, batch_size: int = None) -> int:
+    """
+    Run UPDATE table SET <set_sql> WHERE <where_sql> in batches of batch_size rows,
+    committing after each batch so readers and writers can interleave.
+    where_sql must stop matching a row once it has been updated.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            result = conn.execute(text(
+                f"UPDATE {table} SET {set_sql} "
+                f"WHERE id IN (SELECT id FROM {table} WHERE {where_sql} LIMIT :batch_size)"
+            ), {"batch_size": batch_size})
+        if result.rowcount <= 0:
+            return total
+        total += result.rowcount
+
+def rebuild_with_autoincrement(engine: Engine, table: Table, extra_ddl: list = (), archive_tables: tuple = ()):
+    """
+    SQLite only: recreate a table as AUTOINCREMENT, so the ids of deleted rows are never
+    handed out again, and start its ids after those already in archive_tables (rows moved
+    out of it that kept their id). The table is rebuilt from its model definition with its
+    indexes, plus extra_ddl (e.g. triggers), in one transaction; rows keep their ids.
+    Skipped on PostgreSQL, whose sequences never reuse ids, and when already AUTOINCREMENT.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    name = table.name
+    with engine.begin() as conn:
+        # One transaction for the whole rebuild (DDL doesn't start one by itself)
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        current_sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).scalar()
+        if current_sql is None or "AUTOINCREMENT" in current_sql.upper():
+            return
+        existing = {column["name"] for column in inspect(conn).get_columns(name)}
+        columns = ", ".join(column.name for column in table.columns if column.name in existing)
+
+        create_sql = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {name}_rebuild")
+        conn.exec_driver_sql(create_sql.replace(f"CREATE TABLE {name} ", f"CREATE TABLE {name}_rebuild ", 1))
+        conn.exec_driver_sql(f"INSERT INTO {name}_rebuild ({columns}) SELECT {columns} FROM {name}")
+        conn.exec_driver_sql(f"DROP TABLE {name}")
+        conn.exec_driver_sql(f"ALTER TABLE {name}_rebuild RENAME TO {name}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+        for statement in extra_ddl:
+            conn.exec_driver_sql(statement)
+
+        used = [f"(SELECT MAX(id) FROM {source})" for source in (name, *archive_tables)]
+        conn.exec_driver_sql(f"DELETE FROM sqlite_sequence WHERE name = '{name}'")
+        conn.exec_driver_sql(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT '{name}', "
+            f"MAX({', '.join(f'COALESCE({u}, 0)' for u in used)}, 0)"
+        )
+
+# ============ MIGRATION STEPS ============
+
+def create_initial_schema(engine: Engine):
+    # Creates any missing tables at their current shape; existing tables are left alone.
+    models.Base.metadata.create_all(bind=engine)
+
+def add_patient_gender(engine: Engine):
+    add_column(engine, "patients", "gender", "VARCHAR DEFAULT 'Other'")
+
+def add_appointment_priority(engine: Engine):
+    # Numeric priority so the queue can be read in index order instead of sorting a CASE expression
+    add_column(engine, "appointments", "priority", "INTEGER")
+    backfill_in_batches(
+        engine, "appointments",
+        "priority = CASE triage_level WHEN 'Emergency' THEN 1 WHEN 'Urgent' THEN 2 WHEN 'Routine' THEN 3 ELSE 4 END",
+        "priority IS NULL",
+    )
+    create_index(engine, "ix_appointments_queue", "appointments", ["status", "priority", "created_at"])
+
+def add_archive_tables(engine: Engine):
+    models.Base.metadata.create_all(
+        bind=engine,
+        tables=[models.ArchivedAppointment.__table__, models.ArchivedNotification.__table__],
+    )
+
+def add_import_checkpoints(engine: Engine):
+    models.Base.metadata.create_all(bind=engine, tables=[models.ImportCheckpoint.__table__])
+
+def add_patient_search(engine: Engine):
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for statement in models.PATIENT_SEARCH_DDL + models.APPOINTMENT_SEARCH_DDL:
+            conn.execute(text(statement))
+    # Index existing patients in id-ordered batches, each in its own transaction
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            ids = [row[0] for row in conn.execute(text(
+                "SELECT id FROM patients WHERE id > :last_id AND id NOT IN (SELECT rowid FROM patient_search) "
+                "ORDER BY id LIMIT :batch_size"
+            ), {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE})]
+            if not ids:
+                return
+            conn.execute(text(
+                "INSERT INTO patient_search (rowid, name, contact, symptoms) "
+                "SELECT p.id, p.name, p.contact, "
+                "COALESCE((SELECT group_concat(symptoms, ' ') FROM ("
+                "SELECT symptoms FROM appointments WHERE patient_id = p.id "
+                "UNION ALL SELECT symptoms FROM appointments_archive WHERE patient_id = p.id)), '') "
+                "FROM patients p WHERE p.id BETWEEN :first AND :last"
+                " AND p.id NOT IN (SELECT rowid FROM patient_search)"
+            ), {"first": ids[0], "last": ids[-1]})
+            last_id = ids[-1]
+
+def _department_case_sql() -> str:
+    """crud.route_department as a SQL CASE expression over triage_level and symptoms."""
+    whens = [f"WHEN triage_level = 'Emergency' THEN '{crud.EMERGENCY_DEPARTMENT}'"]
+    for department, keywords in crud.DEPARTMENT_KEYWORDS.items():
+        like = " OR ".join(f"lower(symptoms) LIKE '%{keyword}%'" for keyword in keywords)
+        whens.append(f"WHEN {like} THEN '{department}'")
+    return f"CASE {' '.join(whens)} ELSE '{crud.DEFAULT_DEPARTMENT}' END"
+
+def add_appointment_department(engine: Engine):
+    for table in ("appointments", "appointments_archive"):
+        add_column(engine, table, "department", "VARCHAR")
+        backfill_in_batches(engine, table, f"department = {_department_case_sql()}", "department IS NULL")
+    create_index(engine, "ix_appointments_department_queue", "appointments",
+                 ["department", "status", "priority", "created_at"])
+
+def add_queue_events(engine: Engine):
+    models.Base.metadata.create_all(bind=engine, tables=[models.QueueEvent.__table__])
+
+def add_idempotency_keys(engine: Engine):
+    models.Base.metadata.create_all(bind=engine, tables=[models.IdempotencyKey.__table__])
+
+def add_patient_queue_index(engine: Engine):
+    create_index(engine, "ix_appointments_patient_queue", "appointments", ["patient_id", "status", "created_at"])
+
+def add_patient_summary(engine: Engine):
+    add_column(engine, "patients", "visit_count", "INTEGER DEFAULT 0")
+    add_column(engine, "patients", "last_visit_at", "DATETIME")
+    add_column(engine, "patients", "highest_priority", "INTEGER")
+    add_column(engine, "patients", "open_appointments", "INTEGER DEFAULT 0")
+    create_index(engine, "ix_appointments_patient_history", "appointments", ["patient_id", "created_at"])
+    # Recompute every patient's summary in id-ordered batches, each in its own transaction
+    last_id = 0
+    while True:
+        with Session(engine) as db:
+            ids = list(db.scalars(
+                select(models.Patient.id).where(models.Patient.id > last_id)
+                .order_by(models.Patient.id).limit(BACKFILL_BATCH_SIZE)
+            ))
+            if not ids:
+                return
+            crud.refresh_patient_summaries(db, ids)
+            db.commit()
+            last_id = ids[-1]
+
+def add_notification_indexes(engine: Engine):
+    for name, columns in [
+        ("ix_notifications_patient", ["patient_id", "created_at"]),
+        ("ix_notifications_appointment", ["appointment_id", "created_at"]),
+        ("ix_notifications_created", ["created_at"]),
+        ("ix_notifications_status", ["status", "created_at"]),
+    ]:
+        create_index(engine, name, "notifications", columns)
+
+def add_analytics_rollups(engine: Engine):
+    for table in ("appointments", "appointments_archive"):
+        add_column(engine, table, "started_at", "DATETIME")
+        add_column(engine, table, "completed_at", "DATETIME")
+    models.Base.metadata.create_all(
+        bind=engine,
+        tables=[models.HourlyRollup.__table__, models.HourlyWaitBucket.__table__],
+    )
+    # Earlier appointments have no transition times, so only their arrivals can be rolled up
+    with Session(engine) as db:
+        analytics.rebuild_rollups(db)
+        db.commit()
+
+def add_scheduled_slots(engine: Engine):
+    # New tables, created with their indexes (including the partial unique index on slots)
+    models.Base.metadata.create_all(
+        bind=engine,
+        tables=[models.Provider.__table__, models.ScheduledSlot.__table__],
+    )
+
+def add_notification_archive_indexes(engine: Engine):
+    # Notification reads merge in the archive, by appointment and by time as well as by patient
+    create_index(engine, "ix_notifications_archive_appointment", "notifications_archive", ["appointment_id", "created_at"])
+    create_index(engine, "ix_notifications_archive_created", "notifications_archive", ["created_at"])
+
+def add_appointment_autoincrement(engine: Engine):
+    # Archived appointments keep their id; without AUTOINCREMENT SQLite reuses the id of the
+    # newest appointment once it is archived, and the next archive run collides with it
+    rebuild_with_autoincrement(engine, models.Appointment.__table__, extra_ddl=models.APPOINTMENT_SEARCH_DDL,
+                               archive_tables=("appointments_archive",))
+
+def add_notification_autoincrement(engine: Engine):
+    # Same as appointments: retention moves notifications to notifications_archive with their id
+    rebuild_with_autoincrement(engine, models.Notification.__table__, archive_tables=("notifications_archive",))
+
+def add_queue_event_autoincrement(engine: Engine):
+    # Workers read queue_events by id > last id seen; once prune emptied the table SQLite
+    # started again from 1 and every worker skipped the new events
+    rebuild_with_autoincrement(engine, models.QueueEvent.__table__)
+
+MIGRATIONS = [
+    (1, "Initial schema", create_initial_schema),
+    (2, "Add patients.gender", add_patient_gender),
+    (3, "Add appointments.priority and queue index", add_appointment_priority),
+    (4, "Add appointment and notification archive tables", add_archive_tables),
+    (5, "Add import_checkpoints", add_import_checkpoints),
+    (6, "Add patient_search full-text index", add_patient_search),
+    (7, "Add appointments.department and per-department queue index", add_appointment_department),
+    (8, "Add queue_events change log", add_queue_events),
+    (9, "Add idempotency_keys", add_idempotency_keys),
+    (10, "Add per-patient queue index for duplicate-booking checks", add_patient_queue_index),
+    (11, "Add patient visit summary and history index", add_patient_summary),
+    (12, "Add notification indexes", add_notification_indexes),
+    (13, "Add appointment transition times and analytics rollups", add_analytics_rollups),
+    (14, "Add providers and scheduled slots", add_scheduled_slots),
+    (15, "Add notification archive indexes", add_notification_archive_indexes),
+    (16, "Never reuse appointment ids", add_appointment_autoincrement),
+    (17, "Never reuse notification ids", add_notification_autoincrement),
+    (18, "Never reuse queue event ids", add_queue_event_autoincrement),
+]
+
+# ============ RUNNER ============
+
+def get_applied_versions(engine: Engine) -> set:
+    schema_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(schema_version.select().with_only_columns(schema_version.c.version))}
+
+# Attempts when another process (e.g. a second uvicorn worker) migrates at the same time
+MIGRATION_ATTEMPTS = 5
+
+def run_migrations(engine: Engine) -> list:
+    """Apply pending migrations in version order. Returns the versions that were applied."""
+    for attempt in range(1, MIGRATION_ATTEMPTS + 1):
+        try:
+            return _run_pending(engine)
+        except OperationalError:
+            # Typically "table ... already exists" or "database is locked" because another
+            # worker ran the same DDL first. Steps are idempotent, so run the rest again.
+            if attempt == MIGRATION_ATTEMPTS:
+                raise
+
+def _run_pending(engine: Engine) -> list:
+    applied = get_applied_versions(engine)
+    newly_applied = []
+    for version, description, step in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        step(engine)
+        try:
+            with engine.begin() as conn:
+                conn.execute(schema_version.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.datetime.now(datetime.timezone.utc),
+                ))
+        except IntegrityError:
+            # Another process applied the same (idempotent) step concurrently
+            pass
+        newly_applied.append(version)
+    return newly_applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, Text, LargeBinary, DateTime, ForeignKey, Index, DDL, event, text
 from sqlalchemy.orm import relationship
 import datetime
 
@@ -13,6 +13,12 @@ class Patient(Base):
     gender = Column(String, default="Other")
     contact = Column(String)
 
+    # Visit summary, kept up to date on every write to the patient's appointments (see crud)
+    visit_count = Column(Integer, default=0) # Appointments ever booked, archived ones included
+    last_visit_at = Column(DateTime, nullable=True) # created_at of the most recent appointment
+    highest_priority = Column(Integer, nullable=True) # Lowest priority number ever triaged, i.e. most severe level
+    open_appointments = Column(Integer, default=0) # Appointments still Queued or In Progress
+
     appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="patient", cascade="all, delete-orphan")
 
@@ -23,12 +29,29 @@ class Appointment(Base):
     patient_id = Column(Integer, ForeignKey("patients.id"))
     symptoms = Column(String)
     triage_level = Column(String, index=True) # E.g., "Emergency", "Urgent", "Routine"
-    status = Column(String, default="Queued") # E.g., "Queued", "Completed", "Cancelled"
+    priority = Column(Integer) # Sort weight for triage_level: Emergency = 1, Urgent = 2, Routine = 3
+    status = Column(String, default="Queued") # E.g., "Queued", "In Progress", "Completed", "Cancelled"
+    department = Column(String, default="General") # Queue the appointment is routed to, see crud.route_department
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    started_at = Column(DateTime, nullable=True) # Claimed by a clinician (status -> "In Progress")
+    completed_at = Column(DateTime, nullable=True) # Discharged (status -> "Completed")
 
     patient = relationship("Patient", back_populates="appointments")
     notifications = relationship("Notification", back_populates="appointment", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Serves the queue query: WHERE status = 'Queued' ORDER BY priority, created_at
+        Index("ix_appointments_queue", "status", "priority", "created_at"),
+        # Same, per department queue
+        Index("ix_appointments_department_queue", "department", "status", "priority", "created_at"),
+        # Duplicate-booking check: a patient's queued appointments by booking time
+        Index("ix_appointments_patient_queue", "patient_id", "status", "created_at"),
+        # Patient history pages: WHERE patient_id = ? ORDER BY created_at DESC
+        Index("ix_appointments_patient_history", "patient_id", "created_at"),
+        # Archived appointments keep their id, so SQLite must never hand it out again
+        {"sqlite_autoincrement": True},
+    )
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -44,3 +67,178 @@ class Notification(Base):
 
     patient = relationship("Patient", back_populates="notifications")
     appointment = relationship("Appointment", back_populates="notifications")
+
+    __table_args__ = (
+        # One index per access path in crud: a patient's or an appointment's notifications,
+        # newest first; all notifications newest first; pending ones (and old sent ones for retention)
+        Index("ix_notifications_patient", "patient_id", "created_at"),
+        Index("ix_notifications_appointment", "appointment_id", "created_at"),
+        Index("ix_notifications_created", "created_at"),
+        Index("ix_notifications_status", "status", "created_at"),
+        # Archived notifications keep their id, so SQLite must never hand it out again
+        {"sqlite_autoincrement": True},
+    )
+
+# ============ ARCHIVE TABLES ============
+# Finished appointments and their sent notifications are moved here by backend/archive.py,
+# keeping the live tables (and every queue query over them) small.
+
+class ArchivedAppointment(Base):
+    __tablename__ = "appointments_archive"
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    symptoms = Column(String)
+    triage_level = Column(String)
+    priority = Column(Integer)
+    status = Column(String)
+    department = Column(String)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    patient = relationship("Patient", viewonly=True)
+
+    __table_args__ = (
+        Index("ix_appointments_archive_patient", "patient_id", "created_at"),
+    )
+
+class ArchivedNotification(Base):
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    appointment_id = Column(Integer, nullable=True)
+    message = Column(String)
+    contact_number = Column(String)
+    notification_type = Column(String)
+    status = Column(String)
+    created_at = Column(DateTime)
+    sent_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        Index("ix_notifications_archive_patient", "patient_id", "created_at"),
+        Index("ix_notifications_archive_appointment", "appointment_id", "created_at"),
+        Index("ix_notifications_archive_created", "created_at"),
+    )
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    # Absolute path of the imported file and how many of its records are committed
+    source = Column(String, primary_key=True)
+    records_done = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class QueueEvent(Base):
+    __tablename__ = "queue_events"
+    # Readers track the last id they saw, so ids must keep growing after prune empties the table
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    # Change log read by every API worker when EVENT_BUS=table (see backend/events.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    origin = Column(String)  # Process that wrote the event
+    payload = Column(Text)  # JSON event
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Stored responses for Idempotency-Key retries when IDEMPOTENCY_STORE=table (see backend/idempotency.py)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String)  # Hash of the request the key was first used for
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is still running
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+# ============ SCHEDULED APPOINTMENTS ============
+# Time-slot bookings with a provider, for Routine cases (see backend/slot_index.py).
+# Slot times are clinic wall-clock times.
+
+class Provider(Base):
+    __tablename__ = "providers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    department = Column(String, default="General")
+    slot_minutes = Column(Integer, default=30)  # Length of every slot
+    day_start_hour = Column(Integer, default=9)  # First slot starts at this hour
+    day_end_hour = Column(Integer, default=17)  # Last slot ends by this hour
+    working_days = Column(String, default="0,1,2,3,4")  # Weekdays seeing patients, Monday = 0
+
+    slots = relationship("ScheduledSlot", back_populates="provider")
+
+class ScheduledSlot(Base):
+    __tablename__ = "scheduled_slots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider_id = Column(Integer, ForeignKey("providers.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    symptoms = Column(String)
+    start_at = Column(DateTime)
+    end_at = Column(DateTime)
+    status = Column(String, default="Booked")  # "Booked" or "Cancelled"
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    provider = relationship("Provider", back_populates="slots")
+
+    __table_args__ = (
+        # One live booking per provider and start time: settles concurrent bookings of a slot.
+        # Cancelled bookings are kept and don't count, so the slot can be booked again.
+        Index("ux_scheduled_slots_provider_start", "provider_id", "start_at", unique=True,
+              sqlite_where=text("status = 'Booked'"), postgresql_where=text("status = 'Booked'")),
+        # A patient's bookings by time
+        Index("ix_scheduled_slots_patient", "patient_id", "start_at"),
+    )
+
+# ============ ANALYTICS ROLLUPS ============
+# Hourly arrivals, discharges and waits per triage level, kept up to date on every write
+# by backend/analytics.py so /analytics/* never aggregates the appointment tables.
+
+class HourlyRollup(Base):
+    __tablename__ = "hourly_rollups"
+
+    hour = Column(DateTime, primary_key=True)  # Start of the hour, UTC
+    triage_level = Column(String, primary_key=True)
+    arrivals = Column(Integer, default=0)  # Appointments booked (created_at in this hour)
+    discharges = Column(Integer, default=0)  # Appointments completed (completed_at in this hour)
+    waits = Column(Integer, default=0)  # Patients seen: claimed, or discharged straight from the queue
+    wait_seconds = Column(Float, default=0.0)  # Sum of those patients' waits since booking
+
+class HourlyWaitBucket(Base):
+    __tablename__ = "hourly_wait_buckets"
+
+    # Wait-time histogram of HourlyRollup.waits, for medians and percentiles
+    hour = Column(DateTime, primary_key=True)
+    triage_level = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # Index into analytics.WAIT_BUCKETS
+    count = Column(Integer, default=0)
+
+# ============ FULL-TEXT SEARCH ============
+# patient_search is an SQLite FTS5 index over patient name, contact and the symptoms of
+# all their appointments (rowid = patient id). Triggers keep it in sync with every write,
+# including bulk imports; archiving deletes appointments but leaves their symptoms searchable.
+
+PATIENT_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+    "name, contact, symptoms, tokenize = 'unicode61', prefix = '2 3')",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_insert AFTER INSERT ON patients BEGIN "
+    "INSERT INTO patient_search (rowid, name, contact, symptoms) VALUES (new.id, new.name, new.contact, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_update AFTER UPDATE OF name, contact ON patients BEGIN "
+    "UPDATE patient_search SET name = new.name, contact = new.contact WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_delete AFTER DELETE ON patients BEGIN "
+    "DELETE FROM patient_search WHERE rowid = old.id; END",
+]
+
+APPOINTMENT_SEARCH_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS appointments_search_insert AFTER INSERT ON appointments BEGIN "
+    "UPDATE patient_search SET symptoms = symptoms || ' ' || new.symptoms WHERE rowid = new.patient_id; END",
+]
+
+for statement in PATIENT_SEARCH_DDL:
+    event.listen(Patient.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in APPOINTMENT_SEARCH_DDL:
+    event.listen(Appointment.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Patient.__table__, "before_drop", DDL("DROP TABLE IF EXISTS patient_search").execute_if(dialect="sqlite"))
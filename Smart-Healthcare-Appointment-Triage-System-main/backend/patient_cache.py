@@ -0,0 +1,133 @@
+"""
+Read-through cache of patient profiles (schemas.PatientProfile: the patient row with its
+visit summary), used by crud.get_patient.
+
+A lookup is answered from, in order:
+
+1. the session's memo: every profile already looked up in the current transaction of
+   this database session, i.e. earlier in the same request, so repeated lookups within
+   a request are free;
+2. the shared cache: up to PATIENT_CACHE_MAX_ENTRIES profiles (least recently used are
+   evicted), each served for at most PATIENT_CACHE_TTL_SECONDS;
+3. the database, filling both.
+
+Writes that touch a patient (new patients, bookings and discharges updating the visit
+summary) call invalidate(db, patient_id), which drops the profile straight away and again
+once the transaction commits, so a lookup racing the write can't cache the old row.
+Other workers drop it when the booking's event reaches them (backend/events.py); the TTL
+bounds staleness for anything else. Lookups are counted in patient_cache_lookups_total.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import config, metrics, models, schemas
+
+# Keys in Session.info
+_MEMO = "patient_memo"
+_PENDING = "patient_cache_pending"
+
+class PatientCache:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # patient id -> (expires_at, profile), least recently used first
+        self._entries = OrderedDict()
+        # Bumped on every invalidation; see put()
+        self.version = 0
+        # patient id -> version of its latest invalidation, oldest first (at most max_entries)
+        self._invalidated = OrderedDict()
+        # Fills that started before this version are refused: the invalidations they might
+        # have raced have been forgotten (or the whole cache was cleared)
+        self._floor = 0
+
+    def get(self, patient_id: int):
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None:
+                return None
+            expires_at, profile = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[patient_id]
+                return None
+            self._entries.move_to_end(patient_id)
+            return profile
+
+    def put(self, patient_id: int, profile: schemas.PatientProfile, version: int):
+        """Store profile unless this patient was invalidated since `version` was read (before the query)."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if version < self._floor or self._invalidated.get(patient_id, 0) > version:
+                return
+            self._entries[patient_id] = (time.monotonic() + self.ttl_seconds, profile)
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, patient_id: int):
+        with self._lock:
+            self.version += 1
+            self._entries.pop(patient_id, None)
+            self._invalidated[patient_id] = self.version
+            self._invalidated.move_to_end(patient_id)
+            if len(self._invalidated) > self.max_entries:
+                _, forgotten = self._invalidated.popitem(last=False)
+                self._floor = forgotten
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._floor = self.version
+            self._invalidated.clear()
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+patient_cache = PatientCache(config.PATIENT_CACHE_TTL_SECONDS, config.PATIENT_CACHE_MAX_ENTRIES)
+
+def get_patient(db: Session, patient_id: int):
+    """The patient's profile, or None if there is no such patient."""
+    memo = db.info.setdefault(_MEMO, {})
+    if patient_id in memo:
+        metrics.patient_cache_lookups.inc("memo")
+        return memo[patient_id]
+    profile = patient_cache.get(patient_id)
+    if profile is not None:
+        metrics.patient_cache_lookups.inc("hit")
+    else:
+        metrics.patient_cache_lookups.inc("miss")
+        version = patient_cache.version
+        db_patient = db.get(models.Patient, patient_id)
+        if db_patient is None:
+            return None
+        profile = schemas.PatientProfile.model_validate(db_patient)
+        patient_cache.put(patient_id, profile, version)
+    memo[patient_id] = profile
+    return profile
+
+def invalidate(db: Session, patient_id: int):
+    """A write in db's transaction changes this patient: drop it now and again after commit."""
+    patient_cache.invalidate(patient_id)
+    db.info.get(_MEMO, {}).pop(patient_id, None)
+    db.info.setdefault(_PENDING, set()).add(patient_id)
+
+# The memo only lives for one transaction: a request's lookups happen within one, and a
+# long-lived session (a background job) shouldn't keep serving old profiles
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    session.info.pop(_MEMO, None)
+    for patient_id in session.info.pop(_PENDING, ()):
+        patient_cache.invalidate(patient_id)
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop(_MEMO, None)
+    # Nothing was written; what was dropped will simply be read again
+    session.info.pop(_PENDING, None)
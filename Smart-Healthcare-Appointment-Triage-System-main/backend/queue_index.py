@@ -0,0 +1,156 @@
+"""
+In-memory ordering of the queued appointments, by department and triage level.
+
+Queue order is by effective score, which grows with waiting time so Routine and Urgent
+patients don't starve behind a steady stream of newer, higher-level bookings:
+
+    score = base score of the level + aging rate of the level * minutes waited
+
+capped just below the Emergency base score, so aging never overtakes an Emergency.
+Within one level every appointment ages at the same rate, so a level's appointments stay
+in booking order (oldest = highest score) forever. Each (department, level) is therefore
+kept as a plain FIFO list sorted by created_at, and the current order is a k-way merge of
+those lists by score at read time: nothing is ever recomputed over the whole queue, and
+reading the top N costs O(N log k) for k lists.
+
+crud reports bookings and discharges here; the index is rebuilt from SQL on first use,
+after reset(), and every QUEUE_INDEX_RECONCILE_SECONDS to pick up writes made elsewhere.
+"""
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from . import config, models
+from .stats import _timestamp
+
+# Sort position for appointments without a stored priority (same as crud.triage_priority's fallback)
+UNKNOWN_PRIORITY = 4
+EMERGENCY_PRIORITY = 1
+
+# Score at booking time, by priority (Emergency = 1, Urgent = 2, Routine = 3)
+BASE_SCORES = {1: 300.0, 2: 200.0, 3: 100.0, UNKNOWN_PRIORITY: 0.0}
+# Aged scores stop here, below the Emergency base score
+AGING_CAP = BASE_SCORES[EMERGENCY_PRIORITY] - 1
+
+def aging_rate(priority: int) -> float:
+    """Score points gained per minute of waiting."""
+    if priority == EMERGENCY_PRIORITY:
+        return 0.0
+    if priority == 2:
+        return config.AGING_RATE_URGENT
+    return config.AGING_RATE_ROUTINE
+
+def effective_score(priority: int, created_at: float, now: float) -> float:
+    base = BASE_SCORES.get(priority, 0.0)
+    rate = aging_rate(priority)
+    if rate <= 0:
+        return base
+    return min(base + rate * (now - created_at) / 60, AGING_CAP)
+
+# Cached queue pages (main.queue_response) are keyed by the current aging period, so
+# reorderings caused by waiting alone are served within this many seconds
+AGING_CACHE_PERIOD_SECONDS = 60
+
+def aging_period(now: float = None) -> int:
+    """Number of the current aging period; cached queue orders from earlier periods aren't reused."""
+    return int((time.time() if now is None else now) // AGING_CACHE_PERIOD_SECONDS)
+
+def _scored(priority: int, fifo: list, now: float):
+    # Merge keys: highest score first, then oldest, then lowest id
+    for created_at, appointment_id in fifo:
+        yield (-effective_score(priority, created_at, now), created_at, appointment_id)
+
+class QueueIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop the index; the next read rebuilds it from the database."""
+        with self._lock:
+            self._loaded = False
+            self._reconciled_at = 0.0
+            # department -> priority -> list of (created_at timestamp, id), oldest first
+            self._queues = {}
+            # appointment id -> (department, priority, entry)
+            self._entries = {}
+
+    def reconcile(self, db: Session):
+        rows = (
+            db.query(models.Appointment.id, models.Appointment.department,
+                     models.Appointment.priority, models.Appointment.created_at)
+            .filter(models.Appointment.status == "Queued")
+            .all()
+        )
+        queues = {}
+        entries = {}
+        for appointment_id, department, priority, created_at in rows:
+            priority = priority if priority is not None else UNKNOWN_PRIORITY
+            entry = (_timestamp(created_at), appointment_id)
+            queues.setdefault(department, {}).setdefault(priority, []).append(entry)
+            entries[appointment_id] = (department, priority, entry)
+        for levels in queues.values():
+            for fifo in levels.values():
+                fifo.sort()
+        with self._lock:
+            self._queues = queues
+            self._entries = entries
+            self._loaded = True
+            self._reconciled_at = time.monotonic()
+
+    def _ensure_loaded(self, db: Session):
+        stale = time.monotonic() - self._reconciled_at > config.QUEUE_INDEX_RECONCILE_SECONDS
+        if not self._loaded or stale:
+            self.reconcile(db)
+
+    def on_created(self, appointment: models.Appointment):
+        with self._lock:
+            if not self._loaded or appointment.status != "Queued" or appointment.id in self._entries:
+                return
+            priority = appointment.priority if appointment.priority is not None else UNKNOWN_PRIORITY
+            entry = (_timestamp(appointment.created_at), appointment.id)
+            # New bookings are the newest, so this is almost always an append
+            bisect.insort(self._queues.setdefault(appointment.department, {}).setdefault(priority, []), entry)
+            self._entries[appointment.id] = (appointment.department, priority, entry)
+
+    def on_removed(self, appointment_id: int):
+        """The appointment left the queue (claimed, discharged or cancelled)."""
+        with self._lock:
+            found = self._entries.pop(appointment_id, None)
+            if found is None:
+                return
+            department, priority, entry = found
+            fifo = self._queues[department][priority]
+            position = bisect.bisect_left(fifo, entry)
+            if position < len(fifo) and fifo[position] == entry:
+                del fifo[position]
+
+    def _ordered(self, department: str, now: float):
+        """Merge the FIFO lists of one department (or all) into (score, created_at, id) by current score."""
+        departments = [self._queues.get(department, {})] if department is not None else self._queues.values()
+        streams = []
+        for levels in departments:
+            for priority, fifo in levels.items():
+                if fifo:
+                    streams.append(_scored(priority, fifo, now))
+        return heapq.merge(*streams)
+
+    def ordered_ids(self, db: Session, department: str = None, skip: int = 0, limit: int = 100) -> list:
+        """Ids of queued appointments in current queue order, for one department or all of them."""
+        self._ensure_loaded(db)
+        now = time.time()
+        with self._lock:
+            return [key[2] for key in itertools.islice(self._ordered(department, now), skip, skip + limit)]
+
+    def counts(self, db: Session) -> dict:
+        """Number of queued appointments per department."""
+        self._ensure_loaded(db)
+        with self._lock:
+            counts = {department: sum(len(fifo) for fifo in levels.values()) for department, levels in self._queues.items()}
+            return {department: count for department, count in counts.items() if count}
+
+queue_index = QueueIndex()
@@ -0,0 +1,77 @@
+"""
+Fast JSON encoding and a cache of pre-serialized response bodies.
+
+Plain rows (dicts of column values) are encoded with orjson when it is installed.
+Lists of Pydantic models are encoded with pydantic-core's own JSON serializer (TypeAdapter.dump_json),
+which is as fast as orjson for models and doesn't need an intermediate dict.
+"""
+import datetime
+import json
+import threading
+import time
+from typing import Any, Optional
+
+from . import config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain Python data (dicts, lists, datetimes) to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+class ResponseCache:
+    """
+    Serialized response bodies keyed by request parameters, dropped whenever the
+    underlying data changes (invalidate) and after ttl_seconds at the latest.
+    Bounded to max_entries; when full, the oldest entry is evicted.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.version = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return body
+
+    def put(self, key, body: bytes, version: int):
+        """
+        Store body if nothing changed since `version` was read. Callers read cache.version
+        before querying, so a body built from data that was modified meanwhile is never cached.
+        """
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, body)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+# Pre-serialized /appointments bodies; invalidated by crud on every queue change
+queue_response_cache = ResponseCache(config.QUEUE_CACHE_TTL_SECONDS)
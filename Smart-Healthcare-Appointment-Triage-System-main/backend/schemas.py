@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import datetime
 
 class PatientBase(BaseModel):
@@ -17,12 +17,20 @@ class PatientResponse(PatientBase):
     class Config:
         from_attributes = True
 
+class PatientProfile(PatientResponse):
+    # Visit summary columns, as stored (see crud.patient_summary)
+    visit_count: Optional[int] = 0
+    last_visit_at: Optional[datetime.datetime] = None
+    highest_priority: Optional[int] = None
+    open_appointments: Optional[int] = 0
+
 class AppointmentBase(BaseModel):
     symptoms: str = Field(..., example="Severe chest pain and shortness of breath")
     
 class AppointmentCreate(AppointmentBase):
     patient_id: int
     triage_level: str
+    department: Optional[str] = None
 
 class TriageRequest(BaseModel):
     symptoms: str = Field(..., example="Severe chest pain and shortness of breath")
@@ -39,17 +47,58 @@ class AppointmentResponse(AppointmentBase):
     patient_id: int
     triage_level: str
     status: str
+    department: Optional[str] = None
     created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    completed_at: Optional[datetime.datetime] = None
     patient: Optional[PatientResponse] = None
 
     class Config:
         from_attributes = True
 
+class QueueRow(BaseModel):
+    """A row of the compact queue view: only the requested fields (crud.QUEUE_FIELDS) are present."""
+    id: Optional[int] = None
+    patient_id: Optional[int] = None
+    symptoms: Optional[str] = None
+    triage_level: Optional[str] = None
+    status: Optional[str] = None
+    department: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    patient_name: Optional[str] = None
+    patient_age: Optional[int] = None
+    patient_contact: Optional[str] = None
+
+class HistoryAppointment(AppointmentBase):
+    """An appointment in a patient's history; unlike AppointmentResponse it doesn't repeat the patient."""
+    id: int
+    patient_id: int
+    triage_level: str
+    status: str
+    department: Optional[str] = None
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    completed_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class PatientWithHistory(PatientResponse):
-    appointments: List[AppointmentResponse] = []
+    appointments: List[HistoryAppointment] = []
 
     class Config:
         from_attributes = True
+
+class PatientSummary(BaseModel):
+    visit_count: int = Field(..., example=4)
+    last_visit_at: Optional[datetime.datetime] = None
+    highest_triage_level: Optional[str] = Field(None, example="Urgent")
+    open_appointments: int = Field(..., example=1)
+
+class PatientDetail(PatientResponse):
+    summary: PatientSummary
+    appointments: List[HistoryAppointment] = []
+    next_cursor: Optional[str] = None
 class NotificationBase(BaseModel):
     message: str = Field(..., example="Your appointment has been confirmed")
     notification_type: str = Field("Status Update", example="Confirmation")
@@ -82,4 +131,95 @@ class PatientNotificationHistory(PatientResponse):
     appointments: List[AppointmentResponse] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ImportRecord(BaseModel):
+    """One line of a bulk import file: a patient and one historical appointment."""
+    name: str
+    age: int
+    gender: str = "Other"
+    contact: str
+    symptoms: str
+    status: str = "Completed"
+    created_at: Optional[datetime.datetime] = None
+    started_at: Optional[datetime.datetime] = None
+    completed_at: Optional[datetime.datetime] = None
+
+class QueueStatsResponse(BaseModel):
+    total_queued: int
+    by_triage_level: Dict[str, int] = Field(..., example={"Emergency": 2, "Urgent": 5, "Routine": 11})
+    by_status: Dict[str, int] = Field(..., example={"Queued": 18, "Completed": 240})
+    oldest_wait_seconds: Dict[str, Optional[float]]
+    average_wait_seconds: Optional[float] = None
+    generated_at: datetime.datetime
+
+class QueueSummary(BaseModel):
+    department: str = Field(..., example="Orthopedics")
+    queued: int = Field(..., example=7)
+
+class ProviderCreate(BaseModel):
+    name: str = Field(..., example="Dr. Amina Rahman")
+    department: str = Field("General", example="General")
+    slot_minutes: int = Field(30, ge=5, le=480)
+    day_start_hour: int = Field(9, ge=0, le=23)
+    day_end_hour: int = Field(17, ge=1, le=24)
+    working_days: str = Field("0,1,2,3,4", pattern=r"^[0-6](,[0-6])*$", example="0,1,2,3,4")
+
+class ProviderResponse(ProviderCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+class FreeSlot(BaseModel):
+    provider_id: int
+    provider_name: str
+    department: str
+    start_at: datetime.datetime
+    end_at: datetime.datetime
+
+class SlotBookRequest(BaseModel):
+    provider_id: int
+    # Clinic wall-clock time, without a UTC offset
+    start_at: datetime.datetime = Field(..., example="2026-05-04T10:30:00")
+    patient: PatientCreate
+    symptoms: str = Field(..., example="Annual checkup")
+
+class SlotResponse(BaseModel):
+    id: int
+    provider_id: int
+    patient_id: int
+    symptoms: str
+    start_at: datetime.datetime
+    end_at: datetime.datetime
+    status: str
+
+    class Config:
+        from_attributes = True
+
+class ThroughputPoint(BaseModel):
+    period_start: datetime.datetime
+    triage_level: str = Field(..., example="Urgent")
+    arrivals: int = Field(..., example=14)
+    discharges: int = Field(..., example=11)
+
+class WaitTimePoint(BaseModel):
+    period_start: datetime.datetime
+    triage_level: str = Field(..., example="Urgent")
+    waits: int = Field(..., example=11)
+    median_wait_seconds: Optional[float] = Field(None, example=1260.0)
+    p90_wait_seconds: Optional[float] = Field(None, example=3420.0)
+    average_wait_seconds: Optional[float] = Field(None, example=1533.6)
+
+class ForecastPoint(BaseModel):
+    hour_start: datetime.datetime
+    triage_level: str = Field(..., example="Urgent")
+    expected_arrivals: float = Field(..., example=6.4)
+    low: float = Field(..., example=3.1)
+    high: float = Field(..., example=9.7)
+
+class ArrivalForecast(BaseModel):
+    generated_at: datetime.datetime
+    # Hours before this have been folded into the model
+    fitted_through: Optional[datetime.datetime] = None
+    points: List[ForecastPoint]
@@ -0,0 +1,149 @@
+"""
+In-memory availability index for scheduled appointments.
+
+For every provider the index keeps a sorted list of the free slot start times over the
+next SCHEDULING_HORIZON_DAYS: the provider's working grid (working days, hours and slot
+length) minus the slots already booked. Finding a provider's next free slot after a given
+time is one bisect, and the next N free slots across all providers take at most N
+entries from each provider's list, merged with a heap: O(P (log S + N)) for P providers
+with S free slots each, however busy the calendars are.
+
+Slot times are clinic wall-clock times, stored as naive datetimes.
+
+The database has the last word: a unique index allows one live booking per provider and
+start time, so concurrent bookings of the same slot can't both succeed even if this
+index is stale (a lost event). Bookings, cancellations and new providers reach the index
+as events (backend/events.py), from this worker and over the event bus from the others;
+the index is rebuilt from SQL on first use, after reset(), and every
+SLOT_INDEX_RECONCILE_SECONDS, which also moves the horizon forward.
+"""
+import bisect
+import datetime
+import heapq
+import itertools
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from . import config, models
+
+def working_days(provider: models.Provider) -> set:
+    return {int(day) for day in provider.working_days.split(",") if day != ""}
+
+def slot_grid(provider: models.Provider, since: datetime.datetime, until: datetime.datetime) -> list:
+    """Start times of all the provider's slots that start in [since, until), in order."""
+    step = datetime.timedelta(minutes=provider.slot_minutes)
+    days = working_days(provider)
+    starts = []
+    day = since.date()
+    while day < until.date() + datetime.timedelta(days=1):
+        if day.weekday() in days:
+            midnight = datetime.datetime.combine(day, datetime.time())
+            start = midnight + datetime.timedelta(hours=provider.day_start_hour)
+            end = midnight + datetime.timedelta(hours=provider.day_end_hour)
+            while start + step <= end:
+                if since <= start < until:
+                    starts.append(start)
+                start += step
+        day += datetime.timedelta(days=1)
+    return starts
+
+def is_on_grid(provider: models.Provider, start_at: datetime.datetime) -> bool:
+    """Whether a slot of this provider starts at start_at."""
+    return start_at in slot_grid(provider, start_at, start_at + datetime.timedelta(microseconds=1))
+
+class SlotIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop the index; the next read rebuilds it from the database."""
+        with self._lock:
+            self._loaded = False
+            self._reconciled_at = 0.0
+            # Free slots are indexed in [_since, _until)
+            self._since = None
+            self._until = None
+            # provider id -> sorted list of free slot start times
+            self._free = {}
+            # provider id -> department
+            self._departments = {}
+
+    def reconcile(self, db: Session, now: datetime.datetime = None):
+        now = now or datetime.datetime.now()
+        since = now.replace(second=0, microsecond=0)
+        until = since + datetime.timedelta(days=config.SCHEDULING_HORIZON_DAYS)
+        booked = {}
+        for provider_id, start_at in (
+            db.query(models.ScheduledSlot.provider_id, models.ScheduledSlot.start_at)
+            .filter(models.ScheduledSlot.status == "Booked",
+                    models.ScheduledSlot.start_at >= since,
+                    models.ScheduledSlot.start_at < until)
+        ):
+            booked.setdefault(provider_id, set()).add(start_at)
+        free = {}
+        departments = {}
+        for provider in db.query(models.Provider):
+            taken = booked.get(provider.id, set())
+            free[provider.id] = [start for start in slot_grid(provider, since, until) if start not in taken]
+            departments[provider.id] = provider.department
+        with self._lock:
+            self._free = free
+            self._departments = departments
+            self._since = since
+            self._until = until
+            self._loaded = True
+            self._reconciled_at = time.monotonic()
+
+    def _ensure_loaded(self, db: Session):
+        stale = time.monotonic() - self._reconciled_at > config.SLOT_INDEX_RECONCILE_SECONDS
+        if not self._loaded or stale:
+            self.reconcile(db)
+
+    def on_provider_added(self, provider: models.Provider):
+        with self._lock:
+            if not self._loaded or provider.id in self._free:
+                return
+            self._free[provider.id] = slot_grid(provider, self._since, self._until)
+            self._departments[provider.id] = provider.department
+
+    def on_booked(self, provider_id: int, start_at: datetime.datetime):
+        """The slot is taken (booked here, or found taken by the database)."""
+        with self._lock:
+            free = self._free.get(provider_id)
+            if free is None:
+                return
+            position = bisect.bisect_left(free, start_at)
+            if position < len(free) and free[position] == start_at:
+                del free[position]
+
+    def on_released(self, provider_id: int, start_at: datetime.datetime):
+        """A booking was cancelled; the slot is free again (if it is still ahead and indexed)."""
+        with self._lock:
+            free = self._free.get(provider_id)
+            if free is None or not self._since <= start_at < self._until:
+                return
+            position = bisect.bisect_left(free, start_at)
+            if position == len(free) or free[position] != start_at:
+                free.insert(position, start_at)
+
+    def next_free(self, db: Session, count: int, after: datetime.datetime = None,
+                  department: str = None, provider_id: int = None) -> list:
+        """The `count` earliest free slots starting at or after `after`, as (start_at, provider_id)."""
+        self._ensure_loaded(db)
+        after = after or datetime.datetime.now()
+        with self._lock:
+            candidates = []
+            for pid, free in self._free.items():
+                if provider_id is not None and pid != provider_id:
+                    continue
+                if department is not None and self._departments[pid] != department:
+                    continue
+                position = bisect.bisect_left(free, after)
+                # No provider can contribute more than `count` of the earliest slots
+                candidates.append([(start, pid) for start in free[position:position + count]])
+            return list(itertools.islice(heapq.merge(*candidates), count))
+
+slot_index = SlotIndex()
@@ -0,0 +1,117 @@
+"""
+In-memory queue statistics, maintained incrementally.
+
+crud.create_appointment / crud.delete_appointment report every change here, so serving
+/stats/queue costs O(1) instead of an aggregate over the appointments table. The counters
+are rebuilt from SQL (reconcile) on first use, whenever they have been invalidated, and
+every STATS_RECONCILE_SECONDS to correct any drift from writes that bypass crud.
+"""
+import datetime
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import config, models
+
+TRIAGE_LEVELS = ("Emergency", "Urgent", "Routine")
+
+def _timestamp(value: datetime.datetime) -> float:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+class QueueStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop all counters; the next read reconciles from the database."""
+        with self._lock:
+            self._loaded = False
+            self._reconciled_at = 0.0
+            self._status_counts = Counter()
+            # Per triage level: queued appointment id -> created_at timestamp, oldest first
+            self._queued = {}
+            self._queued_time_sum = 0.0
+
+    def _queued_level(self, triage_level: str) -> OrderedDict:
+        return self._queued.setdefault(triage_level, OrderedDict())
+
+    def reconcile(self, db: Session):
+        """Rebuild the counters from SQL aggregates and the (indexed) list of queued appointments."""
+        status_counts = Counter(dict(
+            db.query(models.Appointment.status, func.count(models.Appointment.id))
+            .group_by(models.Appointment.status).all()
+        ))
+        queued_rows = (
+            db.query(models.Appointment.id, models.Appointment.triage_level, models.Appointment.created_at)
+            .filter(models.Appointment.status == "Queued")
+            .order_by(models.Appointment.created_at)
+            .all()
+        )
+        queued = {}
+        time_sum = 0.0
+        for appointment_id, triage_level, created_at in queued_rows:
+            ts = _timestamp(created_at)
+            queued.setdefault(triage_level, OrderedDict())[appointment_id] = ts
+            time_sum += ts
+        with self._lock:
+            self._status_counts = status_counts
+            self._queued = queued
+            self._queued_time_sum = time_sum
+            self._loaded = True
+            self._reconciled_at = time.monotonic()
+
+    def on_created(self, appointment: models.Appointment):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._status_counts[appointment.status] += 1
+            if appointment.status == "Queued":
+                level = self._queued_level(appointment.triage_level)
+                if appointment.id not in level:
+                    ts = _timestamp(appointment.created_at)
+                    level[appointment.id] = ts
+                    self._queued_time_sum += ts
+
+    def on_status_changed(self, appointment: models.Appointment, old_status: str):
+        with self._lock:
+            if not self._loaded or old_status == appointment.status:
+                return
+            self._status_counts[old_status] -= 1
+            self._status_counts[appointment.status] += 1
+            if old_status == "Queued":
+                ts = self._queued_level(appointment.triage_level).pop(appointment.id, None)
+                if ts is not None:
+                    self._queued_time_sum -= ts
+
+    def snapshot(self, db: Session) -> dict:
+        stale = time.monotonic() - self._reconciled_at > config.STATS_RECONCILE_SECONDS
+        if not self._loaded or stale:
+            self.reconcile(db)
+
+        now = time.time()
+        with self._lock:
+            levels = sorted(set(TRIAGE_LEVELS) | set(self._queued), key=lambda l: (l not in TRIAGE_LEVELS, l))
+            by_level = {level: len(self._queued.get(level, ())) for level in levels}
+            oldest_wait = {}
+            for level in levels:
+                entries = self._queued.get(level)
+                oldest_wait[level] = now - next(iter(entries.values())) if entries else None
+            total = sum(by_level.values())
+            average_wait = now - self._queued_time_sum / total if total else None
+            return {
+                "total_queued": total,
+                "by_triage_level": by_level,
+                "by_status": {status: count for status, count in self._status_counts.items() if count > 0},
+                "oldest_wait_seconds": oldest_wait,
+                "average_wait_seconds": average_wait,
+                "generated_at": datetime.datetime.now(datetime.timezone.utc),
+            }
+
+queue_stats = QueueStats()
@@ -1,8 +1,10 @@
 import re
 import os
-import joblib
+import threading
 from typing import Optional
 
+from . import config, metrics
+
 # Phase 1: Rule-based classification
 def rule_based_triage(symptoms: str) -> str:
     """
@@ -26,8 +28,30 @@ def rule_based_triage(symptoms: str) -> str:
     return "Normal"
 
 # Phase 2: Optional ML Model using sklearn
-MODEL_PATH = "triage_model.pkl"
-VECTORIZER_PATH = "triage_vectorizer.pkl"
+MODEL_PATH = config.TRIAGE_MODEL_PATH
+VECTORIZER_PATH = config.TRIAGE_VECTORIZER_PATH
+
+# Loaded (model, vectorizer) pair, cached after the first successful load
+_loaded_model = None
+_load_lock = threading.Lock()
+
+def is_model_configured() -> bool:
+    """True when ML triage is switched on and the model files are present."""
+    return config.TRIAGE_ML_ENABLED and os.path.exists(MODEL_PATH) and os.path.exists(VECTORIZER_PATH)
+
+def load_model():
+    """
+    Load the model and vectorizer once and keep them in memory.
+    joblib (and sklearn through unpickling) is imported here rather than at module
+    import, so the API process only pays for it when a model is actually configured.
+    """
+    global _loaded_model
+    if _loaded_model is None:
+        with _load_lock:
+            if _loaded_model is None:
+                import joblib
+                _loaded_model = (joblib.load(MODEL_PATH), joblib.load(VECTORIZER_PATH))
+    return _loaded_model
 
 def ml_based_triage(symptoms: str) -> Optional[str]:
     """
@@ -36,14 +60,14 @@ def ml_based_triage(symptoms: str) -> Optional[str]:
     """
     if os.path.exists(MODEL_PATH) and os.path.exists(VECTORIZER_PATH):
         try:
-            model = joblib.load(MODEL_PATH)
-            vectorizer = joblib.load(VECTORIZER_PATH)
+            model, vectorizer = load_model()
             
-            # Vectorize the input text
-            X_input = vectorizer.transform([symptoms])
-            
-            # Predict (Assuming 1 = Emergency, 0 = Normal)
-            prediction = model.predict(X_input)
+            with metrics.timed(metrics.triage_duration, "ml"):
+                # Vectorize the input text
+                X_input = vectorizer.transform([symptoms])
+
+                # Predict (Assuming 1 = Emergency, 0 = Normal)
+                prediction = model.predict(X_input)
             
             if prediction[0] == 1:
                 return "Emergency"
@@ -75,6 +99,7 @@ def triage(symptoms: str) -> str:
 # Helper function to generate and save a mock sklearn model (Phase 2)
 # -------------------------------------------------------------------
 def train_and_save_mock_model():
+    import joblib
     from sklearn.feature_extraction.text import TfidfVectorizer
     from sklearn.linear_model import LogisticRegression
     
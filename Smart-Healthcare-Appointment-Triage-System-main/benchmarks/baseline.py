@@ -0,0 +1,57 @@
+"""
+Percentiles and the stored baseline that bench_crud and load_test compare against.
+
+benchmarks/baseline.json holds one section per suite: {suite: {operation: {metric: value}}}.
+Metrics ending in "_ms" are lower-is-better; "rps" is higher-is-better. A result more than
+`tolerance` (default 25%) worse than the baseline is reported as a regression.
+"""
+import json
+import math
+import os
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize_ms(samples: list) -> dict:
+    """p50/p95/p99 of samples given in seconds, in milliseconds."""
+    return {f"p{q}_ms": round(percentile(samples, q) * 1000, 3) for q in (50, 95, 99)}
+
+def load(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save(suite: str, results: dict, path: str = BASELINE_PATH):
+    baseline = load(path)
+    baseline[suite] = results
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def compare(suite: str, results: dict, tolerance: float = DEFAULT_TOLERANCE, path: str = BASELINE_PATH) -> list:
+    """Print results next to the stored baseline. Returns the regressions as strings."""
+    stored = load(path).get(suite, {})
+    regressions = []
+    print(f"{'operation':>24} | {'metric':>8} | {'current':>10} | {'baseline':>10} | {'change':>7}")
+    for operation, metrics in results.items():
+        for metric, value in metrics.items():
+            base = stored.get(operation, {}).get(metric)
+            if base in (None, 0):
+                print(f"{operation:>24} | {metric:>8} | {value:>10.3f} | {'-':>10} | {'-':>7}")
+                continue
+            change = (value - base) / base
+            worse = change > tolerance if metric.endswith("_ms") else change < -tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(f"{operation:>24} | {metric:>8} | {value:>10.3f} | {base:>10.3f} | {change:>+6.0%}{flag}")
+            if worse:
+                regressions.append(f"{suite}.{operation}.{metric}: {base} -> {value}")
+    return regressions
@@ -0,0 +1,97 @@
+"""
+Cost of keeping the aging-based queue order at large queue sizes.
+
+The queue index never recomputes scores: each (department, level) list stays in FIFO order
+and the current order is a merge by score at read time. This compares its per-operation
+costs with a full recompute (score every queued appointment and sort), which is what a
+periodic batch recomputation would pay on every tick.
+
+    python -m benchmarks.bench_aging [queued counts...]
+"""
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from backend import crud, models
+from backend.queue_index import QueueIndex, effective_score
+
+REPEAT = 50
+
+def median_ms(fn, repeat: int = REPEAT) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def fill(db: Session, count: int):
+    rng = random.Random(count)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    levels = ["Emergency", "Urgent", "Routine", "Routine"]
+    for offset in range(0, count, 50_000):
+        ids = range(offset + 1, min(offset + 50_000, count) + 1)
+        db.execute(insert(models.Patient), [{"id": i, "name": f"Patient {i}", "age": 30, "contact": "000"} for i in ids])
+        rows = []
+        for i in ids:
+            level = rng.choice(levels)
+            rows.append({
+                "id": i, "patient_id": i, "symptoms": "x", "triage_level": level,
+                "priority": crud.triage_priority(level), "status": "Queued",
+                "department": rng.choice(crud.DEPARTMENTS) if level != "Emergency" else crud.EMERGENCY_DEPARTMENT,
+                "created_at": now - datetime.timedelta(seconds=rng.randint(0, 12 * 3600)),
+            })
+        db.execute(insert(models.Appointment), rows)
+    db.commit()
+
+def full_recompute(index: QueueIndex):
+    """Score every queued appointment and sort: what a recompute-on-a-timer approach costs."""
+    now = time.time()
+    scored = [
+        (-effective_score(priority, created_at, now), created_at, appointment_id)
+        for department, priority, (created_at, appointment_id) in index._entries.values()
+    ]
+    scored.sort()
+    return scored
+
+def main(sizes):
+    print(f"{'queued':>8} | {'rebuild (ms)':>12} | {'top 100 (ms)':>12} | {'dept top 100 (ms)':>17} | "
+          f"{'book (ms)':>9} | {'discharge (ms)':>14} | {'full recompute (ms)':>19}")
+    for size in sorted(sizes):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            models.Base.metadata.create_all(bind=engine)
+            db = Session(engine)
+            fill(db, size)
+
+            index = QueueIndex()
+            rebuild = median_ms(lambda: index.reconcile(db), repeat=3)
+            top = median_ms(lambda: index.ordered_ids(db, limit=100))
+            dept_top = median_ms(lambda: index.ordered_ids(db, department="General", limit=100))
+
+            next_id = iter(range(size + 1, size + 1 + REPEAT))
+            now = datetime.datetime.now(datetime.timezone.utc)
+            booking = lambda: index.on_created(SimpleNamespace(
+                id=next(next_id), status="Queued", priority=3, department="General", created_at=now))
+            book = median_ms(booking)
+            removable = iter(random.Random(1).sample(range(1, size + 1), REPEAT))
+            discharge = median_ms(lambda: index.on_removed(next(removable)))
+            recompute = median_ms(lambda: full_recompute(index), repeat=5)
+
+            # Sanity check: the merge gives the same order as the full recompute
+            assert index.ordered_ids(db, limit=100) == [key[2] for key in full_recompute(index)[:100]]
+            print(f"{size:>8,} | {rebuild:>12.1f} | {top:>12.3f} | {dept_top:>17.3f} | "
+                  f"{book:>9.4f} | {discharge:>14.4f} | {recompute:>19.1f}")
+            db.close()
+            engine.dispose()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
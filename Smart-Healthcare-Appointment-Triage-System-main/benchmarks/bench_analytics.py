@@ -0,0 +1,100 @@
+"""
+/analytics reads from the hourly rollups against aggregating the appointments table.
+
+Fills a database with N appointments over 90 days (about 60% seen and discharged, with
+transition times), maintaining the rollups as it goes the way bulk writes do, then times
+the reports both ways and checks that they agree.
+
+    python -m benchmarks.bench_analytics [appointment counts...]   (default 1,000,000 and 10,000,000)
+"""
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import Session
+
+from backend import analytics, crud, models
+
+DAYS = 90
+CHUNK = 100_000
+LEVELS = ["Emergency", "Urgent", "Urgent", "Routine", "Routine", "Routine"]
+
+def fill(db: Session, count: int):
+    rng = random.Random(count)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    db.execute(insert(models.Patient), [{"id": 1, "name": "Bench", "age": 30, "contact": "000"}])
+    for offset in range(0, count, CHUNK):
+        rows = []
+        rollups = analytics.RollupDelta()
+        for i in range(offset, min(offset + CHUNK, count)):
+            level = rng.choice(LEVELS)
+            created_at = now - datetime.timedelta(seconds=rng.randint(0, DAYS * 86400))
+            started_at = completed_at = None
+            status = "Queued" if rng.random() < 0.4 else "Completed"
+            if status == "Completed":
+                started_at = min(created_at + datetime.timedelta(seconds=rng.randint(60, 4 * 3600)), now)
+                completed_at = min(started_at + datetime.timedelta(seconds=rng.randint(300, 3600)), now)
+            rows.append({
+                "id": i + 1, "patient_id": 1, "symptoms": "x", "triage_level": level,
+                "priority": crud.triage_priority(level), "status": status, "department": "General",
+                "created_at": created_at, "started_at": started_at, "completed_at": completed_at,
+            })
+            rollups.appointment(level, created_at, started_at, completed_at)
+        db.execute(insert(models.Appointment), rows)
+        rollups.write(db)
+        db.commit()
+
+def median_seconds(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def report(delta: analytics.RollupDelta, granularity: str):
+    """Both /analytics reports from one set of rollups."""
+    return analytics.throughput(delta, granularity), analytics.wait_times(delta, granularity)
+
+def main(sizes):
+    reports = [("hourly, last 24 h", "hour"), ("daily, last 30 days", "day")]
+    print(f"{'appointments':>12} | {'report':>20} | {'raw GROUP BY (ms)':>17} | {'rollups (ms)':>12} | {'speedup':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            models.Base.metadata.create_all(bind=engine)
+            db = Session(engine)
+            # Every row belongs to one patient; keep the full-text trigger from rewriting
+            # that patient's search row on each insert
+            db.execute(text("DROP TRIGGER IF EXISTS appointments_search_insert"))
+            started = time.perf_counter()
+            fill(db, size)
+            load_seconds = time.perf_counter() - started
+
+            for name, granularity in reports:
+                start, end = analytics.report_range(granularity)
+                raw_repeat = 3 if size > 1_000_000 else 5
+                raw = median_seconds(lambda: report(analytics.aggregate_raw(db, start, end), granularity), raw_repeat)
+                rolled = median_seconds(lambda: report(analytics.read_rollups(db, start, end), granularity), 20)
+                # Same answer both ways
+                assert analytics.throughput(analytics.aggregate_raw(db, start, end), granularity) == \
+                    analytics.throughput(analytics.read_rollups(db, start, end), granularity)
+                print(f"{size:>12,} | {name:>20} | {raw * 1000:>17.1f} | {rolled * 1000:>12.2f} | {raw / rolled:>7.0f}x")
+
+            # What keeping the rollups costs each booking: one upsert per write
+            appointment = models.Appointment(triage_level="Urgent", created_at=datetime.datetime.now(datetime.timezone.utc))
+            per_write = median_seconds(lambda: analytics.record_arrival(db, appointment), 200)
+            db.rollback()
+            rollup_rows = db.query(models.HourlyRollup).count()
+            print(f"{size:>12,} | loaded in {load_seconds:.0f} s; {rollup_rows:,} rollup rows; "
+                  f"rollup upsert per write {per_write * 1000:.3f} ms")
+            db.close()
+            engine.dispose()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000])
@@ -0,0 +1,79 @@
+"""
+Queue read latency as appointment history grows, with and without archival.
+
+Each round keeps the live queue at a fixed size and adds more completed history.
+Before archiving, the queue query runs against the whole appointments table;
+after archiving, the finished rows have moved out and the read stays flat.
+
+    python -m benchmarks.bench_archive [history sizes...]
+"""
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import archive, crud, models
+
+QUEUED = 500
+REPEAT = 50
+
+def timed_queue_read(db) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        crud.get_appointments(db, limit=100)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def add_history(db, count: int, start_id: int):
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=90)
+    rows = [
+        {"id": start_id + i, "patient_id": 1, "symptoms": "checkup", "triage_level": "Routine",
+         "priority": 3, "status": "Completed", "created_at": old}
+        for i in range(count)
+    ]
+    for i in range(0, len(rows), 50_000):
+        db.execute(insert(models.Appointment), rows[i:i + 50_000])
+    db.commit()
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.execute(insert(models.Patient), [{"id": 1, "name": "Bench", "age": 30, "contact": "000"}])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        db.execute(insert(models.Appointment), [
+            {"patient_id": 1, "symptoms": "fever", "triage_level": level, "priority": crud.triage_priority(level),
+             "status": "Queued", "created_at": now}
+            for level in ["Emergency", "Urgent", "Routine"] * (QUEUED // 3)
+        ])
+        db.commit()
+
+        print(f"{'history rows':>12} | {'live read (ms)':>14} | {'archived read (ms)':>18} | {'archive time (s)':>16}")
+        next_id = 1_000_000
+        live_history = 0
+        for size in sizes:
+            add_history(db, size - live_history, next_id)
+            next_id += size - live_history
+            before = timed_queue_read(db)
+            start = time.perf_counter()
+            archive.archive_finished_appointments(db, older_than_days=30, batch_size=5000)
+            archive_seconds = time.perf_counter() - start
+            after = timed_queue_read(db)
+            print(f"{size:>12,} | {before:>14.3f} | {after:>18.3f} | {archive_seconds:>16.2f}")
+            # Put the history back into the live table for the next, larger round
+            db.query(models.ArchivedAppointment).delete()
+            db.commit()
+            add_history(db, size, next_id)
+            next_id += size
+            live_history = size
+        db.close()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 500_000])
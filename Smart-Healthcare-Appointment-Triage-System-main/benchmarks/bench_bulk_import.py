@@ -0,0 +1,74 @@
+"""
+Bulk import throughput in records per second.
+
+Generates a JSONL file of patient + symptoms records (about one repeat visit per
+patient) and imports it into a fresh SQLite database. For comparison, a small sample
+is also replayed record by record through the same crud calls /book makes.
+
+    python -m benchmarks.bench_bulk_import [record count]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import bulk_import, crud, models, schemas
+
+SYMPTOMS = [
+    "Severe chest pain and shortness of breath", "High fever and severe headache", "Routine wellness checkup",
+    "Broken arm after a fall", "Mild rash on forearm", "Vomiting since last night", "Persistent dry cough",
+]
+PER_RECORD_SAMPLE = 2000
+
+def write_records(path: str, count: int):
+    rng = random.Random(42)
+    with open(path, "w") as f:
+        for i in range(count):
+            patient = rng.randrange(max(1, count // 2))
+            f.write(json.dumps({
+                "name": f"Patient {patient}", "age": 20 + patient % 60, "contact": f"555-{patient:07d}",
+                "symptoms": rng.choice(SYMPTOMS), "created_at": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}T10:00:00",
+            }) + "\n")
+
+def fresh_session(tmp: str, name: str):
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, name)}")
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+def per_record(db, path: str) -> float:
+    """The /book path: patient lookup, create, triage and two commits per record."""
+    records = list(bulk_import.read_records(path))[:PER_RECORD_SAMPLE]
+    start = time.perf_counter()
+    for r in records:
+        patient = crud.get_patient_by_details(db, name=r.name, age=r.age)
+        if not patient:
+            patient = crud.create_patient(db, schemas.PatientCreate(name=r.name, age=r.age, contact=r.contact))
+        level = crud.evaluate_triage_level(r.symptoms)
+        crud.create_appointment(db, schemas.AppointmentCreate(patient_id=patient.id, symptoms=r.symptoms, triage_level=level))
+    return len(records) / (time.perf_counter() - start)
+
+def main(count: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "records.jsonl")
+        write_records(path, count)
+
+        db = fresh_session(tmp, "bulk.db")
+        start = time.perf_counter()
+        result = bulk_import.import_file(db, path)
+        elapsed = time.perf_counter() - start
+        db.close()
+        print(f"bulk import: {count:,} records in {elapsed:.2f}s -> {count / elapsed:,.0f} records/s "
+              f"({result['patients_created']:,} patients, {result['appointments_created']:,} appointments)")
+
+        db = fresh_session(tmp, "per_record.db")
+        rate = per_record(db, path)
+        db.close()
+        print(f"per-record (/book path, {PER_RECORD_SAMPLE:,} sample): {rate:,.0f} records/s")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
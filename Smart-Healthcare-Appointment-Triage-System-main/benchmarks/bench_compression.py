@@ -0,0 +1,92 @@
+"""
+CPU time and bytes sent per request for the big list endpoints, with and without gzip,
+and for /appointments with the pre-serialized response cache cold vs warm.
+
+CPU time is process time (server + client share one process under TestClient), so compare
+rows against each other rather than reading them as absolute server cost.
+
+    python -m benchmarks.bench_compression [row counts...]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.database import get_db
+from backend.responses import queue_response_cache
+from main import app
+
+REPEAT = 10
+
+ENCODINGS = {"identity": "identity", "gzip": "gzip"}
+
+def fill(SessionLocal, count: int):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with SessionLocal() as db:
+        db.execute(insert(models.Patient), [
+            {"id": i, "name": f"Patient {i}", "age": 20 + i % 60, "contact": f"555-{i:07d}"} for i in range(1, count + 1)
+        ])
+        db.execute(insert(models.Appointment), [
+            {"id": i, "patient_id": i, "symptoms": "High fever and severe headache", "triage_level": "Urgent",
+             "priority": 2, "status": "Queued", "created_at": now} for i in range(1, count + 1)
+        ])
+        db.execute(insert(models.Notification), [
+            {"appointment_id": i, "patient_id": i, "message": f"Your appointment #{i} is confirmed.",
+             "contact_number": f"555-{i:07d}", "notification_type": "Confirmation", "status": "Sent", "created_at": now} for i in range(1, count + 1)
+        ])
+        db.commit()
+
+def measure(client, path: str, params: dict, encoding: str, warm_cache: bool):
+    """Return (CPU ms per request, bytes on the wire per request)."""
+    cpu = 0.0
+    sent = 0
+    for _ in range(REPEAT):
+        if not warm_cache:
+            queue_response_cache.invalidate()
+        start = time.process_time()
+        response = client.get(path, params=params, headers={"Accept-Encoding": encoding})
+        cpu += time.process_time() - start
+        sent += response.num_bytes_downloaded
+    return cpu / REPEAT * 1000, sent // REPEAT
+
+def main(sizes):
+    print(f"{'rows':>8} | {'endpoint':>24} | {'encoding':>8} | {'cache':>5} | {'CPU (ms)':>8} | {'bytes sent':>11}")
+    for size in sorted(sizes):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+            models.Base.metadata.create_all(bind=engine)
+            SessionLocal = sessionmaker(bind=engine)
+            fill(SessionLocal, size)
+
+            def override_get_db():
+                db = SessionLocal()
+                try:
+                    yield db
+                finally:
+                    db.close()
+            app.dependency_overrides[get_db] = override_get_db
+            client = TestClient(app)
+
+            cases = [
+                ("/patients", {"limit": size}, False),
+                ("/notifications", {"limit": size}, False),
+                ("/appointments", {"limit": size}, False),
+                ("/appointments", {"limit": size}, True),
+            ]
+            for path, params, warm in cases:
+                for encoding in ENCODINGS.values():
+                    cpu_ms, sent = measure(client, path, params, encoding, warm)
+                    label = ("warm" if warm else "cold") if path == "/appointments" else "-"
+                    print(f"{size:>8,} | {path:>24} | {encoding:>8} | {label:>5} | {cpu_ms:>8.1f} | {sent:>11,}")
+            app.dependency_overrides.clear()
+            queue_response_cache.invalidate()
+            engine.dispose()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 10_000])
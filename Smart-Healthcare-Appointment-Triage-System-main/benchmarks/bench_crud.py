@@ -0,0 +1,82 @@
+"""
+Micro-benchmarks for crud functions and triage on a synthetic database.
+
+Each operation is run REPEAT times; p50/p95/p99 are compared against the "crud" section
+of benchmarks/baseline.json. Exits with status 1 when something regressed by more than
+--tolerance, so it can gate CI.
+
+    python -m benchmarks.bench_crud [--patients 20000] [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy.orm import Session
+
+from backend import crud, schemas
+from backend.stats import queue_stats
+from benchmarks import baseline, datagen
+
+REPEAT = 200
+
+def run(fn, repeat: int = REPEAT) -> dict:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return baseline.summarize_ms(samples)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=baseline.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = datagen.create_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.patients,
+                                         appointments_per_patient=2, notifications_per_appointment=1)
+        db = Session(engine)
+        symptoms = itertools.cycle(datagen.SYMPTOMS)
+        patient_ids = itertools.cycle(range(1, args.patients + 1, 97))
+
+        def book():
+            level = crud.evaluate_triage_level(next(symptoms))
+            crud.create_appointment(db, schemas.AppointmentCreate(
+                patient_id=next(patient_ids), symptoms="Benchmark booking", triage_level=level))
+
+        operations = {
+            "triage": lambda: crud.evaluate_triage_level(next(symptoms)),
+            "create_appointment": book,
+            "get_appointments": lambda: crud.get_appointments(db, limit=100),
+            "get_appointments_compact": lambda: crud.get_appointments_compact(db, limit=100),
+            "get_patient_history": lambda: crud.get_patient_history(db, next(patient_ids)),
+            "search_patients": lambda: crud.search_patients(db, "garc"),
+            "get_all_notifications": lambda: crud.get_all_notifications(db, limit=100),
+            "stats_reconcile": lambda: queue_stats.reconcile(db),
+        }
+        results = {}
+        for name, fn in operations.items():
+            results[name] = run(fn)
+            # Keep ORM identity map growth out of the next measurement
+            db.expunge_all()
+        db.close()
+        engine.dispose()
+
+    print(f"crud micro-benchmarks, {args.patients:,} patients, {REPEAT} runs each")
+    regressions = baseline.compare("crud", results, args.tolerance)
+    if args.save_baseline:
+        baseline.save("crud", results)
+        print(f"Saved baseline to {baseline.BASELINE_PATH}")
+        return 0
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
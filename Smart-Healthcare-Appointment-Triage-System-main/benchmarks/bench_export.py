@@ -0,0 +1,64 @@
+"""
+Peak Python memory while streaming the appointment export.
+
+Peak memory should stay roughly the same whether 100k or 1M rows are exported,
+because rows are fetched with yield_per and written out chunk by chunk.
+
+    python -m benchmarks.bench_export [row counts...]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import export, models
+
+def fill(db, count: int, start_id: int):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for offset in range(0, count, 50_000):
+        db.execute(insert(models.Appointment), [
+            {"id": start_id + offset + i, "patient_id": 1 + (offset + i) % 1000,
+             "symptoms": "High fever and severe headache", "triage_level": "Urgent",
+             "priority": 2, "status": "Completed", "created_at": now}
+            for i in range(min(50_000, count - offset))
+        ])
+    db.commit()
+
+def measure(db, export_format: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    total_bytes = 0
+    for chunk in export.serialize(export.appointment_rows(db), export.APPOINTMENT_FIELDS, export_format):
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed, total_bytes
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.execute(insert(models.Patient), [
+            {"id": i, "name": f"Patient {i}", "age": 30, "contact": "000"} for i in range(1, 1001)
+        ])
+        db.commit()
+
+        print(f"{'rows':>10} | {'format':>6} | {'peak memory (MB)':>16} | {'time (s)':>8} | {'output (MB)':>11}")
+        loaded = 0
+        for size in sorted(sizes):
+            fill(db, size - loaded, loaded + 1)
+            loaded = size
+            for export_format in ("ndjson", "csv"):
+                peak, elapsed, total_bytes = measure(db, export_format)
+                print(f"{size:>10,} | {export_format:>6} | {peak / 1e6:>16.2f} | {elapsed:>8.2f} | {total_bytes / 1e6:>11.1f}")
+        db.close()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,79 @@
+"""
+Typo-tolerant triage: latency of the symmetric-delete index against comparing each word
+with every vocabulary word, and what fuzzy matching adds to crud.evaluate_triage_level.
+
+Vocabulary sizes past the real triage keywords are random words, to show that a lookup
+does not slow down as the vocabulary grows.
+
+    python -m benchmarks.bench_fuzzy [vocabulary sizes...]   (default 1,000 and 20,000)
+"""
+import random
+import statistics
+import string
+import sys
+import time
+
+from backend import config, crud, fuzzy
+
+# Misspellings, correct words and ordinary words, as they come in symptom text
+WORDS = ["chset", "bleding", "brething", "feaver", "unconcious", "dizzyness", "headache", "swollen", "throat", "never"]
+SYMPTOMS = {
+    "exact keyword": "severe chest pain since morning",
+    "misspelled": "heavy bleding from the arm",
+    "no keyword": "persistent cough and a sore throat for a week",
+}
+REPEAT = 2000
+
+def median_us(fn, repeat: int = REPEAT) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1_000_000
+
+def naive_lookup(words: list, word: str):
+    """Edit distance against every vocabulary word."""
+    distance = fuzzy.allowed_distance(word)
+    if distance == 0:
+        return None
+    best = min(words, key=lambda w: fuzzy.edit_distance(word, w, distance))
+    return best if fuzzy.edit_distance(word, best, distance) <= distance else None
+
+def random_vocabulary(size: int) -> list:
+    rng = random.Random(size)
+    words = list(crud.triage_vocabulary.words)
+    while len(words) < size:
+        words.append("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 11))))
+    return words
+
+def main(sizes):
+    print(f"{'vocabulary':>10} | {'build (ms)':>10} | {'symspell per word (us)':>22} | {'cached (us)':>11} | {'naive per word (us)':>19}")
+    for size in [len(crud.triage_vocabulary.words)] + sizes:
+        words = random_vocabulary(size)
+        start = time.perf_counter()
+        index = fuzzy.FuzzyIndex(words)
+        build = (time.perf_counter() - start) * 1000
+        assert [index.lookup(w) for w in WORDS] == [naive_lookup(words, w) if w not in index.common_words else None for w in WORDS]
+        symspell = median_us(lambda: [index.find(w) for w in WORDS], 200) / len(WORDS)
+        cached = median_us(lambda: [index.lookup(w) for w in WORDS], 200) / len(WORDS)
+        naive = median_us(lambda: [naive_lookup(words, w) for w in WORDS], 5 if size > 1000 else 50) / len(WORDS)
+        print(f"{size:>10,} | {build:>10.1f} | {symspell:>22.1f} | {cached:>11.2f} | {naive:>19.1f}")
+
+    print()
+    print(f"{'symptoms':>13} | {'keywords only (us)':>18} | {'fuzzy, new words (us)':>21} | {'fuzzy, seen words (us)':>22}")
+    for name, text in SYMPTOMS.items():
+        config.TRIAGE_FUZZY_MATCHING = False
+        exact = median_us(lambda: crud.evaluate_triage_level(text))
+        config.TRIAGE_FUZZY_MATCHING = True
+
+        def uncached():
+            crud.triage_vocabulary.lookup.cache_clear()
+            crud.evaluate_triage_level(text)
+
+        new_words = median_us(uncached)
+        seen_words = median_us(lambda: crud.evaluate_triage_level(text))
+        print(f"{name:>13} | {exact:>18.1f} | {new_words:>21.1f} | {seen_words:>22.1f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 20_000])
@@ -0,0 +1,78 @@
+"""
+Booking throughput with and without group commit.
+
+For each setting, starts `uvicorn main:app` on a fresh synthetic database and has 1, 16
+and 128 concurrent clients POST /book for --duration seconds each.
+
+    python -m benchmarks.bench_group_commit [--duration 10] [--clients 1 16 128]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import baseline, datagen
+from benchmarks.load_test import free_port, start_server, wait_until_ready
+
+SETTINGS = {
+    "one commit per booking": {"GROUP_COMMIT_ENABLED": "0"},
+    "group commit": {"GROUP_COMMIT_ENABLED": "1"},
+}
+
+async def booking_client(client: httpx.AsyncClient, deadline: float, rng: random.Random, latencies: list, errors: list):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/book", json={
+                "patient": {"name": f"Bench Patient {rng.randint(1, 1_000_000)}", "age": rng.randint(1, 95), "contact": "555-0000000"},
+                "symptoms": rng.choice(datagen.SYMPTOMS),
+            })
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        if response.status_code == 201:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(response.status_code)
+
+async def run(url: str, clients: int, duration: float) -> dict:
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        await wait_until_ready(client)
+        start = time.monotonic()
+        await asyncio.gather(*(
+            booking_client(client, start + duration, random.Random(i), latencies, errors) for i in range(clients)
+        ))
+        elapsed = time.monotonic() - start
+    return {**baseline.summarize_ms(latencies), "bookings_per_s": round(len(latencies) / elapsed, 1), "errors": len(errors)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bookings per second with and without group commit.")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--patients", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    print(f"{'setting':>24} | {'clients':>7} | {'bookings/s':>10} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | {'errors':>6}")
+    for name, env in SETTINGS.items():
+        for clients in args.clients:
+            with tempfile.TemporaryDirectory() as tmp:
+                database_path = os.path.join(tmp, "bench.db")
+                datagen.create_database(f"sqlite:///{database_path}", args.patients).dispose()
+                port = free_port()
+                server = start_server(database_path, port, env)
+                try:
+                    result = asyncio.run(run(f"http://127.0.0.1:{port}", clients, args.duration))
+                finally:
+                    server.terminate()
+                    server.wait(timeout=10)
+            print(f"{name:>24} | {clients:>7} | {result['bookings_per_s']:>10.1f} | "
+                  f"{result['p50_ms']:>8.1f} | {result['p99_ms']:>8.1f} | {result['errors']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Notification lookups as the notifications table grows, with and without its indexes,
+and the cost of the retention job that moves old Sent notifications to the archive.
+
+    python -m benchmarks.bench_notifications [notification counts...]
+"""
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import Session
+
+from backend import archive, crud, models
+
+PATIENTS = 1000
+REPEAT = 30
+INDEXES = [index.name for index in models.Notification.__table__.indexes]
+
+def median_ms(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def fill(db: Session, count: int):
+    """`count` notifications over 60 days, one appointment per patient; 1 in 5,000 still pending."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    db.execute(insert(models.Patient), [{"id": i, "name": f"Patient {i}", "age": 30, "contact": "000"} for i in range(1, PATIENTS + 1)])
+    db.execute(insert(models.Appointment), [
+        {"id": i, "patient_id": i, "symptoms": "checkup", "triage_level": "Routine", "priority": 3,
+         "status": "Completed", "created_at": now}
+        for i in range(1, PATIENTS + 1)
+    ])
+    for offset in range(0, count, 50_000):
+        db.execute(insert(models.Notification), [
+            {"patient_id": i % PATIENTS + 1, "appointment_id": i % PATIENTS + 1, "message": "Your appointment is confirmed.",
+             "contact_number": "000", "notification_type": "Confirmation", "status": "Pending" if i % 5000 == 0 else "Sent",
+             "created_at": now - datetime.timedelta(seconds=(count - i) * 60 * 86400 // count)}
+            for i in range(offset, min(offset + 50_000, count))
+        ])
+    db.commit()
+
+def time_lookups(db: Session) -> dict:
+    return {
+        "by patient": median_ms(lambda: crud.get_notifications_by_patient(db, 7)),
+        "by appointment": median_ms(lambda: crud.get_notifications_by_appointment(db, 7)),
+        "all (newest 100)": median_ms(lambda: crud.get_all_notifications(db, limit=100)),
+        "pending": median_ms(lambda: crud.get_pending_notifications(db)),
+    }
+
+def main(sizes):
+    print(f"{'rows':>9} | {'lookup':>16} | {'no index (ms)':>13} | {'indexed (ms)':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            models.Base.metadata.create_all(bind=engine)
+            db = Session(engine)
+            fill(db, size)
+
+            indexed = time_lookups(db)
+            for name in INDEXES:
+                db.execute(text(f"DROP INDEX {name}"))
+            db.commit()
+            unindexed = time_lookups(db)
+            for name, ms in indexed.items():
+                print(f"{size:>9,} | {name:>16} | {unindexed[name]:>13.3f} | {ms:>12.3f}")
+            db.close()
+            engine.dispose()
+
+            # Retention on a fresh copy with the indexes in place
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'retention.db')}")
+            models.Base.metadata.create_all(bind=engine)
+            db = Session(engine)
+            fill(db, size)
+            start = time.perf_counter()
+            moved = archive.archive_sent_notifications(db, older_than_days=7)
+            seconds = time.perf_counter() - start
+            after = time_lookups(db)
+            print(f"{size:>9,} | retention moved {moved:,} in {seconds:.2f} s; "
+                  f"all (newest 100) {after['all (newest 100)']:.3f} ms, pending {after['pending']:.3f} ms afterwards")
+            db.close()
+            engine.dispose()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000])
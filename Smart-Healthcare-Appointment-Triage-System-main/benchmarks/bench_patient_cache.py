@@ -0,0 +1,90 @@
+"""
+Patient profile lookups (crud.get_patient): database, shared cache and request memo, and
+the hit rate of a request mix that keeps returning to the same patients.
+
+    python -m benchmarks.bench_patient_cache [patient counts...]   (default 100,000)
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from backend import crud, metrics, models
+from backend.patient_cache import patient_cache
+
+REPEAT = 2000
+# Requests in the mix, and how many lookups each makes (endpoint + crud, as /notifications/send does)
+REQUESTS = 20_000
+LOOKUPS_PER_REQUEST = 2
+
+def median_us(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1_000_000
+
+def main(sizes):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            models.Base.metadata.create_all(bind=engine)
+            db = Session(engine)
+            db.execute(insert(models.Patient), [
+                {"id": i, "name": f"Patient {i}", "age": 20 + i % 60, "contact": f"555-{i:07d}", "visit_count": 1}
+                for i in range(1, size + 1)
+            ])
+            db.commit()
+            rng = random.Random(size)
+
+            def uncached():
+                # What get_patient did before: a query per call
+                db.query(models.Patient).filter(models.Patient.id == rng.randint(1, size)).first()
+                db.rollback()
+
+            def cache_miss():
+                patient_cache.clear()
+                crud.get_patient(db, rng.randint(1, size))
+                db.rollback()
+
+            def cache_hit():
+                crud.get_patient(db, 42)
+                db.rollback()
+
+            crud.get_patient(db, 7)
+            timings = {
+                "query per lookup": median_us(uncached),
+                "cache miss": median_us(cache_miss),
+                "shared cache hit": median_us(cache_hit),
+                "request memo": median_us(lambda: crud.get_patient(db, 7)),
+            }
+            db.rollback()
+            print(f"{size:,} patients")
+            for name, us in timings.items():
+                print(f"  {name:>18}: {us:8.1f} us")
+
+            # A day's mix: 80% of requests are about the 2,000 patients currently in the building
+            patient_cache.clear()
+            metrics.patient_cache_lookups.reset()
+            active = rng.sample(range(1, size + 1), 2000)
+            start = time.perf_counter()
+            for _ in range(REQUESTS):
+                patient_id = rng.choice(active) if rng.random() < 0.8 else rng.randint(1, size)
+                for _ in range(LOOKUPS_PER_REQUEST):
+                    crud.get_patient(db, patient_id)
+                db.rollback()
+            elapsed = time.perf_counter() - start
+            print(f"  mix of {REQUESTS:,} requests: {elapsed * 1000:.0f} ms, hit ratio {metrics.patient_cache_hit_ratio.value():.2f} "
+                  f"(memo {metrics.patient_cache_lookups.value('memo'):.0f}, hit {metrics.patient_cache_lookups.value('hit'):.0f}, "
+                  f"miss {metrics.patient_cache_lookups.value('miss'):.0f})")
+            db.close()
+            engine.dispose()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000])
@@ -0,0 +1,92 @@
+"""
+Cost of reading and serializing the queue: full AppointmentResponse view vs view=compact.
+
+"full" is what /appointments does by default: ORM query, lazy patient loads, Pydantic
+validation of AppointmentResponse + PatientResponse, JSON encoding. "compact" is a single
+column-only joined SELECT dumped straight to JSON. Both are also timed end to end over HTTP.
+
+    python -m benchmarks.bench_queue_view [queue sizes...]
+"""
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, schemas
+from backend.database import get_db
+from backend.responses import dumps
+from main import app
+
+REPEAT = 15
+
+def median_ms(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def full_view(SessionLocal, limit: int):
+    db = SessionLocal()
+    try:
+        rows = [schemas.AppointmentResponse.model_validate(a).model_dump(mode="json")
+                for a in crud.get_appointments(db, limit=limit)]
+        return json.dumps(rows)
+    finally:
+        db.close()
+
+def compact_view(SessionLocal, limit: int):
+    db = SessionLocal()
+    try:
+        return dumps(crud.get_appointments_compact(db, limit=limit))
+    finally:
+        db.close()
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine)
+        largest = max(sizes)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with SessionLocal() as db:
+            db.execute(insert(models.Patient), [
+                {"id": i, "name": f"Patient {i}", "age": 20 + i % 60, "contact": f"555-{i:07d}"} for i in range(1, largest + 1)
+            ])
+            db.execute(insert(models.Appointment), [
+                {"patient_id": i, "symptoms": "High fever and severe headache", "triage_level": "Urgent",
+                 "priority": 2, "status": "Queued", "created_at": now} for i in range(1, largest + 1)
+            ])
+            db.commit()
+
+        def override_get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+        app.dependency_overrides[get_db] = override_get_db
+        client = TestClient(app)
+
+        print(f"{'queue size':>10} | {'full (ms)':>9} | {'compact (ms)':>12} | {'HTTP full (ms)':>14} | {'HTTP compact (ms)':>17} | {'bytes full/compact':>18}")
+        for size in sorted(sizes):
+            full = median_ms(lambda: full_view(SessionLocal, size))
+            compact = median_ms(lambda: compact_view(SessionLocal, size))
+            http_full = median_ms(lambda: client.get("/appointments", params={"limit": size}))
+            http_compact = median_ms(lambda: client.get("/appointments", params={"limit": size, "view": "compact"}))
+            bytes_full = len(client.get("/appointments", params={"limit": size}).content)
+            bytes_compact = len(client.get("/appointments", params={"limit": size, "view": "compact"}).content)
+            print(f"{size:>10,} | {full:>9.1f} | {compact:>12.1f} | {http_full:>14.1f} | {http_compact:>17.1f} | "
+                  f"{bytes_full:>9,}/{bytes_compact:,}")
+        app.dependency_overrides.clear()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1_000, 10_000])
@@ -0,0 +1,136 @@
+"""
+Free-slot search across providers: the in-memory free-slot index against building each
+provider's calendar from SQL per request, plus a concurrent-booking check.
+
+Gives N providers (30-minute slots, 09:00-17:00, Monday-Friday) bookings for about FILL
+of their slots over the scheduling horizon, then times "next 10 free slots"
+from now and from two weeks ahead. Finally several threads race to book the same slots;
+every slot must end up booked exactly once.
+
+    python -m benchmarks.bench_scheduling [provider counts...]   (default 100 and 500)
+"""
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend import config, crud, models, schemas
+from backend.slot_index import SlotIndex, slot_grid
+
+FILL = 0.7
+COUNT = 10
+REPEAT = 20
+THREADS = 8
+
+def median_ms(fn, repeat: int = REPEAT) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def fill(db: Session, providers: int):
+    rng = random.Random(providers)
+    now = datetime.datetime.now()
+    until = now + datetime.timedelta(days=config.SCHEDULING_HORIZON_DAYS)
+    db.execute(insert(models.Patient), [{"id": 1, "name": "Bench", "age": 30, "contact": "000"}])
+    db.execute(insert(models.Provider), [
+        {"id": i, "name": f"Provider {i}", "department": "General", "slot_minutes": 30,
+         "day_start_hour": 9, "day_end_hour": 17, "working_days": "0,1,2,3,4"}
+        for i in range(1, providers + 1)
+    ])
+    rows = []
+    for provider in db.query(models.Provider):
+        for start in slot_grid(provider, now, until):
+            if rng.random() < FILL:
+                rows.append({"provider_id": provider.id, "patient_id": 1, "symptoms": "checkup", "status": "Booked",
+                             "start_at": start, "end_at": start + datetime.timedelta(minutes=30)})
+    db.execute(insert(models.ScheduledSlot), rows)
+    db.commit()
+    return len(rows)
+
+def naive_next_free(db: Session, count: int, after: datetime.datetime) -> list:
+    """Every provider's grid minus their bookings, read from SQL on each request."""
+    until = after + datetime.timedelta(days=config.SCHEDULING_HORIZON_DAYS)
+    booked = set(db.query(models.ScheduledSlot.provider_id, models.ScheduledSlot.start_at).filter(
+        models.ScheduledSlot.status == "Booked",
+        models.ScheduledSlot.start_at >= after,
+        models.ScheduledSlot.start_at < until,
+    ))
+    free = []
+    for provider in db.query(models.Provider):
+        free.extend((start, provider.id) for start in slot_grid(provider, after, until) if (provider.id, start) not in booked)
+    return sorted(free)[:count]
+
+def race(engine) -> tuple:
+    """THREADS threads book the same 40 slots in different orders; returns (booked, refused, slots)."""
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    targets = [(start, pid) for start, pid in SlotIndex().next_free(db, 40)]
+    db.close()
+    results = {"booked": 0, "refused": 0}
+    lock = threading.Lock()
+
+    def worker(seed: int):
+        order = list(targets)
+        random.Random(seed).shuffle(order)
+        session = factory()
+        try:
+            for start, pid in order:
+                request = schemas.SlotBookRequest(provider_id=pid, start_at=start, symptoms="checkup",
+                                                  patient={"name": f"Racer {seed}", "age": 30, "contact": "1"})
+                try:
+                    crud.book_slot(session, session.get(models.Provider, pid), request, triage_level="Routine")
+                    outcome = "booked"
+                except crud.SlotUnavailableError:
+                    outcome = "refused"
+                with lock:
+                    results[outcome] += 1
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results["booked"], results["refused"], len(targets)
+
+def main(sizes):
+    print(f"{'providers':>9} | {'bookings':>8} | {'query':>18} | {'from SQL (ms)':>13} | {'index (ms)':>10} | {'speedup':>7}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"timeout": 30})
+            models.Base.metadata.create_all(bind=engine)
+            db = Session(engine)
+            bookings = fill(db, size)
+
+            index = SlotIndex()
+            rebuild = median_ms(lambda: index.reconcile(db), 3)
+            now = datetime.datetime.now()
+            for name, after in [("next 10 from now", now), ("next 10 in 2 weeks", now + datetime.timedelta(weeks=2))]:
+                assert naive_next_free(db, COUNT, after) == index.next_free(db, COUNT, after)
+                naive = median_ms(lambda: naive_next_free(db, COUNT, after), 5)
+                indexed = median_ms(lambda: index.next_free(db, COUNT, after))
+                print(f"{size:>9,} | {bookings:>8,} | {name:>18} | {naive:>13.1f} | {indexed:>10.3f} | {naive / indexed:>6.0f}x")
+            print(f"{size:>9,} | index rebuilt from SQL in {rebuild:.0f} ms")
+            db.close()
+
+            booked, refused, targets = race(engine)
+            check = Session(engine)
+            rows = check.query(models.ScheduledSlot).filter(models.ScheduledSlot.patient_id != 1).count()
+            check.close()
+            assert booked == targets == rows, (booked, targets, rows)
+            print(f"{size:>9,} | {THREADS} threads raced for {targets} slots: {booked} booked once each, {refused} refused")
+            engine.dispose()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100, 500])
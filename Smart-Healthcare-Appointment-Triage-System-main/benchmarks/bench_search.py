@@ -0,0 +1,72 @@
+"""
+Patient search latency at growing registry sizes.
+
+Compares the FTS5-backed crud.search_patients against a LIKE scan over name and
+contact (what a naive server-side filter would do) for a few typical queries.
+
+    python -m benchmarks.bench_search [patient counts...]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models
+
+FIRST = ["John", "Jane", "Maria", "Ahmed", "Wei", "Priya", "Olga", "Carlos", "Fatima", "Kenji"]
+LAST = ["Smith", "Garcia", "Khan", "Chen", "Patel", "Ivanova", "Silva", "Okafor", "Tanaka", "Muller"]
+SYMPTOMS = ["chest pain", "high fever", "broken wrist", "mild rash", "persistent cough", "dizziness"]
+# Common prefixes, a rare contact number, a symptom and a two-word query
+QUERIES = ["joh", "garcia", "0099999", "fever", "priya khan"]
+REPEAT = 20
+
+def fill(db, count: int, start_id: int):
+    rng = random.Random(start_id)
+    for offset in range(0, count, 50_000):
+        ids = range(start_id + offset, start_id + offset + min(50_000, count - offset))
+        db.execute(insert(models.Patient), [
+            {"id": i, "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}{i}", "age": 20 + i % 60, "contact": f"555-{i:07d}"}
+            for i in ids
+        ])
+        db.execute(insert(models.Appointment), [
+            {"patient_id": i, "symptoms": rng.choice(SYMPTOMS), "triage_level": "Routine", "priority": 3, "status": "Completed"}
+            for i in ids
+        ])
+    db.commit()
+
+def like_search(db, query: str, limit: int = 20):
+    filters = [or_(models.Patient.name.ilike(f"%{t}%"), models.Patient.contact.ilike(f"%{t}%")) for t in query.split()]
+    return db.query(models.Patient).filter(*filters).limit(limit).all()
+
+def median_ms(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+
+        print(f"{'patients':>10} | {'query':>12} | {'FTS5 (ms)':>9} | {'LIKE scan (ms)':>14}")
+        loaded = 0
+        for size in sorted(sizes):
+            fill(db, size - loaded, loaded + 1)
+            loaded = size
+            for query in QUERIES:
+                fts = median_ms(lambda: crud.search_patients(db, query))
+                like = median_ms(lambda: like_search(db, query))
+                print(f"{size:>10,} | {query:>12} | {fts:>9.2f} | {like:>14.2f}")
+        db.close()
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,111 @@
+"""
+Synthetic patients, appointments and notifications for benchmarks and load tests.
+
+Rows are inserted with executemany in chunks, so a million-row database takes seconds.
+Data is deterministic for a given seed.
+
+    python -m benchmarks.datagen bench.db --patients 100000 --appointments 3 --notifications 1
+"""
+import argparse
+import datetime
+import random
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from backend import analytics, crud, migrations, models
+
+FIRST = ["John", "Jane", "Maria", "Ahmed", "Wei", "Priya", "Olga", "Carlos", "Fatima", "Kenji"]
+LAST = ["Smith", "Garcia", "Khan", "Chen", "Patel", "Ivanova", "Silva", "Okafor", "Tanaka", "Muller"]
+SYMPTOMS = [
+    "Severe chest pain radiating to left arm", "Difficulty breathing", "Heavy bleeding from a cut",
+    "High fever and severe headache", "Possible fracture after a fall", "Vomiting since last night",
+    "Routine checkup", "Mild rash on forearm", "Persistent dry cough", "Prescription renewal",
+]
+STATUSES = ["Queued", "Queued", "Completed", "Completed", "Completed"]
+CHUNK = 20_000
+
+def _chunks(count: int):
+    for offset in range(0, count, CHUNK):
+        yield offset, min(CHUNK, count - offset)
+
+def generate(db: Session, patients: int, appointments_per_patient: int = 1,
+             notifications_per_appointment: int = 0, seed: int = 42, days: int = 60) -> dict:
+    """
+    Append synthetic data after any rows already present. Appointments are spread
+    over the last `days` days; roughly 40% are still queued, the rest have been seen
+    and discharged.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    first_patient = (db.scalar(select(func.max(models.Patient.id))) or 0) + 1
+    first_appointment = (db.scalar(select(func.max(models.Appointment.id))) or 0) + 1
+    triage = {s: crud.evaluate_triage_level(s) for s in SYMPTOMS}
+
+    for offset, size in _chunks(patients):
+        db.execute(insert(models.Patient), [
+            {"id": first_patient + offset + i, "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}{first_patient + offset + i}",
+             "age": rng.randint(1, 95), "gender": rng.choice(["Male", "Female"]),
+             "contact": f"555-{first_patient + offset + i:07d}"}
+            for i in range(size)
+        ])
+
+    total_appointments = patients * appointments_per_patient
+    for offset, size in _chunks(total_appointments):
+        rows = []
+        rollups = analytics.RollupDelta()
+        for i in range(offset, offset + size):
+            symptoms = rng.choice(SYMPTOMS)
+            level = triage[symptoms]
+            status = rng.choice(STATUSES)
+            created_at = now - datetime.timedelta(seconds=rng.randint(0, days * 86400))
+            started_at = completed_at = None
+            if status == "Completed":
+                # Seen after up to 4 hours, discharged up to an hour later (never in the future)
+                started_at = min(created_at + datetime.timedelta(seconds=rng.randint(60, 4 * 3600)), now)
+                completed_at = min(started_at + datetime.timedelta(seconds=rng.randint(300, 3600)), now)
+            rows.append({
+                "id": first_appointment + i, "patient_id": first_patient + i % patients,
+                "symptoms": symptoms, "triage_level": level, "priority": crud.triage_priority(level),
+                "status": status, "department": crud.route_department(symptoms, level),
+                "created_at": created_at, "started_at": started_at, "completed_at": completed_at,
+            })
+            rollups.appointment(level, created_at, started_at, completed_at)
+        db.execute(insert(models.Appointment), rows)
+        rollups.write(db)
+    for offset, size in _chunks(patients):
+        crud.refresh_patient_summaries(db, range(first_patient + offset, first_patient + offset + size))
+
+    total_notifications = total_appointments * notifications_per_appointment
+    for offset, size in _chunks(total_notifications):
+        db.execute(insert(models.Notification), [
+            {"appointment_id": first_appointment + i % total_appointments,
+             "patient_id": first_patient + (i % total_appointments) % patients,
+             "message": "Your appointment has been booked.", "contact_number": "555-0000000",
+             "notification_type": "Confirmation", "status": "Sent", "created_at": now, "sent_at": now}
+            for i in range(offset, offset + size)
+        ])
+    db.commit()
+    return {"patients": patients, "appointments": total_appointments, "notifications": total_notifications}
+
+def create_database(url: str, patients: int, appointments_per_patient: int = 1,
+                    notifications_per_appointment: int = 0, seed: int = 42):
+    """Create (or upgrade) the schema at `url` and fill it. Returns the engine."""
+    engine = create_engine(url)
+    migrations.run_migrations(engine)
+    with Session(engine) as db:
+        generate(db, patients, appointments_per_patient, notifications_per_appointment, seed)
+    return engine
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a SQLite database with synthetic triage data.")
+    parser.add_argument("path")
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--appointments", type=int, default=1, help="Appointments per patient.")
+    parser.add_argument("--notifications", type=int, default=0, help="Notifications per appointment.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    engine = create_database(f"sqlite:///{args.path}", args.patients, args.appointments, args.notifications, args.seed)
+    with Session(engine) as session:
+        print({"patients": session.scalar(select(func.count(models.Patient.id))),
+               "appointments": session.scalar(select(func.count(models.Appointment.id)))})
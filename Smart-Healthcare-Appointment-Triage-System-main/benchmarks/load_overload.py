@@ -0,0 +1,137 @@
+"""
+Emergency bookings under overload, with and without admission control.
+
+For each setting, starts `uvicorn main:app` on a synthetic database and measures Emergency
+/book latency twice: alone ("calm"), then while --flood clients hammer patient history,
+notification reads and routine bookings ("overload"). With admission control the
+Emergency p99 should stay close to the calm one, while the flood gets 503s.
+
+    python -m benchmarks.load_overload [--duration 10] [--flood 96]
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import baseline, datagen
+from benchmarks.load_test import free_port, start_server, wait_until_ready
+
+SETTINGS = {
+    "no admission control": {"ADMISSION_CONTROL_ENABLED": "0"},
+    "admission control": {"ADMISSION_CONTROL_ENABLED": "1"},
+}
+EMERGENCY_CLIENTS = 2
+# Pause between one emergency client's bookings: a steady trickle, not a flood of its own
+EMERGENCY_INTERVAL_SECONDS = 0.05
+FLOOD_MIX = {"history": 70, "notifications": 20, "routine_book": 10}
+_names = itertools.count()
+
+async def emergency_client(client: httpx.AsyncClient, deadline: float, latencies: list, errors: list):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/book", json={
+                "patient": {"name": f"Emergency {next(_names)}", "age": 70, "contact": "555-0000000"},
+                "symptoms": "Severe chest pain radiating to left arm",
+            })
+            ok = response.status_code == 201
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+        await asyncio.sleep(EMERGENCY_INTERVAL_SECONDS)
+
+async def flood_client(client: httpx.AsyncClient, deadline: float, rng: random.Random, outcomes: dict):
+    actions, weights = list(FLOOD_MIX), list(FLOOD_MIX.values())
+    while time.monotonic() < deadline:
+        action = rng.choices(actions, weights)[0]
+        try:
+            if action == "history":
+                response = await client.get("/patients", params={"skip": rng.randint(0, 5000), "limit": 100})
+            elif action == "notifications":
+                response = await client.get("/notifications", params={"limit": 100})
+            else:
+                response = await client.post("/book", json={
+                    "patient": {"name": f"Routine {next(_names)}", "age": 30, "contact": "555-0000000"},
+                    "symptoms": "Routine checkup",
+                })
+            status = response.status_code
+        except httpx.HTTPError:
+            status = "error"
+        outcomes[status] = outcomes.get(status, 0) + 1
+        if status == 503:
+            # Honour Retry-After loosely, as a well-behaved client would
+            await asyncio.sleep(0.2)
+
+async def run_emergency(url: str, duration: float) -> tuple:
+    latencies, errors = [], []
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        await wait_until_ready(client)
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(emergency_client(client, deadline, latencies, errors) for _ in range(EMERGENCY_CLIENTS)))
+    return latencies, errors
+
+async def run_flood(url: str, duration: float, flood: int, results):
+    outcomes = {}
+    limits = httpx.Limits(max_connections=flood)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        await wait_until_ready(client)
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(flood_client(client, deadline, random.Random(i), outcomes) for i in range(flood)))
+    results.put(outcomes)
+
+def flood_process(url: str, duration: float, flood: int, results):
+    asyncio.run(run_flood(url, duration, flood, results))
+
+def run_phase(url: str, duration: float, flood: int) -> dict:
+    """Emergency bookings measured in this process; the flood runs in its own, so parsing
+    its large responses doesn't delay the emergency clients' event loop."""
+    results = multiprocessing.Queue()
+    flooder = None
+    if flood:
+        flooder = multiprocessing.Process(target=flood_process, args=(url, duration, flood, results))
+        flooder.start()
+        # Let the flood build up before measuring
+        time.sleep(1.0)
+    latencies, errors = asyncio.run(run_emergency(url, duration - 1.0 if flood else duration))
+    outcomes = {}
+    if flooder is not None:
+        outcomes = results.get()
+        flooder.join()
+    return {**baseline.summarize_ms(latencies), "emergency_errors": len(errors), "flood": outcomes}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emergency booking latency under overload.")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--flood", type=int, default=96)
+    parser.add_argument("--patients", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    print(f"{'setting':>20} | {'phase':>8} | {'emergency p50 (ms)':>18} | {'p99 (ms)':>8} | {'errors':>6} | flood responses")
+    for name, env in SETTINGS.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            database_path = os.path.join(tmp, "overload.db")
+            datagen.create_database(f"sqlite:///{database_path}", args.patients, appointments_per_patient=3,
+                                    notifications_per_appointment=1).dispose()
+            port = free_port()
+            server = start_server(database_path, port, env)
+            try:
+                url = f"http://127.0.0.1:{port}"
+                for phase, flood in (("calm", 0), ("overload", args.flood)):
+                    result = run_phase(url, args.duration, flood)
+                    print(f"{name:>20} | {phase:>8} | {result['p50_ms']:>18.1f} | {result['p99_ms']:>8.1f} | "
+                          f"{result['emergency_errors']:>6} | {result['flood']}")
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Mixed-traffic load test against a local uvicorn server.
+
+Starts `uvicorn main:app` on a synthetic database (or targets --url), then runs --clients
+concurrent asyncio clients for --duration seconds. Each client picks an action by weight:
+
+    book     POST /book with random symptoms
+    poll     GET /appointments, as the dashboard does
+    cancel   DELETE /appointment/{id} for an appointment this client booked earlier
+
+Reports p50/p95/p99 latency and throughput per action and compares them with the "load"
+section of benchmarks/baseline.json (exit status 1 on regression).
+
+    python -m benchmarks.load_test [--clients 32] [--duration 20] [--patients 20000] [--save-baseline]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import baseline, datagen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEIGHTS = {"book": 20, "poll": 70, "cancel": 10}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(database_path: str, port: int, extra_env: dict = None) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}", ARCHIVE_INTERVAL_SECONDS="0", **(extra_env or {}))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/stats/queue")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+async def client_loop(client: httpx.AsyncClient, deadline: float, rng: random.Random, latencies: dict, errors: dict):
+    booked = []
+    actions, weights = list(WEIGHTS), list(WEIGHTS.values())
+    while time.monotonic() < deadline:
+        action = rng.choices(actions, weights)[0]
+        if action == "cancel" and not booked:
+            action = "poll"
+        start = time.perf_counter()
+        try:
+            if action == "book":
+                response = await client.post("/book", json={
+                    "patient": {"name": f"Load Patient {rng.randint(1, 5000)}", "age": rng.randint(1, 95), "contact": "555-0000000"},
+                    "symptoms": rng.choice(datagen.SYMPTOMS),
+                })
+                if response.status_code == 201:
+                    booked.append(response.json()["id"])
+            elif action == "poll":
+                response = await client.get("/appointments")
+            else:
+                response = await client.delete(f"/appointment/{booked.pop(rng.randrange(len(booked)))}")
+            # 409 on book: that patient already has a queued appointment, which is expected here
+            ok = response.status_code < 400 or (action == "book" and response.status_code == 409)
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            latencies[action].append(elapsed)
+        else:
+            errors[action] += 1
+
+async def run_load(url: str, clients: int, duration: float, seed: int) -> tuple:
+    latencies = {action: [] for action in WEIGHTS}
+    errors = {action: 0 for action in WEIGHTS}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        await wait_until_ready(client)
+        start = time.monotonic()
+        deadline = start + duration
+        await asyncio.gather(*(
+            client_loop(client, deadline, random.Random(seed + i), latencies, errors) for i in range(clients)
+        ))
+        elapsed = time.monotonic() - start
+
+    results = {}
+    for action, samples in latencies.items():
+        results[action] = {**baseline.summarize_ms(samples), "rps": round(len(samples) / elapsed, 1)}
+    all_samples = [s for samples in latencies.values() for s in samples]
+    results["total"] = {**baseline.summarize_ms(all_samples), "rps": round(len(all_samples) / elapsed, 1)}
+    return results, errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mixed-traffic load test against a local uvicorn server.")
+    parser.add_argument("--url", help="Target an already running server instead of starting one.")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=baseline.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        url = args.url
+        if url is None:
+            database_path = os.path.join(tmp, "load.db")
+            datagen.create_database(f"sqlite:///{database_path}", args.patients).dispose()
+            port = free_port()
+            server = start_server(database_path, port)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            results, errors = asyncio.run(run_load(url, args.clients, args.duration, args.seed))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+    print(f"load test: {args.clients} clients, {args.duration:.0f}s, mix {WEIGHTS}, errors {errors}")
+    regressions = baseline.compare("load", results, args.tolerance)
+    if args.save_baseline:
+        baseline.save("load", results)
+        print(f"Saved baseline to {baseline.BASELINE_PATH}")
+        return 0
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    return 1 if regressions or any(errors.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
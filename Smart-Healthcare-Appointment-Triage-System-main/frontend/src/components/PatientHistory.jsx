@@ -2,30 +2,56 @@ import React, { useState, useEffect } from 'react';
 import { History, Search, Calendar, Activity, CheckCircle, Clock } from 'lucide-react';
 import api from '../api';
 
+const TRIAGE_LEVELS = { 1: 'Emergency', 2: 'Urgent', 3: 'Routine' };
+
+const triageBadge = (level) => (
+    level === 'Emergency' ? 'bg-red-100 text-red-700' :
+        level === 'Urgent' ? 'bg-amber-100 text-amber-700' : 'bg-emerald-100 text-emerald-700'
+);
+
 const PatientHistory = () => {
     const [patients, setPatients] = useState([]);
-    const [loading, setLoading] = useState(true);
+    const [histories, setHistories] = useState({});
+    const [openPatients, setOpenPatients] = useState({});
+    const [loading, setLoading] = useState(false);
     const [searchTerm, setSearchTerm] = useState('');
 
+    // Search on the server (debounced) instead of downloading every patient
     useEffect(() => {
-        const fetchPatients = async () => {
+        const query = searchTerm.trim();
+        if (!query) {
+            setPatients([]);
+            return;
+        }
+
+        setLoading(true);
+        const timeout = setTimeout(async () => {
             try {
-                const response = await api.get('/patients');
+                const response = await api.get('/patients/search', { params: { q: query, limit: 20 } });
                 setPatients(response.data);
             } catch (error) {
-                console.error("Error fetching patients:", error);
+                console.error("Error searching patients:", error);
             } finally {
                 setLoading(false);
             }
-        };
+        }, 300);
+        return () => clearTimeout(timeout);
+    }, [searchTerm]);
 
-        fetchPatients();
-    }, []);
+    // Search results carry the visit summary only; a patient's history is loaded when it is opened
+    const toggleHistory = async (patientId) => {
+        const open = !openPatients[patientId];
+        setOpenPatients(prev => ({ ...prev, [patientId]: open }));
+        if (!open || histories[patientId]) return;
+        try {
+            const response = await api.get(`/patients/${patientId}`);
+            setHistories(prev => ({ ...prev, [patientId]: response.data.appointments }));
+        } catch (error) {
+            console.error("Error fetching patient history:", error);
+        }
+    };
 
-    const filteredPatients = patients.filter(p =>
-        p.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        p.contact.includes(searchTerm)
-    );
+    const filteredPatients = patients.map(p => ({ ...p, appointments: histories[p.id] }));
 
     return (
         <div className="bg-white rounded-3xl shadow-sm border border-slate-200 overflow-hidden">
@@ -50,7 +76,9 @@ const PatientHistory = () => {
             </div>
 
             <div className="p-0 overflow-x-auto">
-                {loading ? (
+                {!searchTerm.trim() ? (
+                    <div className="p-12 text-center text-slate-400 font-medium">Search by name, contact number or symptoms.</div>
+                ) : loading ? (
                     <div className="p-12 text-center text-slate-400 font-medium">Loading records...</div>
                 ) : filteredPatients.length === 0 ? (
                     <div className="p-12 text-center text-slate-400 font-medium">No patients found.</div>
@@ -59,7 +87,7 @@ const PatientHistory = () => {
                         <thead>
                             <tr className="bg-slate-50/50 border-b border-slate-100 text-xs uppercase tracking-wider text-slate-500 font-bold">
                                 <th className="px-8 py-4">Patient Info</th>
-                                <th className="px-8 py-4">Current/Last Condition</th>
+                                <th className="px-8 py-4">Visits</th>
                                 <th className="px-8 py-4">Appointment History</th>
                             </tr>
                         </thead>
@@ -75,11 +103,24 @@ const PatientHistory = () => {
                                         </div>
                                     </td>
                                     <td className="px-8 py-5 align-top">
-                                        {patient.appointments && patient.appointments.length > 0 ? (
-                                            <div>
-                                                <div className="text-sm font-medium text-slate-700 bg-slate-100 px-3 py-1.5 rounded-lg inline-block break-words max-w-xs cursor-default">
-                                                    {patient.appointments[patient.appointments.length - 1].symptoms}
+                                        {patient.visit_count > 0 ? (
+                                            <div className="text-sm text-slate-600 space-y-1">
+                                                <div className="flex items-center">
+                                                    <Activity size={14} className="mr-1.5 text-slate-400" />
+                                                    {patient.visit_count} {patient.visit_count === 1 ? 'visit' : 'visits'}
+                                                    {patient.open_appointments > 0 && <span className="ml-1 text-blue-600">• {patient.open_appointments} open</span>}
                                                 </div>
+                                                {patient.last_visit_at && (
+                                                    <div className="flex items-center text-xs text-slate-500">
+                                                        <Calendar size={12} className="mr-1.5" />
+                                                        Last: {new Date(patient.last_visit_at).toLocaleDateString('en-GB')}
+                                                    </div>
+                                                )}
+                                                {TRIAGE_LEVELS[patient.highest_priority] && (
+                                                    <span className={`text-[10px] uppercase tracking-wider font-bold px-2 py-0.5 rounded-md ${triageBadge(TRIAGE_LEVELS[patient.highest_priority])}`}>
+                                                        Highest: {TRIAGE_LEVELS[patient.highest_priority]}
+                                                    </span>
+                                                )}
                                             </div>
                                         ) : (
                                             <span className="text-sm text-slate-400">No records</span>
@@ -87,7 +128,19 @@ const PatientHistory = () => {
                                     </td>
                                     <td className="px-8 py-5">
                                         <div className="space-y-3">
-                                            {patient.appointments && patient.appointments.length > 0 ? (
+                                            {patient.visit_count > 0 ? (
+                                                <button
+                                                    onClick={() => toggleHistory(patient.id)}
+                                                    className="text-xs font-bold text-blue-600 hover:text-blue-700"
+                                                >
+                                                    {openPatients[patient.id] ? 'Hide history' : 'Show history'}
+                                                </button>
+                                            ) : (
+                                                <span className="text-sm text-slate-400">No appointments</span>
+                                            )}
+                                            {!openPatients[patient.id] ? null : !patient.appointments ? (
+                                                <div className="text-sm text-slate-400">Loading history...</div>
+                                            ) : patient.appointments.length > 0 ? (
                                                 patient.appointments.map(apt => (
                                                     <div key={apt.id} className="flex items-start bg-white border border-slate-100 rounded-xl p-3 shadow-sm">
                                                         <div className="flex-1 min-w-0">
@@ -96,9 +149,7 @@ const PatientHistory = () => {
                                                                     <Calendar size={12} className="mr-1" />
                                                                     {new Date(apt.created_at).toLocaleDateString('en-GB')}
                                                                 </span>
-                                                                <span className={`text-[10px] uppercase tracking-wider font-bold px-2 py-0.5 rounded-md ${apt.triage_level === 'Emergency' ? 'bg-red-100 text-red-700' :
-                                                                        apt.triage_level === 'Urgent' ? 'bg-amber-100 text-amber-700' : 'bg-emerald-100 text-emerald-700'
-                                                                    }`}>
+                                                                <span className={`text-[10px] uppercase tracking-wider font-bold px-2 py-0.5 rounded-md ${triageBadge(apt.triage_level)}`}>
                                                                     {apt.triage_level}
                                                                 </span>
                                                             </div>
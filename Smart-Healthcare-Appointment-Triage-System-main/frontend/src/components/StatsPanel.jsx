@@ -1,27 +1,33 @@
-import React, { useMemo } from 'react';
+import React, { useState, useEffect } from 'react';
 import { Users, AlertOctagon, ActivitySquare } from 'lucide-react';
 import StatsCard from './StatsCard';
+import api from '../api';
 
-const StatsPanel = ({ appointments }) => {
-    // Calculate statistics over the appointments array
-    const stats = useMemo(() => {
-        let emergency = 0;
-        let normal = 0;
-        let urgent = 0;
+const StatsPanel = () => {
+    const [stats, setStats] = useState({ total: 0, emergency: 0, normal: 0 });
 
-        appointments.forEach(appt => {
-            const level = appt.triage_level.toLowerCase();
-            if (level === 'emergency') emergency++;
-            else if (level === 'urgent') urgent++;
-            else normal++;
-        });
+    // Counts come precomputed from the server and cover the whole queue,
+    // not just the page of appointments the dashboard has loaded
+    const fetchStats = async () => {
+        try {
+            const response = await api.get('/stats/queue');
+            const byLevel = response.data.by_triage_level;
+            const emergency = byLevel.Emergency || 0;
+            setStats({
+                total: response.data.total_queued,
+                emergency,
+                normal: response.data.total_queued - emergency // Grouping non-emergencies as normal for the main stat
+            });
+        } catch (error) {
+            console.error("Error fetching queue stats:", error);
+        }
+    };
 
-        return {
-            total: appointments.length,
-            emergency,
-            normal: normal + urgent // Grouping non-emergencies as normal for the main stat, or can show separately
-        };
-    }, [appointments]);
+    useEffect(() => {
+        fetchStats();
+        const interval = setInterval(fetchStats, 3000);
+        return () => clearInterval(interval);
+    }, []);
 
     return (
         <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
@@ -71,7 +71,7 @@ const Dashboard = () => {
                 return (
                     <div className="space-y-8">
                         {/* Stats Panel */}
-                        <StatsPanel appointments={appointments} />
+                        <StatsPanel />
 
                         {/* Dashboard Grid */}
                         <div className="grid grid-cols-1 xl:grid-cols-12 gap-8 items-start">
@@ -96,7 +96,7 @@ const Dashboard = () => {
             case 'queue':
                 return (
                     <div className="space-y-8 max-w-5xl mx-auto">
-                        <StatsPanel appointments={appointments} />
+                        <StatsPanel />
                         <QueueDashboard appointments={appointments} loading={loading} onDischarge={handleDischarge} />
                     </div>
                 );
@@ -1,20 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
+from pydantic import TypeAdapter
+from contextlib import asynccontextmanager
+import asyncio
+import datetime
+import threading
 
-from backend import models, schemas, crud
+from backend import models, schemas, crud, config, triage_ml, migrations, archive, jobs, export, responses, metrics, events, group_commit, idempotency, analytics, forecast
+from backend.admission import AdmissionControlMiddleware
+from backend.compression import CompressionMiddleware
+from backend.stats import queue_stats
+from backend.queue_index import queue_index, aging_period
 from backend.database import SessionLocal, engine, get_db
 
-# Create database tables upon startup
-models.Base.metadata.create_all(bind=engine)
-
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+def warm_caches():
+    """
+    Fill in-memory caches so the first real requests don't pay for them.
+    Runs in a background thread; failures only cost a slower first request.
+    """
+    try:
+        if triage_ml.is_model_configured():
+            triage_ml.load_model()
+        db = SessionLocal()
+        try:
+            queue_stats.reconcile(db)
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"Cache warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create/upgrade database tables on startup rather than at import time,
+    # so importing this module never touches the database.
+    migrations.run_migrations(engine)
+    if config.WARM_CACHES_ON_STARTUP:
+        threading.Thread(target=warm_caches, name="cache-warmup", daemon=True).start()
+    jobs.start_periodic_job(archive.run_archive_jobs, config.ARCHIVE_INTERVAL_SECONDS)
+    events.start(engine)
+    yield
+    group_commit.stop_all()
+    events.stop()
+    jobs.stop_all()
+
 app = FastAPI(
     title="Smart Healthcare Appointment & Triage System",
     description="A clean, modular, beginner-friendly REST API for patient triage and queue management using FastAPI and SQLite.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -24,6 +61,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MINIMUM_SIZE)
+if config.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+# Added last so it wraps everything else and times the full request
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Serializes ORM appointments straight to JSON bytes through pydantic-core
+APPOINTMENT_LIST = TypeAdapter(List[schemas.AppointmentResponse])
 
 @app.get("/", include_in_schema=False)
 def docs_redirect():
@@ -37,37 +82,169 @@ def triage_patient(request: schemas.TriageRequest):
     level = crud.evaluate_triage_level(request.symptoms)
     return schemas.TriageResponse(triage_level=level)
 
+def book(db: Session, request: schemas.BookRequest, triage_level: Optional[str] = None) -> models.Appointment:
+    triage_level = triage_level or crud.evaluate_triage_level(request.symptoms)
+    try:
+        if config.GROUP_COMMIT_ENABLED:
+            # Committed together with other concurrent bookings; returns once this one is durable
+            return group_commit.writer_for(db.get_bind()).submit(request, triage_level)
+        db_appointment = crud.book_appointment(db, request, triage_level)
+    except crud.DuplicateBookingError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    events.appointment_created(db, db_appointment)
+    db.commit()
+    db.refresh(db_appointment)
+    return db_appointment
+
 @app.post("/book", response_model=schemas.AppointmentResponse, status_code=status.HTTP_201_CREATED)
-def book_appointment(request: schemas.BookRequest, db: Session = Depends(get_db)):
+def book_appointment(request: schemas.BookRequest, http_request: Request, db: Session = Depends(get_db),
+                     idempotency_key: Optional[str] = Header(None, max_length=255)):
     """
     Book an appointment. Creates the patient if they don't already exist,
     determines the triage priority based on the symptoms, and places them in the queue.
+    A patient who already has a recent queued appointment gets 409 instead.
+
+    Clients that retry on timeouts should send an Idempotency-Key header: a retry with
+    the same key returns the original response instead of booking again.
     """
-    # 1. Check or create the patient
-    db_patient = crud.get_patient_by_details(db, name=request.patient.name, age=request.patient.age)
-    if not db_patient:
-        db_patient = crud.create_patient(db, patient=request.patient)
-        
-    # 2. Assign a triage level based on symptoms
-    triage_level = crud.evaluate_triage_level(request.symptoms)
-    
-    # 3. Create the appointment record
-    appointment_data = schemas.AppointmentCreate(
-        patient_id=db_patient.id,
-        symptoms=request.symptoms,
-        triage_level=triage_level
-    )
-    db_appointment = crud.create_appointment(db, appointment=appointment_data)
+    # Already triaged by the admission control middleware, when enabled
+    triage_level = getattr(http_request.state, "triage_level", None)
+    if idempotency_key is None:
+        return book(db, request, triage_level)
+
+    store = idempotency.store_for(db.get_bind())
+    request_fingerprint = idempotency.fingerprint("/book", request.model_dump_json())
+    stored = store.begin(idempotency_key, request_fingerprint)
+    if stored is not None:
+        stored_fingerprint, status_code, body = stored
+        if stored_fingerprint != request_fingerprint:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                                detail="Idempotency-Key was already used for a different request")
+        if status_code is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="A request with this Idempotency-Key is still in progress")
+        return Response(body, status_code=status_code, media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+
+    try:
+        db_appointment = book(db, request, triage_level)
+    except Exception:
+        # Let the client retry with the same key
+        store.release(idempotency_key)
+        raise
+    body = schemas.AppointmentResponse.model_validate(db_appointment).model_dump_json().encode()
+    store.complete(idempotency_key, status.HTTP_201_CREATED, body)
+    return Response(body, status_code=status.HTTP_201_CREATED, media_type="application/json")
+
+def queue_response(db: Session, view: str, fields: Optional[str], skip: int, limit: int, department: Optional[str] = None) -> Response:
+    """Serialized queue page (full or compact view), shared by /appointments and the per-department queues."""
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = set(field_list or []) - crud.QUEUE_FIELDS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(crud.QUEUE_FIELDS)}",
+        )
+
+    # Dashboards poll these endpoints; reuse the serialized body until the queue changes.
+    # Waiting patients age even while nothing changes, so bodies are also only reused
+    # within one aging period (a minute)
+    cache = responses.queue_response_cache
+    cache_key = (department, view, tuple(field_list or ()), skip, limit, aging_period())
+    body = cache.get(cache_key)
+    if body is None:
+        version = cache.version
+        if view == "compact" or field_list:
+            rows = crud.get_appointments_compact(db, fields=field_list, skip=skip, limit=limit, department=department)
+            with metrics.timed(metrics.serialization_duration, "/appointments"):
+                body = responses.dumps(rows)
+        else:
+            appointments = crud.get_appointments(db, skip=skip, limit=limit, department=department)
+            with metrics.timed(metrics.serialization_duration, "/appointments"):
+                body = APPOINTMENT_LIST.dump_json(APPOINTMENT_LIST.validate_python(appointments, from_attributes=True))
+        cache.put(cache_key, body, version)
+    # Returned as raw bytes, skipping response_model re-validation
+    return Response(content=body, media_type="application/json")
+
+# The queue endpoints return pre-serialized bodies (queue_response), so their OpenAPI
+# schema is declared here: full appointments, or compact rows with view=compact / fields=
+QUEUE_RESPONSES = {
+    200: {
+        "description": "Queued appointments in queue order: full appointments, or compact rows with `view=compact` or `fields=`.",
+        "content": {"application/json": {"schema": {"anyOf": [
+            {"type": "array", "title": "Full view", "items": {"$ref": "#/components/schemas/AppointmentResponse"}},
+            {"type": "array", "title": "Compact view", "items": schemas.QueueRow.model_json_schema()},
+        ]}}},
+    },
+}
+
+def check_department(department: str):
+    if department not in crud.DEPARTMENTS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown department. Known: {', '.join(crud.DEPARTMENTS)}")
+
+@app.get("/appointments", response_class=Response, responses=QUEUE_RESPONSES)
+def get_queued_appointments(
+    skip: int = 0,
+    limit: int = 100,
+    view: Literal["full", "compact"] = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Retrieve all queued appointments, highest effective score first. The score starts from
+    the triage level (Emergency 300, Urgent 200, Routine 100) and grows with every minute of
+    waiting (AGING_RATE_URGENT / AGING_RATE_ROUTINE), capped below Emergency, so long waits
+    move up without ever passing an Emergency. Ties go to the earlier booking.
+    Responses are cached until the queue changes, and never past the current minute, as
+    patients keep aging.
+
+    `view=compact` returns flat rows (id, triage_level, created_at, patient_name, patient_age);
+    `fields=` picks a comma-separated subset of crud.QUEUE_FIELDS instead.
+    """
+    return queue_response(db, view, fields, skip, limit)
+
+# ============ DEPARTMENT QUEUES ============
+
+@app.get("/queues", response_model=List[schemas.QueueSummary])
+def list_queues(db: Session = Depends(get_db)):
+    """Every department queue with the number of appointments waiting in it."""
+    counts = queue_index.counts(db)
+    return [{"department": d, "queued": counts.get(d, 0)} for d in crud.DEPARTMENTS]
+
+@app.get("/queues/{department}/appointments", response_class=Response, responses=QUEUE_RESPONSES)
+def get_department_queue(
+    department: str,
+    skip: int = 0,
+    limit: int = 100,
+    view: Literal["full", "compact"] = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """One department's queue, in the same order and views as /appointments."""
+    check_department(department)
+    return queue_response(db, view, fields, skip, limit, department=department)
+
+@app.post("/queues/{department}/next", response_model=schemas.AppointmentResponse)
+def call_next_department_patient(department: str, db: Session = Depends(get_db)):
+    """Claim the top of one department's queue, like POST /queue/next."""
+    check_department(department)
+    db_appointment = crud.claim_next_appointment(db, department=department)
+    if not db_appointment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No queued appointments")
     return db_appointment
 
-@app.get("/appointments", response_model=List[schemas.AppointmentResponse])
-def get_queued_appointments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Request latency, SQL and triage timings in Prometheus text format."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats/queue", response_model=schemas.QueueStatsResponse)
+def get_queue_stats(db: Session = Depends(get_db)):
     """
-    Retrieve all queued appointments. Automatically prioritizes Emergency cases over others,
-    then by the time the appointment was booked.
+    Queue counts by triage level and status, plus oldest and average wait times.
+    Served from counters kept up to date on every booking and discharge.
     """
-    appointments = crud.get_appointments(db, skip=skip, limit=limit)
-    return appointments
+    return queue_stats.snapshot(db)
 
 @app.get("/patients", response_model=List[schemas.PatientWithHistory])
 def get_patients_list(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -77,15 +254,41 @@ def get_patients_list(skip: int = 0, limit: int = 100, db: Session = Depends(get
     patients = crud.get_all_patients(db, skip=skip, limit=limit)
     return patients
 
-@app.get("/patients/{id}", response_model=schemas.PatientWithHistory)
-def get_patient(id: int, db: Session = Depends(get_db)):
+@app.get("/patients/search", response_model=List[schemas.PatientProfile])
+def search_patients(q: str = Query(..., min_length=1), skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
+    """
+    Search patients by name, contact number or symptoms.
+    Returns patient records with their visit summary, without appointment history
+    (GET /patients/{id} has it).
+    """
+    return crud.search_patients(db, query=q, skip=skip, limit=limit)
+
+@app.get("/patients/{id}", response_model=schemas.PatientDetail)
+def get_patient(
+    id: int,
+    limit: int = Query(crud.HISTORY_PAGE_SIZE, ge=1, le=100),
+    before: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
     """
-    Get detailed information about a patient by their ID.
+    Get a patient with their visit summary and the most recent appointments of their
+    history, archived ones included. Pass next_cursor back as `before` for older appointments.
     """
     db_patient = crud.get_patient(db, patient_id=id)
     if not db_patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    return db_patient
+    try:
+        cursor = crud.decode_history_cursor(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    patient = schemas.PatientResponse.model_validate(db_patient)
+    history, next_cursor = crud.get_patient_history(db, patient_id=id, limit=limit, before=cursor)
+    return schemas.PatientDetail(
+        **patient.model_dump(),
+        summary=crud.patient_summary(db_patient),
+        appointments=history,
+        next_cursor=next_cursor,
+    )
 
 @app.delete("/appointment/{id}", status_code=status.HTTP_204_NO_CONTENT)
 def cancel_appointment(id: int, db: Session = Depends(get_db)):
@@ -96,6 +299,108 @@ def cancel_appointment(id: int, db: Session = Depends(get_db)):
     if not db_appointment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
     return None
+
+@app.post("/queue/next", response_model=schemas.AppointmentResponse)
+def call_next_patient(db: Session = Depends(get_db)):
+    """
+    Claim the highest-priority queued appointment and mark it "In Progress".
+    Safe for several clinicians working the same queue: each call gets a different patient.
+    """
+    db_appointment = crud.claim_next_appointment(db)
+    if not db_appointment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No queued appointments")
+    return db_appointment
+
+# Comment line sent on idle event streams so proxies don't close them
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+
+async def queue_event_stream(queue):
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            payload = {key: value for key, value in event.items() if key != "origin"}
+            yield b"event: " + event["type"].encode() + b"\ndata: " + responses.dumps(payload) + b"\n\n"
+    finally:
+        events.subscribers.unsubscribe(queue)
+
+@app.get("/queue/events")
+async def stream_queue_events():
+    """
+    Server-sent events for every queue change (bookings, claims, discharges, bulk changes),
+    from this worker and, with EVENT_BUS=table or redis, from every other worker too.
+    """
+    queue = events.subscribers.subscribe()
+    return StreamingResponse(queue_event_stream(queue), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+# ============ SCHEDULING ENDPOINTS ============
+
+def _wall_clock(value: Optional[datetime.datetime], name: str):
+    # Slot times are clinic wall-clock times; an offset would silently shift them
+    if value is not None and value.tzinfo is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"{name} must be a clinic local time without a UTC offset")
+    return value
+
+@app.post("/providers", response_model=schemas.ProviderResponse, status_code=status.HTTP_201_CREATED)
+def create_provider(provider: schemas.ProviderCreate, db: Session = Depends(get_db)):
+    """
+    Add a provider who takes scheduled appointments: slot length, working hours and working days.
+    """
+    if provider.day_end_hour <= provider.day_start_hour:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="day_end_hour must be after day_start_hour")
+    return crud.create_provider(db, provider)
+
+@app.get("/providers", response_model=List[schemas.ProviderResponse])
+def list_providers(department: Optional[str] = None, db: Session = Depends(get_db)):
+    return crud.get_providers(db, department=department)
+
+@app.get("/slots/available", response_model=List[schemas.FreeSlot])
+def find_free_slots(
+    count: int = Query(10, ge=1, le=100),
+    after: Optional[datetime.datetime] = None,
+    department: Optional[str] = None,
+    provider_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    The earliest free slots across all providers (or one department or provider), starting
+    from now or `after`. Times are clinic local times.
+    """
+    return crud.find_free_slots(db, count, _wall_clock(after, "after"), department=department, provider_id=provider_id)
+
+@app.post("/slots", response_model=schemas.SlotResponse, status_code=status.HTTP_201_CREATED)
+def book_slot(request: schemas.SlotBookRequest, db: Session = Depends(get_db)):
+    """
+    Book a scheduled appointment with a provider. Only for Routine cases: symptoms that
+    triage as Urgent or Emergency get 422 and belong in the walk-in queue (/book), as do
+    slots in the past or beyond the scheduling horizon. A slot that was booked in the
+    meantime gets 409.
+    """
+    _wall_clock(request.start_at, "start_at")
+    provider = db.get(models.Provider, request.provider_id)
+    if provider is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found")
+    try:
+        return crud.book_slot(db, provider, request)
+    except (crud.NotRoutineError, crud.SlotOutOfRangeError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e))
+    except crud.SlotUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@app.delete("/slots/{id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_slot(id: int, db: Session = Depends(get_db)):
+    """
+    Cancel a scheduled appointment; its slot can be booked again.
+    """
+    if crud.cancel_slot(db, slot_id=id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Booking not found")
+    return None
+
 # ============ NOTIFICATION ENDPOINTS ============
 
 @app.post("/notifications/send", response_model=schemas.NotificationResponse, status_code=status.HTTP_201_CREATED)
@@ -168,9 +473,103 @@ def get_appointment_notifications(appointment_id: int, db: Session = Depends(get
     """
     Get all notifications for a specific appointment.
     """
-    appointment = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
+    appointment = (
+        db.get(models.Appointment, appointment_id)
+        or db.get(models.ArchivedAppointment, appointment_id)
+    )
     if not appointment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
     
     notifications = crud.get_notifications_by_appointment(db, appointment_id)
-    return notifications
\ No newline at end of file
+    return notifications
+
+# ============ EXPORT ENDPOINTS ============
+
+def _export_response(rows, fields: list, export_format: str, name: str):
+    return StreamingResponse(
+        export.serialize(rows, fields, export_format),
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
+    )
+
+@app.get("/export/patients")
+def export_patients(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Stream all patients as NDJSON or CSV. With date range / status filters,
+    only patients with a matching appointment are exported.
+    """
+    rows = export.patient_rows(db, since=since, until=until, status=status)
+    return _export_response(rows, export.PATIENT_FIELDS, format, "patients")
+
+@app.get("/export/appointments")
+def export_appointments(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    status: Optional[str] = None,
+    include_archived: bool = True,
+    db: Session = Depends(get_db),
+):
+    """
+    Stream appointment history (live and archived) as NDJSON or CSV,
+    optionally filtered by booking date range and status.
+    """
+    rows = export.appointment_rows(db, since=since, until=until, status=status, include_archived=include_archived)
+    return _export_response(rows, export.APPOINTMENT_FIELDS, format, "appointments")
+
+# ============ ANALYTICS ENDPOINTS ============
+
+def _read_rollups(db: Session, granularity: str, since, until, triage_level):
+    start, end = analytics.report_range(granularity, since, until)
+    if end - start > datetime.timedelta(days=config.ANALYTICS_MAX_RANGE_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range is limited to {config.ANALYTICS_MAX_RANGE_DAYS} days",
+        )
+    return analytics.read_rollups(db, start, end, triage_level)
+
+@app.get("/analytics/throughput", response_model=List[schemas.ThroughputPoint])
+def analytics_throughput(
+    granularity: Literal["hour", "day"] = "hour",
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    triage_level: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Arrivals and discharges per hour or day (UTC) and triage level. Defaults to the last
+    24 hours (hourly) or 30 days (daily). Read from the hourly rollups only.
+    """
+    return analytics.throughput(_read_rollups(db, granularity, since, until, triage_level), granularity)
+
+@app.get("/analytics/wait-times", response_model=List[schemas.WaitTimePoint])
+def analytics_wait_times(
+    granularity: Literal["hour", "day"] = "hour",
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    triage_level: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Patients seen per hour or day and triage level, with their median, 90th percentile and
+    average wait from booking. Medians and percentiles come from a wait-time histogram.
+    """
+    return analytics.wait_times(_read_rollups(db, granularity, since, until, triage_level), granularity)
+
+@app.get("/analytics/forecast", response_model=schemas.ArrivalForecast)
+def analytics_forecast(
+    hours: int = Query(6, ge=1, le=config.FORECAST_MAX_HOURS),
+    db: Session = Depends(get_db),
+):
+    """
+    Expected arrivals per triage level for the next `hours` hours (the current hour first),
+    with an 80% range. Built from hour-of-week baselines over the rollups plus the last few
+    hours' trend, and cached until the next refresh (a new hour or FORECAST_REFRESH_SECONDS).
+    """
+    return forecast.forecaster.forecast(db, hours)
@@ -1,27 +1,30 @@
-import sqlite3
+import sys
+
+from backend import migrations
+from backend.database import engine
 
 def run_migration():
     try:
-        conn = sqlite3.connect('sql_app.db')
-        cursor = conn.cursor()
-        
-        # Check if column exists
-        cursor.execute("PRAGMA table_info(patients)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'gender' not in columns:
-            print("Adding 'gender' column to 'patients' table...")
-            cursor.execute("ALTER TABLE patients ADD COLUMN gender VARCHAR DEFAULT 'Other'")
-            conn.commit()
+        applied = migrations.run_migrations(engine)
+        if applied:
+            for version, description, _ in migrations.MIGRATIONS:
+                if version in applied:
+                    print(f"Applied migration {version}: {description}")
             print("Migration successful.")
         else:
-            print("'gender' column already exists.")
-            
+            print("Database schema is up to date.")
     except Exception as e:
         print(f"Migration error: {e}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+        sys.exit(1)
+
+def show_status():
+    applied = migrations.get_applied_versions(engine)
+    for version, description, _ in migrations.MIGRATIONS:
+        state = "applied" if version in applied else "pending"
+        print(f"{version:>4}  {state:<8} {description}")
 
 if __name__ == "__main__":
-    run_migration()
+    if "--status" in sys.argv:
+        show_status()
+    else:
+        run_migration()
@@ -5,7 +5,13 @@ from sqlalchemy.orm import sessionmaker
 
 from main import app
 from backend.database import Base, get_db
-from backend import crud
+from backend import crud, config, metrics, idempotency
+from backend.forecast import forecaster
+from backend.stats import queue_stats
+from backend.responses import queue_response_cache
+from backend.queue_index import queue_index
+from backend.slot_index import slot_index
+from backend.patient_cache import patient_cache
 
 # ----------------- Test Database Setup -----------------
 # Create an in-memory SQLite database for testing, so we don't pollute the real DB.
@@ -35,6 +41,15 @@ client = TestClient(app)
 def setup_and_teardown():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # In-memory state must not leak between tests
+    queue_stats.reset()
+    queue_response_cache.invalidate()
+    queue_index.reset()
+    slot_index.reset()
+    patient_cache.clear()
+    metrics.reset()
+    idempotency.memory_store.clear()
+    forecaster.reset()
     yield
     
 # ----------------- 1. Test Triage Logic -----------------
@@ -158,3 +173,1519 @@ def test_delete_appointment():
     # Verify queue is empty
     queue_response = client.get("/appointments")
     assert len(queue_response.json()) == 0
+
+# ----------------- 5. Test Startup -----------------
+
+STARTUP_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+db_touched_on_import = os.path.exists(sys.argv[1])
+from fastapi.testclient import TestClient
+with TestClient(main.app) as c:
+    response = c.post("/triage", json={"symptoms": "mild headache"})
+first_response = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "first_response_seconds": first_response - start,
+    "status_code": response.status_code,
+    "db_touched_on_import": db_touched_on_import,
+    "db_created_on_startup": os.path.exists(sys.argv[1]),
+    "heavy_modules": [m for m in ("joblib", "sklearn") if m in sys.modules],
+}))
+"""
+
+def test_startup_time(tmp_path):
+    """Benchmark import-to-first-response of a fresh API process."""
+    import json
+    import os
+    import subprocess
+    import sys
+
+    db_file = tmp_path / "startup.db"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_file}", WARM_CACHES_ON_STARTUP="0")
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, str(db_file)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"\nimport: {timings['import_seconds'] * 1000:.0f} ms, "
+          f"first response: {timings['first_response_seconds'] * 1000:.0f} ms")
+
+    assert timings["status_code"] == 200
+    # Importing the app must not create or touch the database; startup does.
+    assert timings["db_touched_on_import"] is False
+    assert timings["db_created_on_startup"] is True
+    # ML dependencies stay unloaded when no model is configured.
+    assert timings["heavy_modules"] == []
+    assert timings["first_response_seconds"] < 10
+
+# ----------------- 6. Test Schema Migrations -----------------
+
+def test_migrations_upgrade_legacy_database(tmp_path, monkeypatch):
+    """An old database without gender/priority is upgraded in order and only once."""
+    from sqlalchemy import inspect, text
+    from backend import migrations
+
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE patients (id INTEGER PRIMARY KEY, name VARCHAR, age INTEGER, contact VARCHAR)"))
+        conn.execute(text(
+            "CREATE TABLE appointments (id INTEGER PRIMARY KEY, patient_id INTEGER, symptoms VARCHAR, "
+            "triage_level VARCHAR, status VARCHAR, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO patients (id, name, age, contact) VALUES (1, 'Old Patient', 70, '555')"))
+        for i, (level, symptoms) in enumerate([("Routine", "Itchy rash"), ("Emergency", "x"), ("Urgent", "Bad cough")], start=1):
+            conn.execute(text(
+                "INSERT INTO appointments (id, patient_id, symptoms, triage_level, status, created_at) "
+                "VALUES (:id, 1, :symptoms, :level, 'Queued', '2024-01-01 10:00:00')"
+            ), {"id": i, "level": level, "symptoms": symptoms})
+
+    # Force the backfill to run over several batches
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 1)
+    applied = migrations.run_migrations(legacy_engine)
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+
+    assert migrations.has_column(legacy_engine, "patients", "gender")
+    index_names = {ix["name"] for ix in inspect(legacy_engine).get_indexes("appointments")}
+    assert "ix_appointments_queue" in index_names
+    with legacy_engine.connect() as conn:
+        priorities = dict(conn.execute(text("SELECT triage_level, priority FROM appointments")).all())
+        departments = dict(conn.execute(text("SELECT triage_level, department FROM appointments")).all())
+    assert priorities == {"Emergency": 1, "Urgent": 2, "Routine": 3}
+    assert departments == {"Emergency": "Emergency", "Urgent": "Respiratory", "Routine": "Dermatology"}
+    # Appointments, notifications and queue_events were rebuilt with AUTOINCREMENT, keeping their rows, indexes and trigger
+    with legacy_engine.connect() as conn:
+        schema = dict(conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE tbl_name IN ('appointments', 'notifications', 'queue_events')"
+        )).all())
+        assert conn.execute(text("SELECT COUNT(*) FROM appointments")).scalar() == 3
+    assert all("AUTOINCREMENT" in schema[table] for table in ("appointments", "notifications", "queue_events"))
+    assert "appointments_search_insert" in schema and "ix_appointments_queue" in schema and "ix_notifications_status" in schema
+
+    # Running again is a no-op
+    assert migrations.run_migrations(legacy_engine) == []
+    assert migrations.get_applied_versions(legacy_engine) == set(applied)
+
+def test_migrations_on_fresh_database(tmp_path):
+    """A fresh database gets the full current schema from the runner."""
+    from backend import migrations
+
+    fresh_engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrations.run_migrations(fresh_engine)
+    assert migrations.has_column(fresh_engine, "appointments", "priority")
+    assert migrations.has_column(fresh_engine, "notifications", "sent_at")
+
+# ----------------- 7. Test Archival -----------------
+
+def test_archive_moves_old_completed_appointments():
+    """Old completed appointments and their sent notifications move to the archive but stay in history."""
+    import datetime
+    from backend import archive, models
+
+    old = client.post("/book", json={"patient": {"name": "Archive Test", "age": 40, "contact": "444"}, "symptoms": "checkup"}).json()
+    client.post(f"/notifications/send-confirmation/{old['id']}")
+    client.delete(f"/appointment/{old['id']}")
+    recent = client.post("/book", json={"patient": {"name": "Archive Test", "age": 40, "contact": "444"}, "symptoms": "High fever"}).json()
+
+    db = TestingSessionLocal()
+    try:
+        db.query(models.Appointment).filter(models.Appointment.id == old["id"]).update(
+            {"created_at": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=60)}
+        )
+        db.commit()
+
+        assert archive.archive_finished_appointments(db, older_than_days=30, batch_size=1) == 1
+        assert db.query(models.Appointment).count() == 1
+        assert db.query(models.ArchivedAppointment).count() == 1
+        assert db.query(models.Notification).count() == 0
+        assert db.query(models.ArchivedNotification).count() == 1
+        # Nothing left to archive
+        assert archive.archive_finished_appointments(db, older_than_days=30) == 0
+    finally:
+        db.close()
+
+    # The queue only sees the live appointment, history sees both
+    assert [a["id"] for a in client.get("/appointments").json()] == [recent["id"]]
+    history = client.get(f"/patients/{old['patient_id']}").json()["appointments"]
+    assert [a["id"] for a in history] == [recent["id"], old["id"]]
+    assert history[1]["status"] == "Completed"
+
+def test_archive_never_reuses_archived_ids():
+    """An archived appointment's id is not handed to the next booking, so archiving again works."""
+    import datetime
+    from backend import archive, models
+
+    def book_and_archive():
+        booked = client.post("/book", json={"patient": {"name": "Archive Again", "age": 50, "contact": "445"}, "symptoms": "checkup"}).json()
+        client.delete(f"/appointment/{booked['id']}")
+        db = TestingSessionLocal()
+        try:
+            db.query(models.Appointment).filter(models.Appointment.id == booked["id"]).update(
+                {"created_at": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=60)}
+            )
+            db.commit()
+            assert archive.archive_finished_appointments(db, older_than_days=30) == 1
+        finally:
+            db.close()
+        return booked["id"]
+
+    first = book_and_archive()
+    second = book_and_archive()
+    assert second > first
+    db = TestingSessionLocal()
+    try:
+        assert sorted(a.id for a in db.query(models.ArchivedAppointment)) == [first, second]
+    finally:
+        db.close()
+
+# ----------------- 8. Test Export -----------------
+
+def test_export_appointments_ndjson_and_csv():
+    """Exports stream every matching row in the requested format."""
+    import json
+
+    client.post("/book", json={"patient": {"name": "Export One", "age": 30, "contact": "1"}, "symptoms": "High fever"})
+    second = client.post("/book", json={"patient": {"name": "Export Two", "age": 31, "contact": "2"}, "symptoms": "checkup"}).json()
+    client.delete(f"/appointment/{second['id']}")
+
+    response = client.get("/export/appointments")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["patient_name"] for r in rows] == ["Export One", "Export Two"]
+
+    completed = client.get("/export/appointments", params={"status": "Completed", "format": "csv"})
+    assert completed.headers["content-type"].startswith("text/csv")
+    lines = completed.text.strip().splitlines()
+    assert lines[0] == "id,patient_id,patient_name,symptoms,triage_level,status,created_at"
+    assert len(lines) == 2 and "Export Two" in lines[1]
+
+    assert client.get("/export/appointments", params={"since": "2999-01-01T00:00:00"}).text == ""
+
+def test_export_patients_filtered_by_status():
+    import json
+
+    client.post("/book", json={"patient": {"name": "Queued Patient", "age": 50, "contact": "3"}, "symptoms": "checkup"})
+    done = client.post("/book", json={"patient": {"name": "Done Patient", "age": 51, "contact": "4"}, "symptoms": "checkup"}).json()
+    client.delete(f"/appointment/{done['id']}")
+
+    all_names = [json.loads(line)["name"] for line in client.get("/export/patients").text.splitlines()]
+    assert all_names == ["Queued Patient", "Done Patient"]
+    completed = [json.loads(line)["name"] for line in client.get("/export/patients", params={"status": "Completed"}).text.splitlines()]
+    assert completed == ["Done Patient"]
+
+# ----------------- 9. Test Bulk Import -----------------
+
+def test_bulk_import_dedupes_and_triages(tmp_path):
+    """Records are triaged, patients deduped (including existing ones) and everything is inserted."""
+    import json
+    from backend import bulk_import, models
+
+    client.post("/book", json={"patient": {"name": "Existing", "age": 40, "contact": "1"}, "symptoms": "checkup"})
+    records = [
+        {"name": "Existing", "age": 40, "contact": "1", "symptoms": "heavy bleeding"},
+        {"name": "New Patient", "age": 22, "contact": "2", "symptoms": "High fever", "created_at": "2023-05-01T09:30:00"},
+        {"name": "New Patient", "age": 22, "contact": "2", "symptoms": "checkup", "status": "Queued"},
+    ]
+    path = tmp_path / "records.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in records))
+
+    db = TestingSessionLocal()
+    try:
+        result = bulk_import.import_file(db, str(path), batch_size=2)
+        assert result == {"records_skipped": 0, "records_imported": 3, "patients_created": 1, "appointments_created": 3}
+        assert db.query(models.Patient).count() == 2
+        levels = [a.triage_level for a in db.query(models.Appointment).order_by(models.Appointment.id)]
+        assert levels == ["Routine", "Emergency", "Urgent", "Routine"]
+        # Re-running a finished import is a no-op
+        assert bulk_import.import_file(db, str(path))["records_imported"] == 0
+    finally:
+        db.close()
+
+def test_bulk_import_resumes_from_checkpoint(tmp_path):
+    """A failing batch rolls back; the next run resumes after the last committed batch."""
+    from backend import bulk_import, models
+
+    path = tmp_path / "records.csv"
+    header = "name,age,contact,symptoms\n"
+    good = ["A,1,1,checkup", "B,2,2,checkup", "C,3,3,checkup"]
+    path.write_text(header + "\n".join(good + ["D,not-a-number,4,checkup"]) + "\n")
+
+    db = TestingSessionLocal()
+    try:
+        with pytest.raises(Exception):
+            bulk_import.import_file(db, str(path), batch_size=2)
+        assert bulk_import.get_checkpoint(db, str(path)) == 2
+        assert db.query(models.Appointment).count() == 2
+
+        path.write_text(header + "\n".join(good + ["D,4,4,checkup"]) + "\n")
+        result = bulk_import.import_file(db, str(path), batch_size=2)
+        assert result["records_skipped"] == 2 and result["records_imported"] == 2
+        assert sorted(p.name for p in db.query(models.Patient)) == ["A", "B", "C", "D"]
+    finally:
+        db.close()
+
+# ----------------- 10. Test Patient Search -----------------
+
+def test_patient_search():
+    """Search matches name, contact and symptom prefixes and returns patients without history."""
+    client.post("/book", json={"patient": {"name": "John Doe", "age": 30, "contact": "555-0100"}, "symptoms": "Mild headache"})
+    first = client.post("/book", json={"patient": {"name": "Jane Roe", "age": 41, "contact": "555-0199"}, "symptoms": "Broken wrist"})
+    client.delete(f"/appointment/{first.json()['id']}")
+    client.post("/book", json={"patient": {"name": "Jane Roe", "age": 41, "contact": "555-0199"}, "symptoms": "High fever"})
+
+    def names(q, **params):
+        response = client.get("/patients/search", params={"q": q, **params})
+        assert response.status_code == 200
+        return sorted(p["name"] for p in response.json())
+
+    assert names("joh") == ["John Doe"]
+    assert names("555") == ["Jane Roe", "John Doe"]
+    assert names("0199") == ["Jane Roe"]
+    assert names("fever") == ["Jane Roe"]        # symptoms from a later appointment
+    assert names("jane headache") == []           # every term must match
+    assert names("555", limit=1, skip=1) != names("555", limit=1)
+    # Each result carries the visit summary the search list shows, but not the history
+    jane = client.get("/patients/search", params={"q": "jane"}).json()[0]
+    assert "appointments" not in jane
+    assert jane["visit_count"] == 2 and jane["open_appointments"] == 1 and jane["last_visit_at"]
+
+def test_patient_search_index_backfilled_by_migration(tmp_path):
+    """Patients that existed before the search index are indexed by the migration."""
+    from sqlalchemy import text
+    from backend import migrations
+
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE patients (id INTEGER PRIMARY KEY, name VARCHAR, age INTEGER, contact VARCHAR)"))
+        conn.execute(text(
+            "CREATE TABLE appointments (id INTEGER PRIMARY KEY, patient_id INTEGER, symptoms VARCHAR, "
+            "triage_level VARCHAR, status VARCHAR, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO patients VALUES (7, 'Legacy Person', 80, '555-7777')"))
+        conn.execute(text("INSERT INTO appointments VALUES (1, 7, 'stroke symptoms', 'Emergency', 'Completed', '2020-01-01')"))
+    migrations.run_migrations(legacy_engine)
+
+    db = sessionmaker(bind=legacy_engine)()
+    try:
+        assert [p.id for p in crud.search_patients(db, "stroke")] == [7]
+        assert [p.id for p in crud.search_patients(db, "legacy")] == [7]
+    finally:
+        db.close()
+
+# ----------------- 11. Test Queue Statistics -----------------
+
+def test_queue_stats_follow_bookings_and_discharges():
+    """Counters track bookings and discharges and agree with a fresh reconcile."""
+    assert client.get("/stats/queue").json()["total_queued"] == 0
+
+    ids = []
+    for i, symptoms in enumerate(["Heart attack", "High fever", "checkup", "checkup"]):
+        response = client.post("/book", json={"patient": {"name": f"Stats {i}", "age": 30 + i, "contact": str(i)}, "symptoms": symptoms})
+        ids.append(response.json()["id"])
+    client.delete(f"/appointment/{ids[2]}")
+
+    stats = client.get("/stats/queue").json()
+    assert stats["total_queued"] == 3
+    assert stats["by_triage_level"] == {"Emergency": 1, "Urgent": 1, "Routine": 1}
+    assert stats["by_status"] == {"Queued": 3, "Completed": 1}
+    assert stats["oldest_wait_seconds"]["Emergency"] >= 0
+    assert stats["average_wait_seconds"] >= 0
+
+    # The incrementally maintained counters match a rebuild from SQL
+    queue_stats.reset()
+    rebuilt = client.get("/stats/queue").json()
+    assert {k: rebuilt[k] for k in ("total_queued", "by_triage_level", "by_status")} == \
+        {k: stats[k] for k in ("total_queued", "by_triage_level", "by_status")}
+
+def test_queue_stats_not_capped_by_queue_page_size():
+    """Stats cover the whole queue, not just the first page returned by /appointments."""
+    from sqlalchemy import insert
+    from backend import models
+
+    db = TestingSessionLocal()
+    try:
+        db.execute(insert(models.Patient), [{"id": 1, "name": "Many", "age": 1, "contact": "1"}])
+        db.execute(insert(models.Appointment), [
+            {"patient_id": 1, "symptoms": "checkup", "triage_level": "Routine", "priority": 3, "status": "Queued"}
+            for _ in range(150)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    assert len(client.get("/appointments").json()) == 100
+    assert client.get("/stats/queue").json()["by_triage_level"]["Routine"] == 150
+
+# ----------------- 12. Test Compact Queue View -----------------
+
+def test_compact_queue_view():
+    """Compact view returns flat rows in the same order as the full view."""
+    client.post("/book", json={"patient": {"name": "Compact Routine", "age": 20, "contact": "1"}, "symptoms": "checkup"})
+    client.post("/book", json={"patient": {"name": "Compact Emergency", "age": 70, "contact": "2"}, "symptoms": "stroke"})
+
+    full = client.get("/appointments").json()
+    compact = client.get("/appointments", params={"view": "compact"}).json()
+    assert [row["id"] for row in compact] == [row["id"] for row in full]
+    assert compact[0] == {
+        "id": full[0]["id"],
+        "triage_level": "Emergency",
+        "created_at": full[0]["created_at"],
+        "patient_name": "Compact Emergency",
+        "patient_age": 70,
+    }
+
+    picked = client.get("/appointments", params={"fields": "id,patient_contact"}).json()
+    assert picked[1] == {"id": full[1]["id"], "patient_contact": "1"}
+    assert client.get("/appointments", params={"fields": "id,password"}).status_code == 400
+
+def test_queue_endpoints_document_both_views():
+    """The OpenAPI schema describes the full and the compact rows the queue endpoints return."""
+    spec = client.get("/openapi.json").json()
+    for path in ("/appointments", "/queues/{department}/appointments"):
+        views = spec["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["anyOf"]
+        assert views[0]["items"] == {"$ref": "#/components/schemas/AppointmentResponse"}
+        assert set(views[1]["items"]["properties"]) == set(crud.QUEUE_FIELDS)
+
+# ----------------- 13. Test Compression and Response Cache -----------------
+
+def test_large_responses_are_gzipped():
+    """Large responses are gzip compressed when the client accepts it; small ones are left alone."""
+    for i in range(30):
+        client.post("/book", json={"patient": {"name": f"Gzip {i}", "age": 30, "contact": "1"}, "symptoms": "checkup"})
+
+    big = client.get("/appointments", headers={"Accept-Encoding": "gzip"})
+    assert big.headers["content-encoding"] == "gzip"
+    assert len(big.json()) == 30
+
+    small = client.get("/stats/queue", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    plain = client.get("/appointments", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+def test_queue_response_cache_invalidated_by_booking():
+    """A cached /appointments body is dropped as soon as the queue changes."""
+    client.post("/book", json={"patient": {"name": "Cached One", "age": 30, "contact": "1"}, "symptoms": "checkup"})
+    assert len(client.get("/appointments").json()) == 1
+    assert len(client.get("/appointments").json()) == 1
+
+    client.post("/book", json={"patient": {"name": "Cached Two", "age": 30, "contact": "2"}, "symptoms": "stroke"})
+    queue = client.get("/appointments").json()
+    assert [a["patient"]["name"] for a in queue] == ["Cached Two", "Cached One"]
+
+    assert len(client.get("/appointments", params={"view": "compact"}).json()) == 2
+    client.delete(f"/appointment/{queue[0]['id']}")
+    assert [a["patient_name"] for a in client.get("/appointments", params={"view": "compact"}).json()] == ["Cached One"]
+
+# ----------------- 14. Test Metrics -----------------
+
+def test_metrics_endpoint_reports_routes_queries_and_triage():
+    """Per-route latency, per-request SQL counts and triage timings show up at /metrics."""
+    client.post("/book", json={"patient": {"name": "Metrics", "age": 30, "contact": "1"}, "symptoms": "fever"})
+    client.get("/appointments")
+
+    assert metrics.http_request_duration.count("POST", "/book", 201) == 1
+    assert metrics.http_request_duration.count("GET", "/appointments", 200) == 1
+    assert metrics.triage_duration.count("total") == 1
+    assert metrics.db_query_duration.count("INSERT") >= 2
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="POST",route="/book",status="201"} 1' in body
+    assert 'http_request_db_queries_bucket{route="/appointments",le="+Inf"} 1' in body
+    assert "# TYPE triage_duration_seconds histogram" in body
+
+def test_slow_query_log(monkeypatch, caplog):
+    """Statements over SLOW_QUERY_SECONDS are logged and counted."""
+    monkeypatch.setattr(config, "SLOW_QUERY_SECONDS", 1e-9)
+    with caplog.at_level("WARNING", logger="triage.slow_queries"):
+        client.get("/appointments")
+    assert metrics.db_slow_queries.value("SELECT") >= 1
+    assert any("slow query" in record.getMessage() for record in caplog.records)
+
+# ----------------- 15. Test Queue Claim -----------------
+
+def test_queue_next_claims_in_priority_order():
+    """POST /queue/next hands out the top of the queue and marks it In Progress."""
+    client.post("/book", json={"patient": {"name": "Next Routine", "age": 30, "contact": "1"}, "symptoms": "checkup"})
+    client.post("/book", json={"patient": {"name": "Next Emergency", "age": 30, "contact": "2"}, "symptoms": "stroke"})
+
+    first = client.post("/queue/next")
+    assert first.status_code == 200
+    assert first.json()["patient"]["name"] == "Next Emergency"
+    assert first.json()["status"] == "In Progress"
+    assert client.post("/queue/next").json()["patient"]["name"] == "Next Routine"
+    assert client.post("/queue/next").status_code == 404
+    assert client.get("/stats/queue").json()["by_status"] == {"In Progress": 2}
+
+def test_queue_next_concurrent_claimers_never_share_a_patient():
+    """Many clinicians claiming at once: every queued appointment is claimed exactly once."""
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import insert
+    from backend import models
+
+    db = TestingSessionLocal()
+    try:
+        db.execute(insert(models.Patient), [{"id": 1, "name": "Busy", "age": 1, "contact": "1"}])
+        db.execute(insert(models.Appointment), [
+            {"patient_id": 1, "symptoms": "checkup", "triage_level": "Routine", "priority": 3, "status": "Queued"}
+            for _ in range(40)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    def claim_until_empty(_):
+        claimed = []
+        session = TestingSessionLocal()
+        try:
+            while True:
+                appointment = crud.claim_next_appointment(session)
+                if appointment is None:
+                    return claimed
+                claimed.append(appointment.id)
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(claim_until_empty, range(8)))
+    claimed = [appointment_id for ids in results for appointment_id in ids]
+    assert len(claimed) == 40
+    assert len(set(claimed)) == 40
+
+# ----------------- 16. Test Department Queues -----------------
+
+def test_bookings_routed_to_department_queues():
+    """Bookings land in a department queue by triage level and symptoms; each queue is ordered on its own."""
+    def book(name, symptoms):
+        return client.post("/book", json={"patient": {"name": name, "age": 40, "contact": "1"}, "symptoms": symptoms}).json()
+
+    assert book("Dept Stroke", "possible stroke")["department"] == "Emergency"
+    book("Dept Knee", "stiff knee joint")
+    book("Dept Ankle", "sprain with severe pain")
+    assert book("Dept Rash", "itchy rash")["department"] == "Dermatology"
+    assert book("Dept Checkup", "checkup")["department"] == "General"
+
+    ortho = client.get("/queues/Orthopedics/appointments").json()
+    # "pain" makes the ankle Urgent, so it goes ahead of the earlier Routine knee
+    assert [a["patient"]["name"] for a in ortho] == ["Dept Ankle", "Dept Knee"]
+    compact = client.get("/queues/Orthopedics/appointments", params={"fields": "patient_name,department"}).json()
+    assert compact == [{"patient_name": "Dept Ankle", "department": "Orthopedics"},
+                       {"patient_name": "Dept Knee", "department": "Orthopedics"}]
+
+    queues = {q["department"]: q["queued"] for q in client.get("/queues").json()}
+    assert queues == {"Emergency": 1, "Orthopedics": 2, "Respiratory": 0, "Dermatology": 1, "General": 1}
+    assert [a["patient"]["name"] for a in client.get("/appointments").json()][:2] == ["Dept Stroke", "Dept Ankle"]
+
+    claimed = client.post("/queues/Orthopedics/next").json()
+    assert claimed["patient"]["name"] == "Dept Ankle"
+    assert [a["patient"]["name"] for a in client.get("/queues/Orthopedics/appointments").json()] == ["Dept Knee"]
+    assert client.get("/queues/Cardiology/appointments").status_code == 404
+
+# ----------------- 17. Test Queue Aging -----------------
+
+def test_long_waiting_routine_overtakes_new_urgent_but_not_emergency():
+    """Effective score grows with waiting time, capped below Emergency; reads and claims follow it."""
+    import datetime
+    from sqlalchemy import update
+    from backend import models
+
+    routine = client.post("/book", json={"patient": {"name": "Aged Routine", "age": 50, "contact": "1"}, "symptoms": "checkup"}).json()
+    client.post("/book", json={"patient": {"name": "New Urgent", "age": 50, "contact": "2"}, "symptoms": "fever"})
+    client.post("/book", json={"patient": {"name": "New Emergency", "age": 50, "contact": "3"}, "symptoms": "stroke"})
+    assert [a["patient"]["name"] for a in client.get("/appointments").json()] == ["New Emergency", "New Urgent", "Aged Routine"]
+
+    # Routine at 0.5 points/minute: 100 + 0.5 * 300 = 250 > 200 for the fresh Urgent case,
+    # and after a full day still capped below the Emergency's 300
+    db = TestingSessionLocal()
+    try:
+        db.execute(update(models.Appointment).where(models.Appointment.id == routine["id"]).values(
+            created_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=5)))
+        db.commit()
+    finally:
+        db.close()
+    queue_index.reset()
+    queue_response_cache.invalidate()
+    assert [a["patient"]["name"] for a in client.get("/appointments").json()] == ["New Emergency", "Aged Routine", "New Urgent"]
+
+    client.post("/queue/next")
+    assert client.post("/queue/next").json()["patient"]["name"] == "Aged Routine"
+
+def test_cached_queue_order_follows_aging(monkeypatch):
+    """A cached page isn't reused once patients have aged into a new order, even if nothing was booked."""
+    import datetime
+    import time
+    from sqlalchemy import update
+    from backend import models
+
+    routine = client.post("/book", json={"patient": {"name": "Waiting Routine", "age": 50, "contact": "1"}, "symptoms": "checkup"}).json()
+    client.post("/book", json={"patient": {"name": "Fresh Urgent", "age": 50, "contact": "2"}, "symptoms": "fever"})
+    # Routine waited 250 minutes: 225 now against the Urgent's 200, but the Urgent ages twice as fast
+    db = TestingSessionLocal()
+    try:
+        db.execute(update(models.Appointment).where(models.Appointment.id == routine["id"]).values(
+            created_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=250)))
+        db.commit()
+    finally:
+        db.close()
+    queue_index.reset()
+    queue_response_cache.invalidate()
+    assert [a["patient"]["name"] for a in client.get("/appointments").json()] == ["Waiting Routine", "Fresh Urgent"]
+
+    # An hour on: Routine 255, Urgent 260
+    later = time.time() + 3600
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert [a["patient"]["name"] for a in client.get("/appointments").json()] == ["Fresh Urgent", "Waiting Routine"]
+
+def test_aging_score_is_capped_below_emergency():
+    from backend.queue_index import effective_score, AGING_CAP
+
+    now = 1_000_000.0
+    assert effective_score(3, now, now) == 100
+    assert effective_score(2, now - 600, now) == 210
+    assert effective_score(3, now - 86400, now) == AGING_CAP < effective_score(1, now, now)
+
+# ----------------- 18. Test Cross-Worker Events -----------------
+
+def test_table_event_bus_carries_bookings_between_workers(monkeypatch):
+    """A booking on this worker reaches another worker through the queue_events table, and vice versa."""
+    import datetime
+    from backend import events, models
+
+    local_bus = events.TableEventBus(engine, events._apply_remote)
+    other_worker = []
+    other_bus = events.TableEventBus(engine, other_worker.append)
+    local_bus.poll()
+    other_bus.poll()
+    monkeypatch.setattr(events, "bus", local_bus)
+
+    booked = client.post("/book", json={"patient": {"name": "Bus One", "age": 40, "contact": "1"}, "symptoms": "fever"}).json()
+    assert other_bus.poll() == 1
+    assert other_worker[0]["type"] == "appointment_created" and other_worker[0]["id"] == booked["id"]
+    # This worker has already applied its own event and skips it on the way back
+    assert local_bus.poll() == 1
+
+    # The other worker books an appointment: this worker's index and cached page follow without a reconcile
+    assert [a["id"] for a in client.get("/appointments").json()] == [booked["id"]]
+    db = TestingSessionLocal()
+    try:
+        appointment = models.Appointment(patient_id=booked["patient_id"], symptoms="stroke", triage_level="Emergency",
+                                         priority=1, department="Emergency", status="Queued",
+                                         created_at=datetime.datetime.now(datetime.timezone.utc))
+        db.add(appointment)
+        db.commit()
+        event = events._appointment_event("appointment_created", appointment)
+    finally:
+        db.close()
+    other_bus.publish({**event, "origin": "other-worker"})
+    local_bus.poll()
+    assert [a["id"] for a in client.get("/appointments").json()] == [event["id"], booked["id"]]
+
+    # ...and discharges it again
+    db = TestingSessionLocal()
+    try:
+        db.query(models.Appointment).filter(models.Appointment.id == event["id"]).update({"status": "Completed"})
+        db.commit()
+    finally:
+        db.close()
+    other_bus.publish({**event, "type": "appointment_status_changed", "status": "Completed",
+                       "old_status": "Queued", "origin": "other-worker"})
+    local_bus.poll()
+    assert [a["id"] for a in client.get("/appointments").json()] == [booked["id"]]
+    assert client.get("/stats/queue").json()["total_queued"] == 1
+
+def test_table_events_are_written_in_the_changing_transaction(monkeypatch):
+    """The change-log row commits or rolls back with the change, and is applied locally only on commit."""
+    from backend import events, models, schemas
+
+    bus = events.TableEventBus(engine, events._apply_remote)
+    monkeypatch.setattr(events, "bus", bus)
+    applied = []
+    monkeypatch.setattr(events, "apply", applied.append)
+
+    def change_log_size():
+        db = TestingSessionLocal()
+        try:
+            return db.query(models.QueueEvent).count()
+        finally:
+            db.close()
+
+    request = schemas.BookRequest(patient={"name": "Outbox", "age": 30, "contact": "1"}, symptoms="checkup")
+    db = TestingSessionLocal()
+    try:
+        appointment = crud.book_appointment(db, request, "Routine")
+        events.appointment_created(db, appointment)
+        db.rollback()
+        assert change_log_size() == 0 and applied == []
+
+        appointment = crud.book_appointment(db, request, "Routine")
+        events.appointment_created(db, appointment)
+        assert applied == []
+        db.commit()
+        assert change_log_size() == 1
+        assert [event["type"] for event in applied] == ["appointment_created"]
+    finally:
+        db.close()
+
+def test_table_event_poll_picks_up_ids_that_commit_out_of_order():
+    """An id that becomes visible after a higher one (as on PostgreSQL) is still delivered, once."""
+    import json
+    from sqlalchemy import insert
+    from backend import events, models
+
+    received = []
+    bus = events.TableEventBus(engine, received.append, gap_seconds=60)
+    bus.poll()
+
+    def write(event_id, name):
+        with engine.begin() as conn:
+            conn.execute(insert(models.QueueEvent).values(id=event_id, origin="other", payload=json.dumps({"name": name})))
+
+    start = bus.last_id
+    write(start + 2, "second")
+    assert bus.poll() == 1 and bus.gaps.keys() == {start + 1}
+    write(start + 1, "first, committed late")
+    write(start + 3, "third")
+    assert bus.poll() == 2 and not bus.gaps
+    assert bus.poll() == 0
+    assert [event["name"] for event in received] == ["second", "first, committed late", "third"]
+
+    # A gap that never fills (a rolled-back insert) is given up after gap_seconds
+    bus.gap_seconds = 0
+    write(start + 5, "fifth")
+    assert bus.poll() == 1 and bus.gaps.keys() == {start + 4}
+    bus.poll()
+    assert not bus.gaps
+
+def test_table_event_bus_delivers_events_published_after_a_full_prune():
+    """Pruning every row doesn't restart the ids, so readers keep seeing new events."""
+    from backend import events
+
+    received = []
+    reader = events.TableEventBus(engine, received.append, retention_seconds=0)
+    writer = events.TableEventBus(engine, lambda event: None, retention_seconds=0)
+    reader.poll()
+    writer.publish({"name": "before prune"})
+    assert reader.poll() == 1
+    writer.prune()
+    writer.publish({"name": "after prune"})
+    assert reader.poll() == 1
+    assert [event["name"] for event in received] == ["before prune", "after prune"]
+
+def test_queue_events_reach_live_stream_subscribers():
+    import asyncio
+    import threading
+    from backend import events
+
+    async def listen():
+        queue = events.subscribers.subscribe()
+        try:
+            # Events are applied on request or bus threads, not on the subscriber's loop
+            threading.Thread(target=events.queue_invalidated, args=("test",)).start()
+            return await asyncio.wait_for(queue.get(), timeout=5)
+        finally:
+            events.subscribers.unsubscribe(queue)
+
+    assert asyncio.run(listen())["type"] == "queue_invalidated"
+
+# ----------------- 19. Test Group Commit -----------------
+
+def test_concurrent_bookings_are_group_committed(monkeypatch):
+    """Concurrent /book calls share commits but each gets its own appointment; repeat patients are not duplicated."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(config, "DUPLICATE_BOOKING_WINDOW_SECONDS", 0)
+
+    def book(i):
+        return client.post("/book", json={"patient": {"name": f"Group {i % 8}", "age": 30, "contact": "1"}, "symptoms": "fever"})
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(book, range(48)))
+    assert all(r.status_code == 201 for r in results)
+    assert len({r.json()["id"] for r in results}) == 48
+    assert len({r.json()["patient_id"] for r in results}) == 8
+    assert all(r.json()["patient"]["name"].startswith("Group") for r in results)
+    assert len(client.get("/appointments").json()) == 48
+    assert metrics.group_commit_batch_size.count() <= 48
+
+def test_failed_booking_only_rolls_back_itself(monkeypatch):
+    from concurrent.futures import Future
+    from backend import schemas
+    from backend.group_commit import BookingWriter
+
+    real_book = crud.book_appointment
+    def book(db, request, triage_level):
+        appointment = real_book(db, request, triage_level)
+        if request.symptoms == "explode":
+            raise ValueError("booking failed")
+        return appointment
+    monkeypatch.setattr(crud, "book_appointment", book)
+
+    batch = [
+        (schemas.BookRequest(patient={"name": name, "age": 30, "contact": "1"}, symptoms=symptoms), "Routine", Future())
+        for name, symptoms in [("Kept One", "checkup"), ("Dropped", "explode"), ("Kept Two", "checkup")]
+    ]
+    BookingWriter(engine).write_batch(batch)
+    assert batch[0][2].result().patient.name == "Kept One"
+    with pytest.raises(ValueError):
+        batch[1][2].result()
+    assert batch[2][2].result().patient.name == "Kept Two"
+    assert sorted(p["name"] for p in client.get("/patients").json()) == ["Kept One", "Kept Two"]
+
+    # A failing booking alone in its batch is rolled back without a savepoint
+    lone = [(schemas.BookRequest(patient={"name": "Lone", "age": 30, "contact": "1"}, symptoms="explode"), "Routine", Future())]
+    BookingWriter(engine).write_batch(lone)
+    with pytest.raises(ValueError):
+        lone[0][2].result()
+    assert len(client.get("/patients").json()) == 2
+
+def test_committed_bookings_succeed_even_if_publishing_fails(monkeypatch):
+    """Once the batch is committed its bookings are returned; a failing event is only logged."""
+    from concurrent.futures import Future
+    from backend import events, schemas
+    from backend.group_commit import BookingWriter
+
+    def apply(event):
+        raise RuntimeError("event handler failed")
+    monkeypatch.setattr(events, "apply", apply)
+
+    batch = [
+        (schemas.BookRequest(patient={"name": name, "age": 30, "contact": "1"}, symptoms="checkup"), "Routine", Future())
+        for name in ("Published One", "Published Two")
+    ]
+    BookingWriter(engine).write_batch(batch)
+    assert [future.result().patient.name for _, _, future in batch] == ["Published One", "Published Two"]
+    assert sorted(p["name"] for p in client.get("/patients").json()) == ["Published One", "Published Two"]
+
+# ----------------- 20. Test Idempotency Keys and Duplicate Bookings -----------------
+
+@pytest.mark.parametrize("store", ["memory", "table"])
+def test_idempotency_key_replays_original_booking(store, monkeypatch):
+    monkeypatch.setattr(config, "IDEMPOTENCY_STORE", store)
+    booking = {"patient": {"name": "Kiosk Retry", "age": 60, "contact": "1"}, "symptoms": "fever"}
+
+    first = client.post("/book", json=booking, headers={"Idempotency-Key": "kiosk-1"})
+    retry = client.post("/book", json=booking, headers={"Idempotency-Key": "kiosk-1"})
+    assert first.status_code == retry.status_code == 201
+    assert retry.content == first.content
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(client.get("/appointments").json()) == 1
+    assert len(client.get("/patients").json()) == 1
+
+    changed = client.post("/book", json={**booking, "symptoms": "cough"}, headers={"Idempotency-Key": "kiosk-1"})
+    assert changed.status_code == 422
+
+def test_idempotency_key_in_progress_and_release():
+    store = idempotency.MemoryKeyStore(ttl_seconds=60, max_entries=2)
+    assert store.begin("a", "f1") is None
+    assert store.begin("a", "f1") == ("f1", None, None)   # still running
+    store.release("a")
+    assert store.begin("a", "f1") is None
+    store.complete("a", 201, b"{}")
+    assert store.begin("a", "f1") == ("f1", 201, b"{}")
+    store.begin("b", "f2")
+    store.begin("c", "f3")                                # evicts the oldest key
+    assert store.begin("a", "f1") is None
+
+def test_second_queued_booking_for_same_patient_is_rejected():
+    booking = {"patient": {"name": "Double Booker", "age": 33, "contact": "1"}, "symptoms": "fever"}
+    first = client.post("/book", json=booking)
+    assert first.status_code == 201
+    second = client.post("/book", json={**booking, "symptoms": "cough"})
+    assert second.status_code == 409
+    assert str(first.json()["id"]) in second.json()["detail"]
+
+    # Once the first appointment has left the queue, the patient can book again
+    client.delete(f"/appointment/{first.json()['id']}")
+    assert client.post("/book", json=booking).status_code == 201
+
+# ----------------- 21. Test Admission Control -----------------
+
+def test_admission_lanes():
+    from backend.admission import classify
+
+    assert classify("POST", "/book") == "booking"
+    assert classify("GET", "/appointments") == "queue"
+    assert classify("DELETE", "/appointment/3") == "queue"
+    assert classify("POST", "/queues/General/next") == "queue"
+    assert classify("GET", "/patients/7") == "low"
+    assert classify("GET", "/slots") == "low"
+    # Writes are never put in the shed lane
+    assert classify("POST", "/notifications/send") == "write"
+    assert classify("POST", "/slots") == "write"
+    assert classify("POST", "/providers") == "write"
+    assert classify("DELETE", "/slots/4") == "write"
+    # Streaming exports don't hold the low lane's slots
+    assert classify("GET", "/export/appointments") == "export"
+    assert classify("GET", "/queue/events") is None
+    assert classify("GET", "/metrics") is None
+
+def test_admission_sheds_low_priority_but_admits_emergency_bookings():
+    """With every lane full, low-priority reads get 503 + Retry-After while an Emergency booking still runs."""
+    import asyncio
+    import httpx
+    from backend.admission import AdmissionControlMiddleware
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            message = await receive()
+            if scope["path"] != "/book" or b"stroke" not in message["body"]:
+                await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": scope.get("state", {}).get("triage_level", "").encode()})
+
+        middleware = AdmissionControlMiddleware(slow_app, limits={"booking": 1, "queue": 1, "write": 1, "low": 1, "export": 1},
+                                                queue_timeout=0.05, latency_slo=0.5, retry_after=3)
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            routine = {"patient": {"name": "A", "age": 1, "contact": "1"}, "symptoms": "checkup"}
+            held = [asyncio.create_task(http.get("/patients")), asyncio.create_task(http.post("/book", json=routine))]
+            await asyncio.sleep(0.01)
+
+            shed = await http.get("/patients/1")
+            assert shed.status_code == 503 and shed.headers["Retry-After"] == "3"
+            assert (await http.post("/book", json=routine)).status_code == 503
+
+            emergency = await http.post("/book", json={**routine, "symptoms": "stroke"})
+            assert emergency.status_code == 200 and emergency.text == "Emergency"
+
+            release.set()
+            assert [r.status_code for r in await asyncio.gather(*held)] == [200, 200]
+
+            # Queue/booking latency above the SLO: low-priority reads are refused without waiting
+            now = [1000.0]
+            middleware.latency.clock = lambda: now[0]
+            middleware.latency.reset()
+            middleware.latency.observe(2.0)
+            assert (await http.get("/patients")).status_code == 503
+            assert (await http.get("/export/patients")).status_code == 503
+            assert metrics.admission_rejected.value("low", "slo") == 1
+            # ...but writes still go through
+            assert (await http.post("/slots", json={})).status_code == 200
+
+            # No bookings or queue reads since: the spike fades and the low lane is admitted again
+            now[0] += 3 * config.ADMISSION_LATENCY_HALF_LIFE_SECONDS
+            assert middleware.latency.value < 0.5
+            assert (await http.get("/patients")).status_code == 200
+
+    asyncio.run(run())
+
+def test_latency_average_weights_samples_by_time():
+    """Samples close together move the average a little; one after a long gap replaces it."""
+    from backend.admission import LatencyTracker
+
+    now = [0.0]
+    tracker = LatencyTracker(half_life=5, clock=lambda: now[0])
+    tracker.observe(0.1)
+    for _ in range(5):
+        now[0] += 0.01
+        tracker.observe(2.0)
+    average = tracker.value
+    assert average < 1.0
+
+    now[0] += 5
+    assert abs(tracker.value - average / 2) < 1e-9
+    now[0] += 60
+    tracker.observe(0.2)
+    assert abs(tracker.value - 0.2) < 0.01
+
+# ----------------- 22. Test Patient Summary and History Paging -----------------
+
+def test_patient_summary_is_maintained_on_write(monkeypatch):
+    """Bookings and discharges keep the visit summary current; archiving doesn't change it."""
+    import datetime
+    from backend import archive, models
+
+    monkeypatch.setattr(config, "DUPLICATE_BOOKING_WINDOW_SECONDS", 0)
+    patient = {"name": "Frequent Flyer", "age": 52, "contact": "555-0152"}
+    first = client.post("/book", json={"patient": patient, "symptoms": "Routine checkup"}).json()
+    second = client.post("/book", json={"patient": patient, "symptoms": "High fever"}).json()
+
+    summary = client.get(f"/patients/{first['patient_id']}").json()["summary"]
+    assert summary["visit_count"] == 2
+    assert summary["open_appointments"] == 2
+    assert summary["highest_triage_level"] == "Urgent"
+    assert summary["last_visit_at"].startswith(second["created_at"][:19])
+
+    client.delete(f"/appointment/{first['id']}")
+    client.delete(f"/appointment/{first['id']}")
+    summary = client.get(f"/patients/{first['patient_id']}").json()["summary"]
+    assert summary["visit_count"] == 2
+    assert summary["open_appointments"] == 1
+
+    db = TestingSessionLocal()
+    try:
+        db.query(models.Appointment).filter(models.Appointment.id == first["id"]).update(
+            {"created_at": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=60)}
+        )
+        db.commit()
+        assert archive.archive_finished_appointments(db, older_than_days=30) == 1
+        before = crud.patient_summary(crud.get_patient(db, first["patient_id"]))
+        # A full recompute agrees with the incrementally maintained summary
+        crud.refresh_patient_summaries(db, [first["patient_id"]])
+        db.commit()
+        db.expire_all()
+        assert crud.patient_summary(crud.get_patient(db, first["patient_id"])) == before
+        assert before.visit_count == 2
+    finally:
+        db.close()
+
+def test_patient_history_pages_with_cursor():
+    """History comes most recent first, one page at a time, across live and archived appointments."""
+    import datetime
+    from backend import models
+
+    response = client.post("/book", json={"patient": {"name": "Long History", "age": 70, "contact": "555"}, "symptoms": "checkup"})
+    patient_id = response.json()["patient_id"]
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    db = TestingSessionLocal()
+    try:
+        # Two appointments share a timestamp, so paging has to fall back to the id
+        times = [start + datetime.timedelta(days=i // 2) for i in range(7)]
+        db.add_all(models.ArchivedAppointment(patient_id=patient_id, symptoms=f"old {i}", triage_level="Routine",
+                                              priority=3, status="Completed", created_at=t)
+                   for i, t in enumerate(times[:4]))
+        db.add_all(models.Appointment(patient_id=patient_id, symptoms=f"recent {i}", triage_level="Routine",
+                                      priority=3, status="Completed", created_at=t)
+                   for i, t in enumerate(times[4:]))
+        db.commit()
+        expected = [a.id for a in sorted(
+            db.query(models.Appointment).all() + db.query(models.ArchivedAppointment).all(),
+            key=lambda a: (a.created_at, a.id), reverse=True,
+        )]
+    finally:
+        db.close()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"before": cursor} if cursor else {})}
+        page = client.get(f"/patients/{patient_id}", params=params).json()
+        assert len(page["appointments"]) <= 3
+        assert all("patient" not in a for a in page["appointments"])
+        seen += [a["id"] for a in page["appointments"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+    assert len(seen) == 8
+
+    assert client.get(f"/patients/{patient_id}", params={"before": "not-a-cursor"}).status_code == 400
+    assert client.get(f"/patients/{patient_id}", params={"limit": 0}).status_code == 422
+
+# ----------------- 23. Test Notification Indexes and Retention -----------------
+
+def test_notification_queries_use_indexes():
+    """Every notification lookup in crud, live and archive table alike, is served by an index instead of a table scan."""
+    from sqlalchemy import event
+
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM notifications" in statement:
+            statements.append((statement, parameters))
+
+    db = TestingSessionLocal()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        crud.get_notifications_by_patient(db, 1)
+        crud.get_notifications_by_appointment(db, 1)
+        crud.get_all_notifications(db)
+        crud.get_pending_notifications(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    try:
+        # Three reads merge in notifications_archive
+        assert len(statements) == 7
+        for statement, parameters in statements:
+            plan = " ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            assert "USING INDEX ix_notifications_" in plan, plan
+            assert "TEMP B-TREE" not in plan, plan
+    finally:
+        db.close()
+
+def test_old_sent_notifications_move_to_archive():
+    """Retention moves old Sent notifications in batches and leaves recent or unsent ones live."""
+    import datetime
+    from backend import archive, models
+
+    appointment = client.post("/book", json={"patient": {"name": "Notified", "age": 40, "contact": "555-0140"}, "symptoms": "checkup"}).json()
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+    db = TestingSessionLocal()
+    try:
+        for i, (status, created_at) in enumerate([("Sent", old), ("Sent", old), ("Sent", old), ("Failed", old), ("Sent", None)]):
+            db.add(models.Notification(patient_id=appointment["patient_id"], appointment_id=appointment["id"],
+                                       message=f"message {i}", contact_number="555-0140", status=status,
+                                       **({"created_at": created_at} if created_at else {})))
+        db.commit()
+
+        assert archive.archive_sent_notifications(db, older_than_days=7, batch_size=2) == 3
+        assert sorted(n.message for n in db.query(models.Notification)) == ["message 3", "message 4"]
+        assert sorted(n.message for n in db.query(models.ArchivedNotification)) == ["message 0", "message 1", "message 2"]
+        assert archive.archive_sent_notifications(db, older_than_days=7) == 0
+        # The appointment itself is still live and queued
+        assert db.get(models.Appointment, appointment["id"]).status == "Queued"
+    finally:
+        db.close()
+
+    # Reads merge both tables, so the history is unchanged: newest first, archived ones included
+    expected = ["message 4", "message 3", "message 2", "message 1", "message 0"]
+    by_patient = client.get(f"/notifications/patient/{appointment['patient_id']}").json()
+    assert [n["message"] for n in by_patient] == expected
+    by_appointment = client.get(f"/notifications/appointment/{appointment['id']}").json()
+    assert [n["message"] for n in by_appointment] == expected
+    page = client.get(f"/notifications/patient/{appointment['patient_id']}", params={"skip": 1, "limit": 2}).json()
+    assert page == by_patient[1:3]
+    assert [n["message"] for n in client.get("/notifications").json()] == expected
+
+def test_notification_retention_never_reuses_archived_ids():
+    """A notification sent after retention ran doesn't get an archived id, so the next run works."""
+    import datetime
+    from backend import archive, models
+
+    appointment = client.post("/book", json={"patient": {"name": "Notified Again", "age": 41, "contact": "555-0141"}, "symptoms": "checkup"}).json()
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+    db = TestingSessionLocal()
+    try:
+        ids = []
+        for i in range(2):
+            notification = models.Notification(patient_id=appointment["patient_id"], appointment_id=appointment["id"],
+                                               message=f"message {i}", contact_number="555-0141", status="Sent", created_at=old)
+            db.add(notification)
+            db.commit()
+            ids.append(notification.id)
+            assert archive.archive_sent_notifications(db, older_than_days=7) == 1
+        assert ids[1] > ids[0]
+        assert sorted(n.id for n in db.query(models.ArchivedNotification)) == ids
+    finally:
+        db.close()
+
+# ----------------- 24. Test Analytics Rollups -----------------
+
+def test_transitions_update_rollups_and_match_raw_aggregation():
+    """Claims and discharges are timestamped and the rollups agree with aggregating the raw table."""
+    from backend import analytics
+
+    urgent = client.post("/book", json={"patient": {"name": "Rollup One", "age": 20, "contact": "1"}, "symptoms": "High fever"}).json()
+    routine = client.post("/book", json={"patient": {"name": "Rollup Two", "age": 21, "contact": "2"}, "symptoms": "checkup"}).json()
+    claimed = client.post("/queue/next").json()
+    assert claimed["id"] == urgent["id"] and claimed["started_at"] is not None
+    client.delete(f"/appointment/{urgent['id']}")
+    client.delete(f"/appointment/{routine['id']}")
+    client.delete(f"/appointment/{routine['id']}")
+
+    history = client.get(f"/patients/{routine['patient_id']}").json()["appointments"]
+    assert history[0]["completed_at"] is not None and history[0]["started_at"] is None
+
+    throughput = {p["triage_level"]: p for p in client.get("/analytics/throughput").json()}
+    assert {level: (p["arrivals"], p["discharges"]) for level, p in throughput.items()} == {"Urgent": (1, 1), "Routine": (1, 1)}
+    waits = {p["triage_level"]: p for p in client.get("/analytics/wait-times", params={"granularity": "day"}).json()}
+    assert waits["Urgent"]["waits"] == 1 and waits["Routine"]["waits"] == 1
+    assert 0 <= waits["Urgent"]["median_wait_seconds"] <= 60
+    assert client.get("/analytics/throughput", params={"triage_level": "Emergency"}).json() == []
+
+    db = TestingSessionLocal()
+    try:
+        start, end = analytics.report_range("day")
+        stored, raw = analytics.read_rollups(db, start, end), analytics.aggregate_raw(db, start, end)
+        assert stored.buckets == raw.buckets
+        assert stored.rows.keys() == raw.rows.keys()
+        for key, row in stored.rows.items():
+            assert row[:3] == raw.rows[key][:3]
+            assert abs(row[3] - raw.rows[key][3]) < 0.01
+    finally:
+        db.close()
+
+def test_imported_history_rolls_up_by_day(tmp_path):
+    """Bulk-imported transition times land in the rollups; daily reports merge the hourly rows."""
+    import json
+    from backend import analytics, bulk_import
+
+    records = [
+        {"name": "Import A", "age": 30, "contact": "1", "symptoms": "checkup",
+         "created_at": "2024-03-01T09:10:00", "started_at": "2024-03-01T09:20:00", "completed_at": "2024-03-01T09:40:00"},
+        {"name": "Import B", "age": 31, "contact": "2", "symptoms": "checkup",
+         "created_at": "2024-03-01T13:00:00", "started_at": "2024-03-01T13:30:00", "completed_at": "2024-03-01T14:05:00"},
+        {"name": "Import C", "age": 32, "contact": "3", "symptoms": "checkup", "created_at": "2024-03-01T23:59:00"},
+    ]
+    path = tmp_path / "history.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in records))
+    db = TestingSessionLocal()
+    try:
+        bulk_import.import_file(db, str(path))
+    finally:
+        db.close()
+
+    params = {"granularity": "day", "since": "2024-03-01T00:00:00", "until": "2024-03-01T23:00:00"}
+    assert client.get("/analytics/throughput", params=params).json() == [
+        {"period_start": "2024-03-01T00:00:00", "triage_level": "Routine", "arrivals": 3, "discharges": 2},
+    ]
+    [day] = client.get("/analytics/wait-times", params=params).json()
+    assert day["waits"] == 2
+    assert day["average_wait_seconds"] == 1200.0
+    # 600 s and 1800 s waits: the median falls at the top of the 300-600 s bucket
+    assert day["median_wait_seconds"] == 600.0
+    hourly = client.get("/analytics/throughput", params={**params, "granularity": "hour"}).json()
+    assert [p["period_start"][11:13] for p in hourly] == ["09", "13", "14", "23"]
+
+    assert analytics.histogram_quantile([0] * (len(analytics.WAIT_BUCKETS) + 1), 0.5) is None
+    assert client.get("/analytics/throughput", params={"since": "2000-01-01T00:00:00"}).status_code == 400
+
+# ----------------- 25. Test Arrival Forecast -----------------
+
+def _write_weekly_arrivals(start, hours, busy=6, quiet=1):
+    """Urgent arrivals from `start` for `hours` hours: `busy` an hour 09:00-17:00 on weekdays, `quiet` otherwise."""
+    import datetime
+    from backend import analytics
+
+    delta = analytics.RollupDelta()
+    for i in range(hours):
+        hour = start + datetime.timedelta(hours=i)
+        delta.arrival("Urgent", hour, busy if hour.weekday() < 5 and 9 <= hour.hour < 17 else quiet)
+    db = TestingSessionLocal()
+    try:
+        delta.write(db)
+        db.commit()
+    finally:
+        db.close()
+
+def test_forecast_learns_weekly_pattern_and_refreshes_incrementally():
+    """Hour-of-week baselines recover the pattern; folding in new hours matches refitting from scratch."""
+    import datetime
+    from backend.forecast import ArrivalForecaster
+
+    monday = datetime.datetime(2024, 3, 4)
+    _write_weekly_arrivals(monday, 4 * 168 + 8)
+    now = monday + datetime.timedelta(weeks=4, hours=8, minutes=30)  # Monday 08:30
+    db = TestingSessionLocal()
+    try:
+        model = ArrivalForecaster(history_weeks=10)
+        result = model.forecast(db, hours=3, now=now)
+        urgent = [p for p in result["points"] if p["triage_level"] == "Urgent"]
+        assert [p["hour_start"].hour for p in urgent] == [8, 9, 10]
+        assert [p["expected_arrivals"] for p in urgent] == [1.0, 6.0, 6.0]
+        assert all(p["expected_arrivals"] == 0 for p in result["points"] if p["triage_level"] != "Urgent")
+        assert result["fitted_through"] == datetime.datetime(2024, 4, 1, 8)
+
+        # Two more days arrive, busier than usual; only those hours are read on refresh
+        _write_weekly_arrivals(now.replace(minute=0), 50, busy=9, quiet=2)
+        later = now + datetime.timedelta(hours=50)
+        assert model._fit(db, later.replace(minute=0)) == 50
+        assert model._fit(db, later.replace(minute=0)) == 0
+        refit = ArrivalForecaster(history_weeks=10)
+        refit._fit(db, later.replace(minute=0))
+        assert refit._mean == model._mean
+        assert refit._variance == model._variance
+
+        # The recent surge lifts the next hours above the seasonal baseline, fading with distance
+        model.refresh(db, later)
+        urgent = [p for p in model.forecast(db, hours=4, now=later)["points"] if p["triage_level"] == "Urgent"]
+        baseline = model._mean["Urgent"]
+        lift = [p["expected_arrivals"] / baseline[p["hour_start"].weekday() * 24 + p["hour_start"].hour] for p in urgent]
+        assert all(x > 1 for x in lift) and lift == sorted(lift, reverse=True)
+        assert all(p["low"] <= p["expected_arrivals"] <= p["high"] for p in urgent)
+    finally:
+        db.close()
+
+def test_forecast_endpoint_is_cached_until_refresh(monkeypatch):
+    """/analytics/forecast serves the cached forecast until the refresh interval passes."""
+    import datetime
+
+    hour = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    _write_weekly_arrivals(hour - datetime.timedelta(weeks=2), 2 * 168)
+
+    response = client.get("/analytics/forecast", params={"hours": 2})
+    assert response.status_code == 200
+    first = response.json()
+    assert len(first["points"]) == 2 * 3
+    assert first["points"][0]["hour_start"] == hour.isoformat()
+
+    # New arrivals don't show until the next refresh
+    monkeypatch.setattr(config, "FORECAST_REFRESH_SECONDS", 3600)
+    cached = client.get("/analytics/forecast", params={"hours": 6}).json()
+    assert cached["points"][:6] == first["points"]
+    _write_weekly_arrivals(hour - datetime.timedelta(hours=1), 1, busy=40, quiet=40)
+    assert client.get("/analytics/forecast", params={"hours": 6}).json() == cached
+    monkeypatch.setattr(config, "FORECAST_REFRESH_SECONDS", 0)
+    assert client.get("/analytics/forecast", params={"hours": 2}).json()["generated_at"] != cached["generated_at"]
+
+    assert client.get("/analytics/forecast", params={"hours": config.FORECAST_MAX_HOURS + 1}).status_code == 422
+
+# ----------------- 26. Test Typo-Tolerant Triage -----------------
+
+# (symptoms as typed, expected triage level)
+MISSPELLING_CORPUS = [
+    ("chset pain", "Emergency"),
+    ("chest pian", "Emergency"),
+    ("ches pain since morning", "Emergency"),
+    ("hart atack", "Emergency"),
+    ("heart atttack", "Emergency"),
+    ("heavy bleding from arm", "Emergency"),
+    ("bleeing a lot", "Emergency"),
+    ("found unconcious", "Emergency"),
+    ("unconsious in the lobby", "Emergency"),
+    ("trouble brething", "Emergency"),
+    ("breathng problems", "Emergency"),
+    ("possible strok", "Emergency"),
+    ("feaver and chills", "Urgent"),
+    ("high fevr", "Urgent"),
+    ("fractur of the wrist", "Urgent"),
+    ("brokn arm", "Urgent"),
+    ("vomitting all night", "Urgent"),
+    ("dizzyness when standing", "Urgent"),
+    ("pian in knee", "Urgent"),
+    # Ordinary words close to a keyword stay as they are
+    ("never had this before", "Routine"),
+    ("patient is conscious and alert", "Routine"),
+    ("heard a ringing noise", "Routine"),
+    ("rash after treating the garden", "Routine"),
+    ("routine checkup", "Routine"),
+    ("sore throat", "Routine"),
+    ("cough for a week", "Routine"),
+    # ...and so do short words a letter away, and long ones two letters away
+    ("feeling fain after lunch", "Routine"),
+    ("dropped a pail on my foot", "Routine"),
+    ("pawn moved", "Routine"),
+    ("fuzziness in vision", "Routine"),
+]
+
+def test_misspelled_keywords_regression_corpus():
+    """Misspelled keywords triage like the real ones; near-miss ordinary words don't."""
+    results = [(symptoms, crud.evaluate_triage_level(symptoms)) for symptoms, _ in MISSPELLING_CORPUS]
+    assert results == MISSPELLING_CORPUS
+    assert metrics.triage_fuzzy_corrections.value("chest") >= 1
+
+def test_fuzzy_index_lookups(monkeypatch):
+    """Edit distance limits by word length, transpositions, ties and switching the pass off."""
+    from backend import fuzzy
+
+    index = fuzzy.FuzzyIndex(["bleeding", "pain", "stroke", "strike", "dizziness"], common_words=frozenset())
+    assert index.lookup("bleding") == "bleeding"      # one deletion
+    assert index.lookup("bleeeding") == "bleeding"    # one insertion
+    assert index.lookup("blaeding") == "bleeding"     # one substitution
+    assert index.lookup("lbeeding") == "bleeding"     # one transposition
+    assert index.lookup("blidng") is None             # two edits, but too short for two
+    assert index.lookup("pan") is None                # too short to correct at all
+    assert index.lookup("pian") == "pain"             # short words: a swapped letter...
+    assert [index.lookup(w) for w in ["fain", "pail", "pawn"]] == [None, None, None]  # ...but not a changed one
+    assert index.lookup("dizzyness") == "dizziness"   # one changed letter
+    assert index.lookup("fuzziness") is None          # two changed letters
+    assert index.lookup("stroke") == "stroke"
+    assert index.lookup("strake") == "stroke"         # one edit from both: the first listed wins
+    assert index.lookup("xxxxxxxxxxxxxxxxxxxx") is None
+    assert index.correct("Heavy Bleding, PAIN!") == ("heavy bleeding pain", [("bleding", "bleeding")])
+    assert fuzzy.edit_distance("chset", "chest", 2) == 1
+    assert fuzzy.edit_distance("abcdef", "zzzzzz", 2) == 3
+    assert fuzzy.edit_distance("fain", "pain", 2, substitution_cost=2) == 2
+
+    monkeypatch.setattr(config, "TRIAGE_FUZZY_MATCHING", False)
+    assert crud.evaluate_triage_level("chset pain") == "Urgent"
+    monkeypatch.setattr(config, "TRIAGE_FUZZY_MATCHING", True)
+    assert crud.evaluate_triage_level("chset pain") == "Emergency"
+
+# ----------------- 27. Test Scheduled Appointments -----------------
+
+def _next_monday():
+    import datetime
+    today = datetime.date.today()
+    return datetime.datetime.combine(today + datetime.timedelta(days=7 - today.weekday()), datetime.time())
+
+def test_free_slots_across_providers_and_booking():
+    """Free slots merge across providers in time order; booking, conflicts and cancelling update them."""
+    import datetime
+
+    monday = _next_monday()
+    early = client.post("/providers", json={"name": "Dr. Early", "slot_minutes": 30, "day_start_hour": 8, "day_end_hour": 10}).json()
+    late = client.post("/providers", json={"name": "Dr. Late", "department": "Dermatology", "slot_minutes": 60,
+                                           "day_start_hour": 9, "day_end_hour": 12, "working_days": "0,2"}).json()
+    assert client.post("/providers", json={"name": "Dr. Backwards", "day_start_hour": 12, "day_end_hour": 9}).status_code == 400
+
+    params = {"after": monday.isoformat(), "count": 6}
+    slots = [(s["start_at"][11:16], s["provider_id"]) for s in client.get("/slots/available", params=params).json()]
+    assert slots == [("08:00", early["id"]), ("08:30", early["id"]), ("09:00", early["id"]),
+                     ("09:00", late["id"]), ("09:30", early["id"]), ("10:00", late["id"])]
+    derm = client.get("/slots/available", params={**params, "department": "Dermatology"}).json()
+    assert [s["start_at"][11:16] for s in derm][:4] == ["09:00", "10:00", "11:00", "09:00"]
+    assert derm[3]["start_at"][:10] == (monday + datetime.timedelta(days=2)).date().isoformat()
+
+    booking = {"provider_id": early["id"], "start_at": (monday + datetime.timedelta(hours=8)).isoformat(),
+               "patient": {"name": "Slot Patient", "age": 40, "contact": "555"}, "symptoms": "annual checkup"}
+    response = client.post("/slots", json=booking)
+    assert response.status_code == 201
+    slot = response.json()
+    assert slot["status"] == "Booked" and slot["end_at"][11:16] == "08:30"
+    first = client.get("/slots/available", params={**params, "provider_id": early["id"]}).json()[0]
+    assert first["start_at"][11:16] == "08:30"
+
+    # The same slot again, a time off the grid, a serious case and an offset time
+    assert client.post("/slots", json=booking).status_code == 409
+    assert client.post("/slots", json={**booking, "start_at": (monday + datetime.timedelta(hours=8, minutes=10)).isoformat()}).status_code == 409
+    assert client.post("/slots", json={**booking, "start_at": (monday + datetime.timedelta(hours=10)).isoformat()}).status_code == 409
+    assert client.post("/slots", json={**booking, "symptoms": "chest pain"}).status_code == 422
+    assert client.post("/slots", json={**booking, "start_at": booking["start_at"] + "+02:00"}).status_code == 400
+    assert client.post("/slots", json={**booking, "provider_id": 999}).status_code == 404
+
+    assert client.delete(f"/slots/{slot['id']}").status_code == 204
+    assert client.delete(f"/slots/{slot['id']}").status_code == 404
+    first = client.get("/slots/available", params={**params, "provider_id": early["id"]}).json()[0]
+    assert first["start_at"][11:16] == "08:00"
+    assert client.post("/slots", json=booking).status_code == 201
+
+def test_database_settles_slot_conflicts_the_index_missed():
+    """A booking made behind the index's back still wins: the unique index refuses the second one."""
+    import datetime
+    from sqlalchemy.exc import IntegrityError
+    from backend import models
+
+    monday = _next_monday()
+    provider = client.post("/providers", json={"name": "Dr. Busy"}).json()
+    start = monday + datetime.timedelta(hours=9)
+    assert client.get("/slots/available", params={"after": start.isoformat(), "count": 1}).json()[0]["start_at"] == start.isoformat()
+
+    # Booked by another worker: this process's index still shows the slot as free
+    db = TestingSessionLocal()
+    try:
+        patient = models.Patient(name="Elsewhere", age=50, contact="1")
+        db.add(patient)
+        db.flush()
+        db.add(models.ScheduledSlot(provider_id=provider["id"], patient_id=patient.id, symptoms="checkup",
+                                    start_at=start, end_at=start + datetime.timedelta(minutes=30)))
+        db.commit()
+        db.add(models.ScheduledSlot(provider_id=provider["id"], patient_id=patient.id, symptoms="checkup",
+                                    start_at=start, end_at=start + datetime.timedelta(minutes=30)))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
+    finally:
+        db.close()
+
+    booking = {"provider_id": provider["id"], "start_at": start.isoformat(),
+               "patient": {"name": "Here", "age": 30, "contact": "2"}, "symptoms": "checkup"}
+    assert client.post("/slots", json=booking).status_code == 409
+    # ...and the index has learned it
+    assert client.get("/slots/available", params={"after": start.isoformat(), "count": 1}).json()[0]["start_at"][11:16] == "09:30"
+
+def test_slots_outside_the_booking_window_are_rejected():
+    import datetime
+
+    monday = _next_monday()
+    provider = client.post("/providers", json={"name": "Dr. Window"}).json()
+    booking = {"provider_id": provider["id"], "patient": {"name": "Window", "age": 30, "contact": "1"}, "symptoms": "checkup"}
+    past = monday - datetime.timedelta(weeks=2) + datetime.timedelta(hours=9)
+    too_far = monday + datetime.timedelta(days=config.SCHEDULING_HORIZON_DAYS + 7, hours=9)
+    for start in (past, too_far):
+        assert client.post("/slots", json={**booking, "start_at": start.isoformat()}).status_code == 422
+    assert client.post("/slots", json={**booking, "start_at": (monday + datetime.timedelta(hours=9)).isoformat()}).status_code == 201
+
+def test_slot_bookings_reach_other_workers(monkeypatch):
+    """Bookings and cancellations travel over the event bus, so other workers' free-slot indexes follow."""
+    import datetime
+    from backend import events
+    from backend.slot_index import SlotIndex
+
+    local_bus = events.TableEventBus(engine, events._apply_remote)
+    other_index = SlotIndex()
+    def other_worker(event):
+        # What events.apply does for scheduling events, against the other worker's index
+        own_index, events.slot_index = events.slot_index, other_index
+        try:
+            events.apply(event)
+        finally:
+            events.slot_index = own_index
+    other_bus = events.TableEventBus(engine, other_worker)
+    local_bus.poll()
+    other_bus.poll()
+    monkeypatch.setattr(events, "bus", local_bus)
+
+    monday = _next_monday()
+    start = monday + datetime.timedelta(hours=9)
+    provider = client.post("/providers", json={"name": "Dr. Shared"}).json()
+    db = TestingSessionLocal()
+    try:
+        other_index.reconcile(db)
+        assert other_index.next_free(db, 1, start) == [(start, provider["id"])]
+        slot = client.post("/slots", json={"provider_id": provider["id"], "start_at": start.isoformat(),
+                                           "patient": {"name": "Shared", "age": 30, "contact": "1"}, "symptoms": "checkup"}).json()
+        assert other_bus.poll() == 2
+        assert other_index.next_free(db, 1, start) == [(start + datetime.timedelta(minutes=30), provider["id"])]
+
+        client.delete(f"/slots/{slot['id']}")
+        assert other_bus.poll() == 1
+        assert other_index.next_free(db, 1, start) == [(start, provider["id"])]
+    finally:
+        db.close()
+
+# ----------------- 28. Test Patient Profile Cache -----------------
+
+def test_patient_lookups_hit_memo_and_cache():
+    """Repeated lookups come from the request memo or the shared cache, and show up in /metrics."""
+    booked = client.post("/book", json={"patient": {"name": "Cached", "age": 33, "contact": "555-3333"}, "symptoms": "checkup"}).json()
+    patient_id = booked["patient_id"]
+    metrics.reset()
+
+    assert client.get(f"/patients/{patient_id}").status_code == 200
+    assert metrics.patient_cache_lookups.value("miss") == 1
+    assert client.get(f"/notifications/patient/{patient_id}").status_code == 200
+    assert metrics.patient_cache_lookups.value("hit") == 1
+    # The endpoint and crud.send_notification both look the patient up: the second is free
+    response = client.post("/notifications/send", json={"patient_id": patient_id, "message": "Hello"})
+    assert response.status_code == 201 and response.json()["contact_number"] == "555-3333"
+    assert metrics.patient_cache_lookups.value("hit") == 2
+    assert metrics.patient_cache_lookups.value("memo") == 1
+    assert client.get("/notifications/patient/999999").status_code == 404
+
+    body = client.get("/metrics").text
+    assert 'patient_cache_lookups_total{result="memo"} 1' in body
+    assert "patient_cache_hit_ratio 0.6" in body
+
+def test_patient_cache_invalidation(monkeypatch):
+    """Bookings, discharges and events drop cached profiles; the cache is bounded and ignores racing reads."""
+    from backend import events, models
+    from backend.patient_cache import PatientCache
+
+    booked = client.post("/book", json={"patient": {"name": "Changing", "age": 44, "contact": "1"}, "symptoms": "checkup"}).json()
+    patient_id = booked["patient_id"]
+    assert client.get(f"/patients/{patient_id}").json()["summary"]["open_appointments"] == 1
+    client.delete(f"/appointment/{booked['id']}")
+    assert client.get(f"/patients/{patient_id}").json()["summary"]["open_appointments"] == 0
+    monkeypatch.setattr(config, "DUPLICATE_BOOKING_WINDOW_SECONDS", 0)
+    client.post("/book", json={"patient": {"name": "Changing", "age": 44, "contact": "1"}, "symptoms": "fever"})
+    assert client.get(f"/patients/{patient_id}").json()["summary"]["visit_count"] == 2
+
+    # Changed behind the cache's back (e.g. by another process): served from cache until an event or the TTL
+    db = TestingSessionLocal()
+    try:
+        db.query(models.Patient).filter(models.Patient.id == patient_id).update({"contact": "2"})
+        db.commit()
+    finally:
+        db.close()
+    assert client.get(f"/patients/{patient_id}").json()["contact"] == "1"
+    events.apply({"type": "appointment_status_changed", "id": booked["id"], "patient_id": patient_id, "status": "Completed",
+                  "old_status": "In Progress", "triage_level": "Routine", "priority": 3, "department": "General",
+                  "created_at": booked["created_at"] + "+00:00"})
+    assert client.get(f"/patients/{patient_id}").json()["contact"] == "2"
+
+    cache = PatientCache(ttl_seconds=60, max_entries=2)
+    version = cache.version
+    for i in (1, 2):
+        cache.put(i, f"profile {i}", version)
+    cache.get(1)
+    cache.put(3, "profile 3", version)
+    assert (cache.get(1), cache.get(2), cache.get(3)) == ("profile 1", None, "profile 3")
+    # A read that started before its patient was invalidated must not cache what it read;
+    # invalidating other patients meanwhile doesn't matter
+    stale_version = cache.version
+    cache.invalidate(1)
+    cache.invalidate(4)
+    cache.put(1, "old profile 1", stale_version)
+    cache.put(2, "profile 2", stale_version)
+    assert (cache.get(1), cache.get(2)) == (None, "profile 2")
+    # Once an invalidation is forgotten (more than max_entries since), older reads are refused
+    cache.invalidate(5)
+    cache.put(3, "profile 3 again", stale_version)
+    assert cache.get(3) == "profile 3"
+    cache.clear()
+    cache.put(3, "profile 3 again", cache.version - 1)
+    assert len(cache) == 0